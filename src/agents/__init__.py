@@ -2,9 +2,11 @@
 from .preprocessing_agent import PreprocessingAgent
 from .classification_agent import ClassificationAgent
 from .governance_agent import GovernanceAgent
+from .fused_agent import FusedAgent
 
 __all__ = [
     'PreprocessingAgent',
     'ClassificationAgent',
-    'GovernanceAgent'
+    'GovernanceAgent',
+    'FusedAgent'
 ]
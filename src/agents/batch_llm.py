@@ -0,0 +1,105 @@
+"""Azure OpenAI Batch API client - offline chat completions for large CSV jobs"""
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from utils.parsers import json_loads, json_dumps
+
+# Azure routes batch chat completions to this path (OpenAI proper uses /v1/chat/completions)
+BATCH_ENDPOINT = "/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+# Batch states after which polling stops
+TERMINAL_STATUSES = frozenset({"completed", "failed", "expired", "cancelled"})
+
+
+def submit_batch(client, requests: List[Tuple[str, Dict[str, Any]]]) -> str:
+    """
+    Upload the requests as a JSONL file and start a batch job on it
+    
+    Args:
+        client: openai.AzureOpenAI client
+        requests: (custom_id, chat completion body) pairs; custom_ids must be unique
+    
+    Returns:
+        Batch job id
+    """
+    lines = "\n".join(
+        json_dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body})
+        for custom_id, body in requests
+    )
+    upload = client.files.create(file=("batch.jsonl", lines.encode("utf-8")), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=upload.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=BATCH_COMPLETION_WINDOW
+    )
+    return batch.id
+
+
+def poll_batch(client, batch_id: str):
+    """
+    Fetch the current state of a batch job
+    
+    Args:
+        client: openai.AzureOpenAI client
+        batch_id: Id returned by submit_batch()
+    
+    Returns:
+        The Batch object (status, request_counts, output_file_id, ...)
+    """
+    return client.batches.retrieve(batch_id)
+
+
+def fetch_results(client, batch) -> Dict[str, Dict[str, Any]]:
+    """
+    Download the output file of a finished batch job
+    
+    Args:
+        client: openai.AzureOpenAI client
+        batch: Batch object from poll_batch()
+    
+    Returns:
+        Dict of custom_id to chat completion response body; failed requests are left out
+    """
+    if not getattr(batch, "output_file_id", None):
+        return {}
+    results = {}
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        record = json_loads(line)
+        response = record.get("response") or {}
+        if response.get("status_code") == 200 and isinstance(response.get("body"), dict):
+            results[record.get("custom_id")] = response["body"]
+    return results
+
+
+async def run_batch(client,
+                    requests: List[Tuple[str, Dict[str, Any]]],
+                    poll_interval: float = 15.0,
+                    on_status: Optional[Callable[[Any], None]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Submit a batch job, wait for it to finish and return its results.
+    The blocking SDK calls run in worker threads so the event loop stays free.
+    
+    Args:
+        client: openai.AzureOpenAI client
+        requests: (custom_id, chat completion body) pairs
+        poll_interval: Seconds between status checks
+        on_status: Optional callback receiving the Batch object after each check
+    
+    Returns:
+        Dict of custom_id to response body (see fetch_results)
+    
+    Raises:
+        RuntimeError: If the job ends in any state other than completed
+    """
+    batch_id = await asyncio.to_thread(submit_batch, client, requests)
+    while True:
+        batch = await asyncio.to_thread(poll_batch, client, batch_id)
+        if on_status:
+            on_status(batch)
+        if batch.status in TERMINAL_STATUSES:
+            break
+        await asyncio.sleep(poll_interval)
+    if batch.status != "completed":
+        raise RuntimeError(f"Batch job {batch_id} ended with status '{batch.status}'")
+    return await asyncio.to_thread(fetch_results, client, batch)
@@ -1,16 +1,111 @@
 """Classification Agent - Categorizes transactions using Agno framework with RAG"""
-from typing import Dict, Any, Optional
-from agno.agent import Agent, RunOutput
+import ast
+import asyncio
+import re
+from copy import copy
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from agno.agent import Agent
 from utils.user_preferences import get_preferences_store
 from utils.custom_categories import get_custom_categories_manager
+from utils.parsers import json_loads, json_dumps
+from utils.prompt_cache import get_prompt_cache_stats
+from agents.streaming import run_streaming, arun_streaming
 from tools.user_preferences_tool import lookup_user_preference
 from tools.custom_categories_tool import get_custom_categories, match_to_custom_category
+from tools.mcc_codes import classify_by_mcc_code, lookup_mcc_by_vendor
+from tools.taxonomy import TRANSACTION_CATEGORIES
+
+# Response fields emitted by the classifier, compiled once per process
+_RESPONSE_FIELDS = ("CATEGORY", "SUBCATEGORY", "CONFIDENCE", "REASONING", "CLASSIFICATION_METHOD")
+# Single pass over the response for all fields
+_FIELDS_RE = re.compile(rf"\b({'|'.join(_RESPONSE_FIELDS)}):\s*(.+?)(?:\n|$)", re.IGNORECASE)
+
+
+def _build_taxonomy_table(taxonomy: Dict[str, List[str]]) -> str:
+    """
+    Render the default taxonomy as one compact line per category
+    
+    Args:
+        taxonomy: Mapping of category to subcategories
+        
+    Returns:
+        Table text; categories without subcategories are dropped
+    """
+    return "\n".join(
+        f"- {category}: {', '.join(subcategories)}"
+        for category, subcategories in taxonomy.items()
+        if subcategories
+    )
+
+
+# The deployed taxonomy never changes at runtime, so it is rendered once into the
+# system message instead of being fetched with a get_taxonomy_structure tool turn
+_TAXONOMY_TABLE = _build_taxonomy_table(TRANSACTION_CATEGORIES)
+# Static part of the classification prompt - identical for every transaction, so it
+# goes into the system message where it forms a cacheable prompt prefix
+_CLASSIFICATION_STEPS = """**Tool plan:**
+
+- **Turn 1 (in parallel, one tool turn):** get_custom_categories, lookup_mcc_by_vendor, vendor_database_search, and classify_by_mcc_code if the transaction details include an MCC code.
+- **Turn 2 (only if needed):** match_to_custom_category if has_custom_categories=True.
+
+User preferences were already looked up before this run and none matched.
+
+**Decide using this priority order over the results:**
+
+1. Custom category match - use that category/subcategory with HIGH confidence.
+2. MCC code found by classify_by_mcc_code - HIGH confidence.
+3. Known brand from lookup_mcc_by_vendor - HIGH confidence.
+4. vendor_database_search match - MEDIUM confidence.
+5. Otherwise reason over the default taxonomy below about best fit - MEDIUM/LOW confidence.
+
+**Respond in this exact format:**
+CATEGORY: [category name]
+SUBCATEGORY: [subcategory name]
+CONFIDENCE: [HIGH/MEDIUM/LOW]
+REASONING: [Your detailed reasoning - mention which tools were used and why]
+CLASSIFICATION_METHOD: [custom_categories_genai/mcc_categorization/genai_llm_default]
+
+**Default taxonomy (category: subcategories):**
+""" + _TAXONOMY_TABLE + "\n"
+# Static part of the batch prompt - several numbered transactions, one JSON answer
+_BATCH_STEPS = """**Batch mode:** you receive several numbered transactions at once.
+
+- **Turn 1 (in parallel, one tool turn):** for EVERY transaction call lookup_mcc_by_vendor and vendor_database_search (plus classify_by_mcc_code when it has an MCC code); call get_custom_categories once.
+- **Turn 2 (only if needed):** match_to_custom_category as in single-transaction mode.
+- Decide each transaction independently using the priority order in your instructions; when nothing matched, pick from the default taxonomy below.
+
+**Respond with JSON only, one entry per transaction, in this exact shape:**
+{"results": [{"idx": 0, "category": "...", "subcategory": "...", "confidence": "HIGH/MEDIUM/LOW", "reasoning": "...", "classification_method": "custom_categories_genai/mcc_categorization/genai_llm_default"}]}
+
+**Default taxonomy (category: subcategories):**
+""" + _TAXONOMY_TABLE + "\n"
+# System message for Azure OpenAI Batch API requests - tools cannot run offline, so
+# the deterministic lookups are run locally and listed under each transaction
+_BATCH_API_SYSTEM = """You are an expert financial transaction classifier.
+
+**Offline batch mode:** you receive several numbered transactions at once. None of them matched a stored user preference. No tools are available; each transaction lists the lookups already run for it:
+- mcc: the category of the provided MCC code
+- vendor: a known-brand match from the vendor MCC database
+
+**Decide each transaction independently using this priority order:**
+
+1. A custom category below that clearly fits - HIGH confidence (classification_method custom_categories_genai).
+2. mcc - HIGH confidence (mcc_categorization).
+3. vendor - HIGH confidence for an exact match, MEDIUM for a partial one (mcc_categorization).
+4. Otherwise reason over the default taxonomy below about best fit - MEDIUM/LOW confidence (genai_llm_default).
+
+**Respond with JSON only, one entry per transaction, in this exact shape:**
+{"results": [{"idx": 0, "category": "...", "subcategory": "...", "confidence": "HIGH/MEDIUM/LOW", "reasoning": "...", "classification_method": "custom_categories_genai/mcc_categorization/genai_llm_default"}]}
+
+**Default taxonomy (category: subcategories):**
+""" + _TAXONOMY_TABLE + "\n"
+_CLASSIFICATION_METHODS = frozenset({"user_preference_rag", "custom_categories_genai", "mcc_categorization", "genai_llm_default"})
 
 
 class ClassificationAgent:
     """
     Enhanced Agno Agent responsible for transaction classification with RAG
-    - Uses user preferences (RAG-based similarity search)
+    - Uses user preferences (RAG-based similarity search, looked up before the LLM runs)
     - Supports custom categories with GenAI categorization
     - Falls back to MCC categorization
     - Default GenAI LLM categorization
@@ -28,9 +123,10 @@ class ClassificationAgent:
         
         Args:
             llm: Agno LLM instance (Azure OpenAI)
-            tools: List of Agno tools (must include lookup_user_preference, get_custom_categories, 
-                  match_to_custom_category, classify_by_mcc_code, lookup_mcc_by_vendor, 
-                  vendor_database_search, get_taxonomy_structure)
+            tools: List of Agno tools (must include get_custom_categories, match_to_custom_category,
+                  classify_by_mcc_code, lookup_mcc_by_vendor, vendor_database_search); user
+                  preferences are looked up before each run and the default taxonomy is
+                  already in the system message
         """
         self.llm = llm
         self.tools = tools
@@ -47,32 +143,54 @@ class ClassificationAgent:
             description="Expert at classifying financial transactions into categories with RAG and custom categories",
             instructions=[
                 "You are an expert financial transaction classifier with RAG capabilities.",
-                "Follow this priority order for classification:",
-                "1. FIRST: Call lookup_user_preference tool with merchant_name and description. This checks if user has previously corrected similar transactions. If match=True, use that category/subcategory with HIGH confidence and STOP.",
-                "2. SECOND: Call get_custom_categories tool to check if custom categories exist. If has_custom_categories=True, call match_to_custom_category tool which returns the category structure. Use your AI reasoning to determine if the transaction matches any custom category. If it matches, use that category/subcategory with HIGH confidence and STOP.",
-                "3. THIRD: If MCC code is provided, use classify_by_mcc_code tool. This gives HIGH confidence.",
-                "4. FOURTH: Use lookup_mcc_by_vendor tool for known brands (STARBUCKS, UBER, etc). This gives HIGH confidence.",
-                "5. FIFTH: Search vendor_database_search tool for merchant patterns. This gives MEDIUM confidence.",
-                "6. LAST: Use get_taxonomy_structure tool and reason about best fit. This gives MEDIUM/LOW confidence.",
+                "User preferences (RAG) are looked up before you run: a stored preference would already have decided the category, so none matched this transaction.",
+                "TURN 1 - call these independent lookups IN PARALLEL in a single tool turn: get_custom_categories, lookup_mcc_by_vendor, vendor_database_search, plus classify_by_mcc_code when an MCC code is provided. Do not wait for one before calling the next.",
+                "TURN 2 - only if get_custom_categories returned has_custom_categories=True, call match_to_custom_category and use your AI reasoning to decide whether the transaction fits a custom category. If no lookup above matched, choose from the default taxonomy in the context - there is no taxonomy tool to call.",
+                "Then decide using this priority order over the results:",
+                "1. Custom category match - use that category/subcategory with HIGH confidence.",
+                "2. MCC code found by classify_by_mcc_code - HIGH confidence.",
+                "3. Known brand from lookup_mcc_by_vendor - HIGH confidence.",
+                "4. vendor_database_search match - MEDIUM confidence.",
+                "5. Otherwise reason over the default taxonomy about best fit - MEDIUM/LOW confidence.",
                 "Always consider: merchant name patterns, transaction types, typical amounts for categories.",
-                "Assign confidence levels: HIGH (>90% - user preference/MCC/known vendor), MEDIUM (60-90% - database match/custom category), LOW (<60% - reasoning only).",
+                "Assign confidence levels: HIGH (>90% - MCC/known vendor), MEDIUM (60-90% - database match/custom category), LOW (<60% - reasoning only).",
                 "Provide clear reasoning that explains which tools were used and why you chose the category.",
-                "Include CLASSIFICATION_METHOD in your response: user_preference_rag, custom_categories_genai, mcc_categorization, or genai_llm_default."
+                "Include CLASSIFICATION_METHOD in your response: custom_categories_genai, mcc_categorization, or genai_llm_default."
             ],
+            additional_context=_CLASSIFICATION_STEPS,
+            tool_choice="auto",
             markdown=False,
             add_history_to_context=True
         )
+        
+        # Same tools and instructions, but classifies a numbered list of transactions per run;
+        # its copy of the model constrains the answer to a JSON object ({"results": [...]})
+        batch_llm = copy(llm)
+        batch_llm.request_params = {**(llm.request_params or {}), "response_format": {"type": "json_object"}}
+        self.batch_agent = Agent(
+            name="Transaction Batch Classifier",
+            id="classification-batch-agent",
+            model=batch_llm,
+            tools=tools,
+            description="Expert at classifying batches of financial transactions into categories with RAG and custom categories",
+            instructions=self.agent.instructions,
+            additional_context=_BATCH_STEPS,
+            tool_choice="auto",
+            markdown=False
+        )
     
     def execute(self,
                 merchant_name: str,
                 description: str,
                 amount: float,
                 mcc_code: Optional[str] = None,
-                metadata: Optional[Dict] = None) -> Dict[str, Any]:
+                metadata: Optional[Dict] = None,
+                on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """
         Execute classification with RAG and priority order using Agno tools.
-        The agent autonomously uses tools in priority order:
-        1. User Preferred Category (RAG) - lookup_user_preference tool
+        A stored user preference (or, without custom categories, a known MCC code)
+        decides without the LLM; otherwise the agent uses tools in priority order:
+        1. User Preferred Category (RAG) - looked up before the agent runs
         2. Custom Categories (GenAI) - get_custom_categories + match_to_custom_category tools
         3. MCC Categorization - classify_by_mcc_code tool
         4. GenAI LLM Categorization (default) - other tools
@@ -83,151 +201,543 @@ class ClassificationAgent:
             amount: Transaction amount
             mcc_code: Optional pre-provided MCC code
             metadata: Additional metadata from preprocessing
+            on_token: Optional callback receiving the response text accumulated so far,
+                      called once per streamed content chunk
             
         Returns:
             Dict with classification results (category, subcategory, confidence, reasoning)
         """
         # Build classification prompt for Agno Agent
         # The agent will use tools autonomously based on instructions
-        classification_prompt = f"""
-Classify this financial transaction:
-
-**Transaction Details:**
-- Merchant: {merchant_name}
-- Description: {description}
-- Amount: ${amount:.2f}
-{f"- **MCC Code: {mcc_code}** (Use classify_by_mcc_code tool with this!)" if mcc_code else "- MCC Code: Not provided"}
-{f"- Location: {metadata.get('location')}" if metadata and metadata.get('location') else ""}
-{f"- Transaction Type: {metadata.get('transaction_type')}" if metadata and metadata.get('transaction_type') else ""}
-
-**Follow this priority order (use tools in this sequence):**
-
-1. **FIRST:** Call lookup_user_preference tool with merchant_name="{merchant_name}" and description="{description}". 
-   - If match found (match=True), use that category/subcategory with HIGH confidence.
-   - If no match (match=False), proceed to step 2.
-
-2. **SECOND:** Call get_custom_categories tool to check if custom categories exist.
-   - If has_custom_categories=True, call match_to_custom_category tool with merchant_name, description, and amount.
-   - If match found, use that category/subcategory with HIGH confidence.
-   - If no match or no custom categories, proceed to step 3.
-
-3. **THIRD:** If MCC code provided, call classify_by_mcc_code tool with mcc_code="{mcc_code}". This gives HIGH confidence.
-   - If MCC not found, use lookup_mcc_by_vendor tool for known brands. This gives HIGH confidence.
-
-4. **FOURTH:** If vendor not recognized, call vendor_database_search tool. This gives MEDIUM confidence.
-
-5. **LAST:** Use get_taxonomy_structure tool to see valid categories and reason about best fit. This gives MEDIUM/LOW confidence.
-
-**Important:** Use the tools in the exact order above. Stop and return result as soon as you get a match from steps 1-3.
-
-**Respond in this exact format:**
-CATEGORY: [category name]
-SUBCATEGORY: [subcategory name]
-CONFIDENCE: [HIGH/MEDIUM/LOW]
-REASONING: [Your detailed reasoning - mention which tools were used and why]
-CLASSIFICATION_METHOD: [user_preference_rag/custom_categories_genai/mcc_categorization/genai_llm_default]
-"""
+        classification_prompt = self.build_prompt(merchant_name, description, amount, mcc_code, metadata)
         
         try:
+            # Priorities 1-3 decided by plain lookups need no LLM call
+            rule_result = self.rule_based_result(merchant_name, description, amount, mcc_code)
+            if rule_result is not None:
+                return rule_result
+            
             # Run Agno Agent - it will use tools autonomously
-            response: RunOutput = self.agent.run(classification_prompt)
-            
-            # Parse agent response
-            result_text = response.content if hasattr(response, 'content') else str(response)
-            
-            # Extract structured data from response
-            category = self._extract_field(result_text, "CATEGORY")
-            subcategory = self._extract_field(result_text, "SUBCATEGORY")
-            confidence = self._extract_field(result_text, "CONFIDENCE")
-            agent_reasoning = self._extract_field(result_text, "REASONING")
-            classification_method = self._extract_field(result_text, "CLASSIFICATION_METHOD")
-            
-            # Determine classification method from tool calls if not in response
-            if not classification_method:
-                # Check tool calls to determine method
-                tool_calls_made = []
-                if hasattr(response, 'messages'):
-                    for msg in response.messages:
-                        if hasattr(msg, 'role') and msg.role == 'tool':
-                            tool_calls_made.append(msg.content if hasattr(msg, 'content') else str(msg))
-                
-                # Determine method from tool calls
-                if any('lookup_user_preference' in str(tc) for tc in tool_calls_made):
-                    # Check if match was found
-                    for tc in tool_calls_made:
-                        if isinstance(tc, dict) and tc.get('match'):
-                            classification_method = "user_preference_rag"
-                            break
-                elif any('match_to_custom_category' in str(tc) or 'get_custom_categories' in str(tc) for tc in tool_calls_made):
-                    classification_method = "custom_categories_genai"
-                elif any('classify_by_mcc_code' in str(tc) or 'lookup_mcc_by_vendor' in str(tc) for tc in tool_calls_made):
-                    classification_method = "mcc_categorization"
-                else:
-                    classification_method = "genai_llm_default"
-            else:
-                # Get tool calls for tracking
-                tool_calls_made = []
-                if hasattr(response, 'messages'):
-                    for msg in response.messages:
-                        if hasattr(msg, 'role') and msg.role == 'tool':
-                            tool_calls_made.append(msg.content if hasattr(msg, 'content') else str(msg))
-            
-            # Extract user preference match info if RAG was used
-            user_preference_match = None
-            if classification_method == "user_preference_rag":
-                for tc in tool_calls_made:
-                    if isinstance(tc, dict) and tc.get('match'):
-                        user_preference_match = {
-                            "similarity_score": tc.get('similarity_score', 0),
-                            "preference_id": tc.get('preference_id'),
-                            "original_category": tc.get('original_category'),
-                            "original_subcategory": tc.get('original_subcategory')
-                        }
-                        break
-            
-            return {
-                "category": category or "Other",
-                "subcategory": subcategory or "General",
-                "confidence": confidence.lower() if confidence else "medium",
-                "reasoning": agent_reasoning or result_text,
-                "raw_response": result_text,
-                "tool_calls": tool_calls_made,
-                "agent_used": "Classification Agent (Agno)",
-                "classification_method": classification_method or "genai_llm_default",
-                "user_preference_match": user_preference_match,
+            result_text, tool_results = run_streaming(self.agent, classification_prompt, on_token)
+            
+            return self.build_result(result_text, tool_results, merchant_name, amount, mcc_code)
+            
+        except Exception as e:
+            # Fallback if Agno agent fails
+            return self.error_result(e)
+    
+    async def aexecute(self,
+                       merchant_name: str,
+                       description: str,
+                       amount: float,
+                       mcc_code: Optional[str] = None,
+                       metadata: Optional[Dict] = None,
+                       on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Async variant of execute() - awaits the Agno agent on the async client
+        so many transactions can be classified concurrently on one event loop.
+        
+        Args:
+            merchant_name: Merchant name from preprocessing
+            description: Cleaned transaction description
+            amount: Transaction amount
+            mcc_code: Optional pre-provided MCC code
+            metadata: Additional metadata from preprocessing
+            on_token: Optional callback receiving the response text accumulated so far
+            
+        Returns:
+            Dict with classification results (category, subcategory, confidence, reasoning)
+        """
+        classification_prompt = self.build_prompt(merchant_name, description, amount, mcc_code, metadata)
+        
+        try:
+            # The preference lookup reads and rewrites user_preferences.json - keep it off the event loop
+            rule_result = await asyncio.to_thread(self.rule_based_result, merchant_name, description, amount, mcc_code)
+            if rule_result is not None:
+                return rule_result
+            result_text, tool_results = await arun_streaming(self.agent, classification_prompt, on_token)
+            return self.build_result(result_text, tool_results, merchant_name, amount, mcc_code)
+            
+        except Exception as e:
+            return self.error_result(e)
+    
+    def execute_batch(self, transactions: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Classify several transactions with a single agent run.
+        
+        Args:
+            transactions: Dicts with merchant_name, description, amount and optional
+                          mcc_code / metadata (same meaning as the execute() arguments)
+            
+        Returns:
+            One classification result per transaction, in input order. An entry is None
+            when the response had no valid result for it (callers fall back to execute())
+        """
+        results, pending = self.rule_based_results(transactions)
+        if not pending:
+            return results
+        try:
+            response = self.batch_agent.run(self._build_batch_prompt(pending))
+        except Exception:
+            return results
+        get_prompt_cache_stats().record(response.metrics)
+        return self._merge_batch_results(results, self._parse_batch_results(getattr(response, 'content', None), pending))
+    
+    async def aexecute_batch(self, transactions: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Async variant of execute_batch()
+        
+        Args:
+            transactions: Dicts with merchant_name, description, amount and optional mcc_code / metadata
+            
+        Returns:
+            One classification result (or None) per transaction, in input order
+        """
+        results, pending = await asyncio.to_thread(self.rule_based_results, transactions)
+        if not pending:
+            return results
+        try:
+            response = await self.batch_agent.arun(self._build_batch_prompt(pending))
+        except Exception:
+            return results
+        get_prompt_cache_stats().record(response.metrics)
+        return self._merge_batch_results(results, self._parse_batch_results(getattr(response, 'content', None), pending))
+    
+    def build_batch_api_body(self, transactions: List[Dict[str, Any]], deployment: str) -> Dict[str, Any]:
+        """
+        Build one Azure OpenAI Batch API chat completion body for a chunk of transactions
+        that rule_based_results() left for the LLM. The MCC and vendor lookups run locally
+        and go into the prompt; the answer is constrained to a JSON object.
+        
+        Args:
+            transactions: Transaction dicts as passed to execute_batch()
+            deployment: Azure deployment name of the global-batch model
+            
+        Returns:
+            Request body for the batch JSONL line
+        """
+        system = _BATCH_API_SYSTEM
+        custom_categories = self.custom_categories_manager.get_categories()
+        if custom_categories:
+            system += "\n**Custom categories (category: subcategories):**\n" + _build_taxonomy_table(custom_categories) + "\n"
+        return {
+            "model": deployment,
+            "messages": [
+                {"role": "system", "content": system},
+                {"role": "user", "content": self._build_batch_api_prompt(transactions)}
+            ],
+            "response_format": {"type": "json_object"}
+        }
+    
+    def parse_batch_api_result(self,
+                               body: Dict[str, Any],
+                               transactions: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Convert a Batch API chat completion body into classification results
+        
+        Args:
+            body: Response body for the request built by build_batch_api_body()
+            transactions: The transactions that request was built from
+            
+        Returns:
+            One classification result (or None) per transaction, in input order
+        """
+        try:
+            content = body["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            return [None] * len(transactions)
+        results = self._parse_batch_results(content, transactions)
+        for result in results:
+            if result is not None:
+                result["agent_used"] = "Classification Agent (Azure Batch API)"
+        return results
+    
+    def rule_based_result(self,
+                           merchant_name: str,
+                           description: str,
+                           amount: float,
+                           mcc_code: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Apply priorities 1-3 as plain lookups: a stored user preference, then - when there
+        are no custom categories that would need LLM judgment first - a known MCC code
+        
+        Args:
+            merchant_name: Merchant name from preprocessing
+            description: Cleaned transaction description
+            amount: Transaction amount
+            mcc_code: Optional pre-provided MCC code
+            
+        Returns:
+            Classification result (with rule_based=True), or None when the LLM has to decide
+        """
+        preference = lookup_user_preference.entrypoint(merchant_name, description)
+        if preference.get('match'):
+            return self._rule_result(
+                preference, "user_preference_rag", merchant_name, amount, mcc_code,
+                user_preference_match={
+                    "similarity_score": preference.get('similarity_score', 0),
+                    "preference_id": preference.get('preference_id'),
+                    "original_category": preference.get('original_category'),
+                    "original_subcategory": preference.get('original_subcategory')
+                }
+            )
+        if mcc_code and not self.custom_categories_manager.get_categories():
+            mcc = classify_by_mcc_code.entrypoint(str(mcc_code))
+            if mcc.get('category'):
+                return self._rule_result(mcc, "mcc_categorization", merchant_name, amount, mcc_code)
+        return None
+    
+    def _rule_result(self,
+                     lookup: Dict[str, Any],
+                     classification_method: str,
+                     merchant_name: str,
+                     amount: float,
+                     mcc_code: Optional[str],
+                     user_preference_match: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Build the classification result for a lookup that decided the category
+        
+        Args:
+            lookup: Tool result with category, subcategory and message
+            classification_method: Method the lookup stands for
+            merchant_name: Merchant name that was classified
+            amount: Transaction amount
+            mcc_code: Optional pre-provided MCC code
+            user_preference_match: Preference match details for user_preference_rag
+            
+        Returns:
+            Dict with classification results
+        """
+        return {
+            "category": lookup['category'],
+            "subcategory": lookup.get('subcategory') or "General",
+            "confidence": "high",
+            "reasoning": lookup.get('message', ""),
+            "raw_response": "",
+            "tool_calls": [lookup],
+            "agent_used": "Classification Agent (rules, no LLM)",
+            "classification_method": classification_method,
+            "user_preference_match": user_preference_match,
+            "rule_based": True,
+            "metadata": {
+                "merchant_analyzed": merchant_name,
+                "amount_analyzed": amount,
+                "mcc_provided": bool(mcc_code)
+            }
+        }
+    
+    def rule_based_results(self, transactions: List[Dict[str, Any]]) -> Tuple[List[Optional[Dict[str, Any]]], List[Dict[str, Any]]]:
+        """
+        Apply rule_based_result to each transaction of a batch
+        
+        Args:
+            transactions: Transaction dicts as passed to execute_batch()
+            
+        Returns:
+            Tuple of (results aligned with transactions, None where the LLM has to decide;
+            the transactions left for the LLM, in order)
+        """
+        results = [
+            self.rule_based_result(
+                str(txn.get('merchant_name') or 'Unknown'),
+                str(txn.get('description') or ''),
+                float(txn.get('amount') or 0),
+                txn.get('mcc_code')
+            )
+            for txn in transactions
+        ]
+        return results, [txn for txn, result in zip(transactions, results) if result is None]
+    
+    def _merge_batch_results(self,
+                             results: List[Optional[Dict[str, Any]]],
+                             llm_results: List[Optional[Dict[str, Any]]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Fill the gaps left by rule_based_results with the LLM results, in order
+        
+        Returns:
+            One classification result (or None) per transaction
+        """
+        llm_iter = iter(llm_results)
+        return [result if result is not None else next(llm_iter) for result in results]
+    
+    def build_prompt(self,
+                      merchant_name: str,
+                      description: str,
+                      amount: float,
+                      mcc_code: Optional[str] = None,
+                      metadata: Optional[Dict] = None) -> str:
+        """
+        Build the classification prompt - only the per-transaction details; the static
+        steps are sent once as system context (_CLASSIFICATION_STEPS)
+        
+        Args:
+            merchant_name: Merchant name from preprocessing
+            description: Cleaned transaction description
+            amount: Transaction amount
+            mcc_code: Optional pre-provided MCC code
+            metadata: Additional metadata from preprocessing
+            
+        Returns:
+            Prompt text
+        """
+        parts = [
+            "Classify this financial transaction:",
+            "",
+            "**Transaction Details:**",
+            f"- Merchant: {merchant_name}",
+            f"- Description: {description}",
+            f"- Amount: ${amount:.2f}",
+        ]
+        if mcc_code:
+            parts.append(f"- **MCC Code: {mcc_code}** (Use classify_by_mcc_code tool with this!)")
+        else:
+            parts.append("- MCC Code: Not provided")
+        if metadata:
+            location = metadata.get('location')
+            if location:
+                parts.append(f"- Location: {location}")
+            transaction_type = metadata.get('transaction_type')
+            if transaction_type:
+                parts.append(f"- Transaction Type: {transaction_type}")
+        return "\n".join(parts)
+    
+    def _build_batch_prompt(self, transactions: List[Dict[str, Any]]) -> str:
+        """
+        Build the batch prompt - a numbered list of transaction details
+        
+        Args:
+            transactions: Transaction dicts as passed to execute_batch()
+            
+        Returns:
+            Prompt text
+        """
+        parts = [f"Classify these {len(transactions)} financial transactions:", ""]
+        for idx, txn in enumerate(transactions):
+            line = f"{idx}. Merchant: {txn.get('merchant_name', 'Unknown')} | Description: {txn.get('description', '')} | Amount: ${float(txn.get('amount') or 0):.2f}"
+            if txn.get('mcc_code'):
+                line += f" | MCC Code: {txn['mcc_code']}"
+            location = (txn.get('metadata') or {}).get('location')
+            if location:
+                line += f" | Location: {location}"
+            parts.append(line)
+        return "\n".join(parts)
+    
+    def _build_batch_api_prompt(self, transactions: List[Dict[str, Any]]) -> str:
+        """
+        Build the Batch API prompt - the batch prompt lines, each followed by its lookup results
+        
+        Args:
+            transactions: Transaction dicts as passed to execute_batch()
+            
+        Returns:
+            Prompt text
+        """
+        lines = self._build_batch_prompt(transactions).split("\n")
+        parts = lines[:2]
+        for txn, line in zip(transactions, lines[2:]):
+            parts.append(line)
+            parts.extend(f"   - {hint}" for hint in self._lookup_hints(txn))
+        return "\n".join(parts)
+    
+    def _lookup_hints(self, txn: Dict[str, Any]) -> List[str]:
+        """
+        Run the deterministic classification tools for one transaction
+        
+        Args:
+            txn: Transaction dict
+            
+        Returns:
+            One "name: category / subcategory" line per lookup that matched
+        """
+        merchant_name = str(txn.get('merchant_name') or 'Unknown')
+        hints = []
+        if txn.get('mcc_code'):
+            mcc = classify_by_mcc_code.entrypoint(str(txn['mcc_code']))
+            if mcc.get('category'):
+                hints.append(f"mcc: {mcc['category']} / {mcc['subcategory']} ({mcc['mcc_description']})")
+        vendor = lookup_mcc_by_vendor.entrypoint(merchant_name)
+        if vendor.get('match'):
+            hints.append(f"vendor: {vendor['category']} / {vendor['subcategory']} (MCC {vendor['mcc_code']}, {vendor['confidence'].lower()} match)")
+        return hints
+    
+    def _parse_batch_results(self,
+                             content: Any,
+                             transactions: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Validate the batch JSON response and convert each entry into a classification result
+        
+        Args:
+            content: Agent response content
+            transactions: Transaction dicts in prompt order
+            
+        Returns:
+            Results aligned with transactions; None where the entry is missing or malformed
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(transactions)
+        text = str(content or "")
+        start, end = text.find("{"), text.rfind("}")
+        try:
+            payload = json_loads(text[start:end + 1]) if start != -1 else None
+        except ValueError:
+            payload = None
+        entries = payload.get("results") if isinstance(payload, dict) else None
+        if not isinstance(entries, list):
+            return results
+        
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            idx = entry.get("idx")
+            category = entry.get("category")
+            if not isinstance(idx, int) or not 0 <= idx < len(transactions) or results[idx] is not None:
+                continue
+            if not isinstance(category, str) or not category.strip():
+                continue
+            txn = transactions[idx]
+            method = entry.get("classification_method")
+            confidence = str(entry.get("confidence") or "medium").lower()
+            results[idx] = {
+                "category": category.strip(),
+                "subcategory": str(entry.get("subcategory") or "General").strip(),
+                "confidence": confidence if confidence in ("high", "medium", "low") else "medium",
+                "reasoning": str(entry.get("reasoning") or ""),
+                "raw_response": json_dumps(entry),
+                "tool_calls": [],
+                "agent_used": "Classification Agent (Agno, batch)",
+                "classification_method": method if method in _CLASSIFICATION_METHODS else "genai_llm_default",
+                "user_preference_match": None,
                 "metadata": {
-                    "merchant_analyzed": merchant_name,
-                    "amount_analyzed": amount,
-                    "mcc_provided": bool(mcc_code)
+                    "merchant_analyzed": txn.get('merchant_name'),
+                    "amount_analyzed": txn.get('amount'),
+                    "mcc_provided": bool(txn.get('mcc_code'))
                 }
             }
+        return results
+    
+    def build_result(self,
+                      result_text: str,
+                      tool_results: List[Tuple[Optional[str], Any]],
+                      merchant_name: str,
+                      amount: float,
+                      mcc_code: Optional[str]) -> Dict[str, Any]:
+        """
+        Parse the agent response and tool results into the classification result
+        
+        Args:
+            result_text: Streamed response text
+            tool_results: (tool_name, result) pairs from run_streaming / arun_streaming
+            merchant_name: Merchant name that was classified
+            amount: Transaction amount
+            mcc_code: Optional pre-provided MCC code
             
-        except Exception as e:
-            # Fallback if Agno agent fails
-            return {
-                "category": "Other",
-                "subcategory": "General",
-                "confidence": "low",
-                "reasoning": f"Classification failed: {str(e)}",
-                "error": str(e),
-                "agent_used": "Classification Agent (Failed)",
-                "classification_method": "error"
+        Returns:
+            Dict with classification results
+        """
+        # Extract structured data from response
+        fields = self._extract_fields(result_text)
+        category = fields.get("CATEGORY")
+        subcategory = fields.get("SUBCATEGORY")
+        confidence = fields.get("CONFIDENCE")
+        agent_reasoning = fields.get("REASONING")
+        classification_method = fields.get("CLASSIFICATION_METHOD")
+        
+        # Tool results cover all turns - with parallel tool calls a single
+        # turn can carry several results
+        tool_calls_made = [content for _, content in tool_results]
+        
+        # Determine classification method from tool calls if not in response
+        if not classification_method:
+            classification_method = self._infer_classification_method(tool_results)
+        
+        return {
+            "category": category or "Other",
+            "subcategory": subcategory or "General",
+            "confidence": confidence.lower() if confidence else "medium",
+            "reasoning": agent_reasoning or result_text,
+            "raw_response": result_text,
+            "tool_calls": tool_calls_made,
+            "agent_used": "Classification Agent (Agno)",
+            "classification_method": classification_method or "genai_llm_default",
+            "user_preference_match": None,
+            "metadata": {
+                "merchant_analyzed": merchant_name,
+                "amount_analyzed": amount,
+                "mcc_provided": bool(mcc_code)
             }
+        }
     
-    def _extract_field(self, text: str, field_name: str) -> Optional[str]:
+    def error_result(self, error: Exception) -> Dict[str, Any]:
         """
-        Extract a field value from the agent response
+        Fallback classification when the Agno agent fails
         
         Args:
-            text: Agent response text
-            field_name: Field to extract (e.g., "CATEGORY", "CONFIDENCE")
+            error: Exception raised by the run
             
         Returns:
-            Extracted value or None
+            Dict with a low-confidence "Other" classification
         """
-        import re
-        pattern = rf"{field_name}:\s*(.+?)(?:\n|$)"
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            return match.group(1).strip()
+        return {
+            "category": "Other",
+            "subcategory": "General",
+            "confidence": "low",
+            "reasoning": f"Classification failed: {str(error)}",
+            "error": str(error),
+            "agent_used": "Classification Agent (Failed)",
+            "classification_method": "error"
+        }
+    
+    def _tool_payload(self, content: Any) -> Optional[Dict[str, Any]]:
+        """
+        Return a tool result as a dict (tool messages usually carry it serialized)
+        
+        Args:
+            content: Tool message content
+            
+        Returns:
+            Parsed dict or None
+        """
+        if isinstance(content, dict):
+            return content
+        if isinstance(content, str):
+            for parse in (json_loads, ast.literal_eval):
+                try:
+                    payload = parse(content)
+                except (ValueError, SyntaxError):
+                    continue
+                if isinstance(payload, dict):
+                    return payload
         return None
+    
+    def _infer_classification_method(self, tool_results: List[Tuple[Optional[str], Any]]) -> str:
+        """
+        Infer the classification method from the tools that produced a match
+        
+        Args:
+            tool_results: (tool_name, result) pairs from run_streaming / arun_streaming
+            
+        Returns:
+            Classification method name
+        """
+        called = {tool_name for tool_name, _ in tool_results}
+        if "match_to_custom_category" in called:
+            return "custom_categories_genai"
+        for tool_name, content in tool_results:
+            payload = self._tool_payload(content)
+            if tool_name in ("classify_by_mcc_code", "lookup_mcc_by_vendor") and payload and (payload.get('match') or payload.get('category')):
+                return "mcc_categorization"
+        return "genai_llm_default"
+    
+    def _extract_fields(self, text: str) -> Dict[str, str]:
+        """
+        Extract all response fields in a single pass over the agent response
+        
+        Args:
+            text: Agent response text
+            
+        Returns:
+            Dict of field name (upper case) to value, first occurrence wins
+        """
+        fields = {}
+        for match in _FIELDS_RE.finditer(text):
+            fields.setdefault(match.group(1).upper(), match.group(2).strip())
+        return fields
@@ -8,7 +8,28 @@ the classification based on the feedback, maintaining consistency and compliance
 from agno.agent import Agent
 from agno.models.azure import AzureOpenAI
 from typing import Dict, Any, Optional, List
-import json
+import re
+from tools.taxonomy import TRANSACTION_CATEGORIES
+from utils.custom_categories import get_custom_categories_manager
+from utils.parsers import json_loads
+
+
+# Phrases that signal a comment is asking for a different classification
+_CORRECTION_CUES = ("categor", "should be", "wrong", "incorrect", "actually", "misclassif", "instead", "belongs")
+_WORD_RE = re.compile(r"[a-z]{3,}")
+
+
+def _word_stems(names) -> set:
+    """Four-letter stems of the words in category names ("groceries" and "grocery" share "groc")"""
+    return {word[:4] for name in names for word in _WORD_RE.findall(name.lower())}
+
+
+# Stems from the default taxonomy names (e.g. "food", "dini", "groc")
+_TAXONOMY_STEMS = frozenset(_word_stems(
+    name
+    for category, subcategories in TRANSACTION_CATEGORIES.items()
+    for name in (category, *subcategories)
+))
 
 
 class FeedbackAgent:
@@ -105,6 +126,59 @@ class FeedbackAgent:
         Returns:
             Dictionary with updated classification and feedback processing details
         """
+        # Approvals and plain comments never change the classification -
+        # acknowledge them without an LLM round-trip
+        if feedback_type == "approval":
+            return self._acknowledge(original_classification, user_feedback, feedback_type, "User approved")
+        if feedback_type == "comment" and not self._mentions_category(user_feedback):
+            return self._acknowledge(original_classification, user_feedback, feedback_type, "Comment recorded")
+        
+        # Run the Agno agent
+        response = self.agent.run(self._build_prompt(original_classification, user_feedback, feedback_type))
+        return self._build_result(response, original_classification, user_feedback, feedback_type)
+    
+    async def aexecute(
+        self,
+        original_classification: Dict[str, Any],
+        user_feedback: str,
+        feedback_type: str = "correction"
+    ) -> Dict[str, Any]:
+        """
+        Async variant of execute() - awaits the Agno agent on the async client.
+        
+        Args:
+            original_classification: The original classification result
+            user_feedback: User's feedback text
+            feedback_type: Type of feedback - "correction", "comment", "approval"
+            
+        Returns:
+            Dictionary with updated classification and feedback processing details
+        """
+        if feedback_type == "approval":
+            return self._acknowledge(original_classification, user_feedback, feedback_type, "User approved")
+        if feedback_type == "comment" and not self._mentions_category(user_feedback):
+            return self._acknowledge(original_classification, user_feedback, feedback_type, "Comment recorded")
+        
+        response = await self.agent.arun(self._build_prompt(original_classification, user_feedback, feedback_type))
+        return self._build_result(response, original_classification, user_feedback, feedback_type)
+    
+    def _build_prompt(
+        self,
+        original_classification: Dict[str, Any],
+        user_feedback: str,
+        feedback_type: str
+    ) -> str:
+        """
+        Build the feedback processing prompt.
+        
+        Args:
+            original_classification: The original classification result
+            user_feedback: User's feedback text
+            feedback_type: Type of feedback
+            
+        Returns:
+            Prompt text
+        """
         # Extract transaction details for tool calls
         merchant_name = original_classification.get('merchant_name') or original_classification.get('preprocessing_data', {}).get('canonical_merchant', 'Unknown')
         description = original_classification.get('preprocessing_data', {}).get('normalized_text', '') or original_classification.get('description', '') or original_classification.get('merchant_name', 'Unknown')
@@ -113,7 +187,7 @@ class FeedbackAgent:
         original_subcategory = original_classification.get('subcategory', 'Unknown')
         
         # Build the feedback processing prompt
-        prompt = f"""
+        return f"""
         Process this user feedback for a transaction classification:
         
         ORIGINAL CLASSIFICATION:
@@ -146,29 +220,44 @@ class FeedbackAgent:
         
         Provide your response in JSON format with all required fields, including preference_stored and preference_id if you called the tool.
         """
+    
+    def _build_result(
+        self,
+        response: Any,
+        original_classification: Dict[str, Any],
+        user_feedback: str,
+        feedback_type: str
+    ) -> Dict[str, Any]:
+        """
+        Parse the agent response into the updated classification.
         
-        # Run the Agno agent
-        response = self.agent.run(prompt)
+        Args:
+            response: Agno run output
+            original_classification: The original classification result
+            user_feedback: User's feedback text
+            feedback_type: Type of feedback
+            
+        Returns:
+            Dictionary with updated classification and feedback processing details
+        """
+        original_category = original_classification.get('category', 'Unknown')
+        original_subcategory = original_classification.get('subcategory', 'Unknown')
         
         # Extract the response content
-        if hasattr(response, 'content'):
-            response_text = response.content
-        else:
-            response_text = str(response)
+        response_text = getattr(response, 'content', None) or str(response)
         
         # Check if tool was called (store_user_preference)
-        preference_stored = False
-        preference_id = None
-        tool_calls_made = []
-        
-        if hasattr(response, 'messages'):
-            for msg in response.messages:
-                if hasattr(msg, 'role') and msg.role == 'tool':
-                    tool_calls_made.append(msg.content if hasattr(msg, 'content') else str(msg))
-                    # Check if store_user_preference was called
-                    if isinstance(msg.content, dict) and msg.content.get('stored'):
-                        preference_stored = True
-                        preference_id = msg.content.get('preference_id')
+        tool_calls_made = [
+            getattr(msg, 'content', str(msg))
+            for msg in getattr(response, 'messages', None) or ()
+            if getattr(msg, 'role', None) == 'tool'
+        ]
+        stored = next(
+            (content for content in tool_calls_made if isinstance(content, dict) and content.get('stored')),
+            None
+        )
+        preference_stored = stored is not None
+        preference_id = stored.get('preference_id') if stored else None
         
         # Parse the JSON response
         try:
@@ -215,6 +304,66 @@ class FeedbackAgent:
                 'feedback_type': feedback_type
             }
     
+    def _mentions_category(self, text: str) -> bool:
+        """
+        Keyword scan for a category mention or correction cue in user feedback.
+        
+        Args:
+            text: User feedback text
+            
+        Returns:
+            True if the feedback may ask for a classification change
+        """
+        lowered = (text or "").lower()
+        if any(cue in lowered for cue in _CORRECTION_CUES):
+            return True
+        stems = _word_stems([lowered])
+        if stems & _TAXONOMY_STEMS:
+            return True
+        custom_stems = _word_stems(
+            name
+            for category, subcategories in get_custom_categories_manager().get_categories().items()
+            for name in (category, *subcategories)
+        )
+        return bool(stems & custom_stems)
+    
+    def _acknowledge(
+        self,
+        original_classification: Dict[str, Any],
+        user_feedback: str,
+        feedback_type: str,
+        note: str
+    ) -> Dict[str, Any]:
+        """
+        Build a no-update feedback result without calling the LLM.
+        
+        Args:
+            original_classification: The original classification result
+            user_feedback: User's feedback text
+            feedback_type: Type of feedback - "comment" or "approval"
+            note: Short note recorded as the applied feedback
+            
+        Returns:
+            Dictionary with the original classification preserved
+        """
+        return {
+            'updated': False,
+            'category': original_classification.get('category'),
+            'subcategory': original_classification.get('subcategory'),
+            'confidence': original_classification.get('confidence'),
+            'mcc_code': original_classification.get('mcc_code'),
+            'mcc_description': original_classification.get('mcc_description'),
+            'feedback_applied': note,
+            'audit_notes': f'{note}: "{user_feedback}". Classification unchanged.',
+            'reasoning': 'No classification change requested',
+            'agent_used': 'FeedbackAgent (fast path)',
+            'feedback_received': user_feedback,
+            'feedback_type': feedback_type,
+            'original_category': original_classification.get('category', 'Unknown'),
+            'original_subcategory': original_classification.get('subcategory', 'Unknown'),
+            'preference_stored': False
+        }
+    
     def _parse_json_response(self, response_text: str) -> Dict[str, Any]:
         """
         Parse JSON from the agent's response.
@@ -225,18 +374,15 @@ class FeedbackAgent:
         Returns:
             Parsed JSON dictionary
         """
-        # Try to find JSON in the response
-        import re
-        
         # Look for JSON block
         json_match = re.search(r'\{[\s\S]*\}', response_text)
         if json_match:
             json_str = json_match.group(0)
-            return json.loads(json_str)
+            return json_loads(json_str)
         
         # If no JSON found, try to parse the entire response
         try:
-            return json.loads(response_text)
+            return json_loads(response_text)
         except:
             # Return a basic structure
             return {
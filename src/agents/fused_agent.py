@@ -0,0 +1,208 @@
+"""Fused Agent - Classifies and validates a transaction in a single Agno agent run"""
+import asyncio
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from agno.agent import Agent
+from agents.classification_agent import _CLASSIFICATION_STEPS
+from agents.governance_agent import _VALIDATION_STEPS
+from agents.streaming import run_streaming, arun_streaming
+
+
+# Static part of the fused prompt - the classification tool plan and taxonomy, then
+# the audit tasks, answered in one response carrying both sets of fields
+_FUSED_STEPS = _CLASSIFICATION_STEPS + """
+**Then audit your own classification:**
+
+- If the transaction details have no MCC code, call assign_mcc_code_for_category with your category and subcategory (together with match_to_custom_category in turn 2 when that is needed).
+- Then complete the validation tasks below and answer with BOTH blocks, classification first.
+
+""" + _VALIDATION_STEPS
+
+
+class FusedAgent:
+    """
+    Agno Agent that classifies a transaction and audits that classification in one run,
+    saving the second agent's round trips and its copy of the system prompt.
+    Prompt building and response parsing are shared with the ClassificationAgent and
+    GovernanceAgent it wraps, so results have exactly their shape.
+    """
+    
+    def __init__(self, classification_agent, governance_agent):
+        """
+        Initialize the Fused Agent with Agno
+        
+        Args:
+            classification_agent: ClassificationAgent instance (model, tools, parsing)
+            governance_agent: GovernanceAgent instance (tools, parsing)
+        """
+        self.classification_agent = classification_agent
+        self.governance_agent = governance_agent
+        self.agent_name = "FusedAgent"
+        
+        # Create Agno Agent with both tool sets
+        self.agent = Agent(
+            name="Transaction Classifier and Auditor",
+            id="fused-agent",
+            model=classification_agent.llm,
+            tools=classification_agent.tools + governance_agent.tools,
+            description="Expert at classifying financial transactions and auditing the classification for compliance",
+            instructions=classification_agent.agent.instructions + [
+                "After deciding, audit your own classification as a financial compliance specialist: verify the category fits the merchant, assign or verify the MCC code, justify or adjust the confidence and flag genuine concerns."
+            ],
+            additional_context=_FUSED_STEPS,
+            tool_choice="auto",
+            markdown=False,
+            add_history_to_context=True
+        )
+    
+    def execute(self,
+                merchant_name: str,
+                description: str,
+                amount: float,
+                mcc_code: Optional[str] = None,
+                metadata: Optional[Dict] = None,
+                on_token: Optional[Callable[[str], None]] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Classify and validate a transaction with a single agent run
+        
+        Args:
+            merchant_name: Merchant name from preprocessing
+            description: Cleaned transaction description
+            amount: Transaction amount
+            mcc_code: Optional pre-provided MCC code
+            metadata: Additional metadata from preprocessing
+            on_token: Optional callback receiving the response text accumulated so far
+        
+        Returns:
+            Tuple of (classification result, governance result), shaped as the
+            ClassificationAgent and GovernanceAgent results
+        """
+        prompt = self.classification_agent.build_prompt(merchant_name, description, amount, mcc_code, metadata)
+        
+        try:
+            rule_results = self._rule_based_results(merchant_name, description, amount, mcc_code, metadata)
+            if rule_results is not None:
+                return rule_results
+            result_text, tool_results = run_streaming(self.agent, prompt, on_token)
+            return self._build_results(result_text, tool_results, merchant_name, amount, mcc_code, metadata)
+        
+        except Exception as e:
+            return self._error_results(e, merchant_name, amount, mcc_code, metadata)
+    
+    async def aexecute(self,
+                       merchant_name: str,
+                       description: str,
+                       amount: float,
+                       mcc_code: Optional[str] = None,
+                       metadata: Optional[Dict] = None,
+                       on_token: Optional[Callable[[str], None]] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Async variant of execute() - awaits the Agno agent on the async client
+        
+        Args:
+            merchant_name: Merchant name from preprocessing
+            description: Cleaned transaction description
+            amount: Transaction amount
+            mcc_code: Optional pre-provided MCC code
+            metadata: Additional metadata from preprocessing
+            on_token: Optional callback receiving the response text accumulated so far
+        
+        Returns:
+            Tuple of (classification result, governance result)
+        """
+        prompt = self.classification_agent.build_prompt(merchant_name, description, amount, mcc_code, metadata)
+        
+        try:
+            # The preference lookup does file I/O - keep it off the event loop
+            rule_results = await asyncio.to_thread(self._rule_based_results, merchant_name, description, amount, mcc_code, metadata)
+            if rule_results is not None:
+                return rule_results
+            result_text, tool_results = await arun_streaming(self.agent, prompt, on_token)
+            return self._build_results(result_text, tool_results, merchant_name, amount, mcc_code, metadata)
+        
+        except Exception as e:
+            return self._error_results(e, merchant_name, amount, mcc_code, metadata)
+    
+    def _rule_based_results(self,
+                            merchant_name: str,
+                            description: str,
+                            amount: float,
+                            mcc_code: Optional[str],
+                            metadata: Optional[Dict]) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Classify and validate by lookups alone when a deterministic priority decides the category
+        
+        Returns:
+            Tuple of (classification result, governance result), or None when the LLM has to decide
+        """
+        classification_result = self.classification_agent.rule_based_result(merchant_name, description, amount, mcc_code)
+        if classification_result is None:
+            return None
+        governance_result = self.governance_agent.rule_based_result(
+            merchant_name,
+            amount,
+            classification_result["category"],
+            classification_result["confidence"],
+            classification_result["reasoning"],
+            classification_result["subcategory"],
+            mcc_code,
+            metadata
+        )
+        return classification_result, governance_result
+    
+    def _build_results(self,
+                       result_text: str,
+                       tool_results: List[Tuple[Optional[str], Any]],
+                       merchant_name: str,
+                       amount: float,
+                       mcc_code: Optional[str],
+                       metadata: Optional[Dict]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Parse the fused response with the classification and governance parsers
+        
+        Returns:
+            Tuple of (classification result, governance result)
+        """
+        classification_result = self.classification_agent.build_result(
+            result_text, tool_results, merchant_name, amount, mcc_code
+        )
+        classification_result["agent_used"] = "Fused Classification + Governance Agent (Agno)"
+        governance_result = self.governance_agent.build_result(
+            result_text,
+            merchant_name,
+            amount,
+            classification_result["category"],
+            classification_result["confidence"],
+            classification_result["reasoning"],
+            classification_result["subcategory"],
+            mcc_code,
+            metadata,
+            tool_results=[content for tool_name, content in tool_results if tool_name == "assign_mcc_code_for_category"]
+        )
+        governance_result["agent_used"] = "Fused Classification + Governance Agent (Agno)"
+        return classification_result, governance_result
+    
+    def _error_results(self,
+                       error: Exception,
+                       merchant_name: str,
+                       amount: float,
+                       mcc_code: Optional[str],
+                       metadata: Optional[Dict]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Fallback results when the Agno agent fails
+        
+        Returns:
+            Tuple of (classification error result, governance error result)
+        """
+        classification_result = self.classification_agent.error_result(error)
+        governance_result = self.governance_agent.error_result(
+            error,
+            merchant_name,
+            amount,
+            classification_result["category"],
+            classification_result["confidence"],
+            classification_result["reasoning"],
+            classification_result["subcategory"],
+            mcc_code,
+            metadata
+        )
+        return classification_result, governance_result
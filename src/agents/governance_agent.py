@@ -1,6 +1,35 @@
 """Governance Agent - Validates and audits classifications using Agno framework"""
-from typing import Dict, Any, Optional
+import re
+from typing import Dict, Any, Callable, List, Optional
 from agno.agent import Agent, RunOutput
+from tools.mcc_codes import assign_mcc_code_for_category, classify_by_mcc_code
+from utils.prompt_cache import get_prompt_cache_stats
+from agents.streaming import arun_streaming
+
+
+# Static part of the validation prompt - sent as system context so every
+# request shares the same prompt prefix
+_VALIDATION_STEPS = """**Your Validation Tasks:**
+1. **Category Validation**: Is the category appropriate for this merchant/transaction?
+2. **MCC Code Assignment**: If an MCC code was provided, verify it matches the category; otherwise use assign_mcc_code_for_category tool to assign the correct MCC code
+3. **Confidence Assessment**: Is the confidence level justified? Should it be adjusted?
+4. **Compliance Check**: Are there any concerns or flags? (e.g., unusual amount, category mismatch, suspicious patterns)
+
+**Respond in this exact format:**
+VALIDATION: [PASS/FAIL]
+ADJUSTED_CONFIDENCE: [HIGH/MEDIUM/LOW]
+MCC_CODE: [4-digit code]
+MCC_DESCRIPTION: [description]
+FLAGS: [any concerns or "none"]
+AUDIT_NOTES: [detailed validation notes explaining your decisions]
+"""
+# System message for Azure OpenAI Batch API requests - tools cannot run offline, so
+# the assign_mcc_code_for_category lookup is run locally and added to the prompt
+_BATCH_API_SYSTEM = """You are a financial compliance and audit specialist validating transaction classifications.
+
+**Offline batch mode:** no tools are available. When no MCC code was provided, the transaction lists the MCC code assign_mcc_code_for_category chose for its category - verify it and use it unless it clearly does not fit.
+
+""" + _VALIDATION_STEPS
 
 
 class GovernanceAgent:
@@ -46,6 +75,7 @@ class GovernanceAgent:
                 "8. Provide clear audit notes explaining validation decisions.",
                 "Always maintain objectivity and flag genuine concerns for review."
             ],
+            additional_context=_VALIDATION_STEPS,
             markdown=False,
             add_history_to_context=True
         )
@@ -59,7 +89,8 @@ class GovernanceAgent:
                 reasoning: str,
                 subcategory: Optional[str] = None,
                 mcc_code: Optional[str] = None,
-                metadata: Optional[Dict] = None) -> Dict[str, Any]:
+                metadata: Optional[Dict] = None,
+                rule_based: bool = False) -> Dict[str, Any]:
         """
         Execute governance and validation using Agno Agent
         
@@ -73,12 +104,178 @@ class GovernanceAgent:
             subcategory: Specific subcategory
             mcc_code: Optional pre-provided MCC code
             metadata: Additional metadata
+            rule_based: The classification came from a deterministic lookup
+                        (validated by rule_based_result, without an LLM call)
             
         Returns:
             Dict with complete validated transaction data
         """
+        if rule_based:
+            return self.rule_based_result(
+                merchant_name, amount, category, confidence, reasoning, subcategory, mcc_code, metadata
+            )
+        
         # Build governance validation prompt
-        validation_prompt = f"""Review and validate this transaction classification.
+        validation_prompt = self._build_prompt(
+            merchant_name, description, amount, category, confidence, reasoning, subcategory, mcc_code
+        )
+        
+        try:
+            # Run Agno Agent for validation
+            response: RunOutput = self.agent.run(validation_prompt)
+            get_prompt_cache_stats().record(response.metrics)
+            return self.build_result(
+                response, merchant_name, amount, category, confidence, reasoning, subcategory, mcc_code, metadata
+            )
+            
+        except Exception as e:
+            # Fallback if Agno agent fails
+            return self.error_result(
+                e, merchant_name, amount, category, confidence, reasoning, subcategory, mcc_code, metadata
+            )
+    
+    async def aexecute(self,
+                       merchant_name: str,
+                       description: str,
+                       amount: float,
+                       category: str,
+                       confidence: str,
+                       reasoning: str,
+                       subcategory: Optional[str] = None,
+                       mcc_code: Optional[str] = None,
+                       metadata: Optional[Dict] = None,
+                       on_token: Optional[Callable[[str], None]] = None,
+                       rule_based: bool = False) -> Dict[str, Any]:
+        """
+        Async variant of execute() - awaits the Agno agent on the async client
+        
+        Args:
+            merchant_name: Merchant name
+            description: Transaction description
+            amount: Transaction amount
+            category: Classified category
+            confidence: Classification confidence
+            reasoning: Classification reasoning
+            subcategory: Specific subcategory
+            mcc_code: Optional pre-provided MCC code
+            metadata: Additional metadata
+            on_token: Optional callback receiving the accumulated response text as it streams
+            rule_based: The classification came from a deterministic lookup
+            
+        Returns:
+            Dict with complete validated transaction data
+        """
+        if rule_based:
+            return self.rule_based_result(
+                merchant_name, amount, category, confidence, reasoning, subcategory, mcc_code, metadata
+            )
+        
+        validation_prompt = self._build_prompt(
+            merchant_name, description, amount, category, confidence, reasoning, subcategory, mcc_code
+        )
+        
+        try:
+            if on_token:
+                result_text, tool_results = await arun_streaming(self.agent, validation_prompt, on_token)
+                return self.build_result(
+                    result_text, merchant_name, amount, category, confidence, reasoning, subcategory, mcc_code, metadata,
+                    tool_results=[content for _, content in tool_results]
+                )
+            response: RunOutput = await self.agent.arun(validation_prompt)
+            get_prompt_cache_stats().record(response.metrics)
+            return self.build_result(
+                response, merchant_name, amount, category, confidence, reasoning, subcategory, mcc_code, metadata
+            )
+            
+        except Exception as e:
+            return self.error_result(
+                e, merchant_name, amount, category, confidence, reasoning, subcategory, mcc_code, metadata
+            )
+    
+    def build_batch_api_body(self,
+                             deployment: str,
+                             merchant_name: str,
+                             description: str,
+                             amount: float,
+                             category: str,
+                             confidence: str,
+                             reasoning: str,
+                             subcategory: Optional[str] = None,
+                             mcc_code: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Build one Azure OpenAI Batch API chat completion body validating a classification.
+        The MCC assignment lookup runs locally and goes into the prompt.
+        
+        Args:
+            deployment: Azure deployment name of the global-batch model
+            (remaining arguments as for execute())
+            
+        Returns:
+            Request body for the batch JSONL line
+        """
+        prompt = self._build_prompt(
+            merchant_name, description, amount, category, confidence, reasoning, subcategory, mcc_code
+        )
+        if not mcc_code:
+            assigned = assign_mcc_code_for_category.entrypoint(category, subcategory)
+            prompt += f"- Assigned MCC: {assigned['mcc_code']} ({assigned['mcc_description']}, {assigned['match_quality']} match)\n"
+        return {
+            "model": deployment,
+            "messages": [
+                {"role": "system", "content": _BATCH_API_SYSTEM},
+                {"role": "user", "content": prompt}
+            ]
+        }
+    
+    def parse_batch_api_result(self,
+                               body: Dict[str, Any],
+                               merchant_name: str,
+                               amount: float,
+                               category: str,
+                               confidence: str,
+                               reasoning: str,
+                               subcategory: Optional[str] = None,
+                               mcc_code: Optional[str] = None,
+                               metadata: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
+        """
+        Convert a Batch API chat completion body into the governance result
+        
+        Args:
+            body: Response body for the request built by build_batch_api_body()
+            (remaining arguments as for execute())
+            
+        Returns:
+            Dict with complete validated transaction data, or None if the body has no answer
+        """
+        try:
+            content = body["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            return None
+        if not content:
+            return None
+        result = self.build_result(
+            content, merchant_name, amount, category, confidence, reasoning, subcategory, mcc_code, metadata
+        )
+        result["agent_used"] = "Governance Agent (Azure Batch API)"
+        return result
+    
+    def _build_prompt(self,
+                      merchant_name: str,
+                      description: str,
+                      amount: float,
+                      category: str,
+                      confidence: str,
+                      reasoning: str,
+                      subcategory: Optional[str] = None,
+                      mcc_code: Optional[str] = None) -> str:
+        """
+        Build the governance validation prompt (transaction and classification only;
+        the validation tasks are sent as system context)
+        
+        Returns:
+            Prompt text
+        """
+        return f"""Review and validate this transaction classification.
 
 **Transaction Details:**
 - Merchant: {merchant_name}
@@ -91,88 +288,153 @@ class GovernanceAgent:
 - Confidence: {confidence.upper()}
 - Reasoning: {reasoning}
 {f"- MCC Code: {mcc_code} (provided by user)" if mcc_code else "- MCC Code: Not provided - use assign_mcc_code_for_category tool"}
+"""
+    
+    def build_result(self,
+                      response,
+                      merchant_name: str,
+                      amount: float,
+                      category: str,
+                      confidence: str,
+                      reasoning: str,
+                      subcategory: Optional[str] = None,
+                      mcc_code: Optional[str] = None,
+                      metadata: Optional[Dict] = None,
+                      tool_results: Optional[List[Any]] = None) -> Dict[str, Any]:
+        """
+        Parse the validation response (a RunOutput, or the response text) into the final structured output
+        
+        Args:
+            tool_results: Tool outputs collected while streaming, used when response is plain text
+        
+        Returns:
+            Dict with complete validated transaction data
+        """
+        # Parse agent response
+        result_text = getattr(response, 'content', None) or str(response)
+        
+        # Extract structured data from validation response
+        validation_status = self._extract_field(result_text, "VALIDATION") or "PASS"
+        adjusted_confidence = self._extract_field(result_text, "ADJUSTED_CONFIDENCE") or confidence
+        final_mcc_code = self._extract_field(result_text, "MCC_CODE") or mcc_code or "5999"
+        mcc_description = self._extract_field(result_text, "MCC_DESCRIPTION") or "Miscellaneous"
+        flags_text = self._extract_field(result_text, "FLAGS") or "none"
+        audit_notes = self._extract_field(result_text, "AUDIT_NOTES") or "Validation completed"
 
-**Your Validation Tasks:**
-1. **Category Validation**: Is the category appropriate for this merchant/transaction?
-2. **MCC Code Assignment**: {"Verify the provided MCC code matches the category" if mcc_code else "Use assign_mcc_code_for_category tool to assign the correct MCC code"}
-3. **Confidence Assessment**: Is the confidence level justified? Should it be adjusted?
-4. **Compliance Check**: Are there any concerns or flags? (e.g., unusual amount, category mismatch, suspicious patterns)
+        # Parse flags
+        flags = None
+        if flags_text.lower() != "none":
+            flags = [flag.strip() for flag in flags_text.split(",") if flag.strip()]
 
-**Respond in this exact format:**
-VALIDATION: [PASS/FAIL]
-ADJUSTED_CONFIDENCE: [HIGH/MEDIUM/LOW]
-MCC_CODE: [4-digit code]
-MCC_DESCRIPTION: [description]
-FLAGS: [any concerns or "none"]
-AUDIT_NOTES: [detailed validation notes explaining your decisions]
-"""
+        # Get tool calls info if available
+        tool_calls_made = [
+            getattr(msg, 'content', str(msg))
+            for msg in getattr(response, 'messages', None) or ()
+            if getattr(msg, 'role', None) == 'tool'
+        ] if tool_results is None else list(tool_results)
+
+        # Generate final structured output
+        return {
+            "merchant_name": merchant_name,
+            "category": category,
+            "subcategory": subcategory or "General",
+            "mcc_code": final_mcc_code,
+            "mcc_description": mcc_description,
+            "confidence": adjusted_confidence.lower(),
+            "reasoning": reasoning,
+            "amount": amount,
+            "validation_status": validation_status,
+            "flags": flags,
+            "audit_notes": audit_notes,
+            "governance_response": result_text,
+            "tool_calls": tool_calls_made,
+            "metadata": metadata,
+            "agent_used": "Agno Governance Agent",
+            "status": "success"
+        }
+    
+    def rule_based_result(self,
+                           merchant_name: str,
+                           amount: float,
+                           category: str,
+                           confidence: str,
+                           reasoning: str,
+                           subcategory: Optional[str] = None,
+                           mcc_code: Optional[str] = None,
+                           metadata: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        Validate a deterministic classification with the MCC tools alone - the decision came
+        from a user preference or the MCC database, so there is no reasoning for an LLM to audit.
+        A provided MCC code is kept and flagged when its category differs from the classification;
+        otherwise one is assigned for the category.
         
-        try:
-            # Run Agno Agent for validation
-            response: RunOutput = self.agent.run(validation_prompt)
-            
-            # Parse agent response
-            result_text = response.content if hasattr(response, 'content') else str(response)
-            
-            # Extract structured data from validation response
-            validation_status = self._extract_field(result_text, "VALIDATION") or "PASS"
-            adjusted_confidence = self._extract_field(result_text, "ADJUSTED_CONFIDENCE") or confidence
-            final_mcc_code = self._extract_field(result_text, "MCC_CODE") or mcc_code or "5999"
-            mcc_description = self._extract_field(result_text, "MCC_DESCRIPTION") or "Miscellaneous"
-            flags_text = self._extract_field(result_text, "FLAGS") or "none"
-            audit_notes = self._extract_field(result_text, "AUDIT_NOTES") or "Validation completed"
-            
-            # Parse flags
-            flags = None
-            if flags_text.lower() != "none":
-                flags = [flag.strip() for flag in flags_text.split(",") if flag.strip()]
-            
-            # Get tool calls info if available
-            tool_calls_made = []
-            if hasattr(response, 'messages'):
-                for msg in response.messages:
-                    if hasattr(msg, 'role') and msg.role == 'tool':
-                        tool_calls_made.append(msg.content if hasattr(msg, 'content') else str(msg))
-            
-            # Generate final structured output
-            return {
-                "merchant_name": merchant_name,
-                "category": category,
-                "subcategory": subcategory or "General",
-                "mcc_code": final_mcc_code,
-                "mcc_description": mcc_description,
-                "confidence": adjusted_confidence.lower(),
-                "reasoning": reasoning,
-                "amount": amount,
-                "validation_status": validation_status,
-                "flags": flags,
-                "audit_notes": audit_notes,
-                "governance_response": result_text,
-                "tool_calls": tool_calls_made,
-                "metadata": metadata,
-                "agent_used": "Agno Governance Agent",
-                "status": "success"
-            }
-            
-        except Exception as e:
-            # Fallback if Agno agent fails
-            return {
-                "merchant_name": merchant_name,
-                "category": category,
-                "subcategory": subcategory or "General",
-                "mcc_code": mcc_code or "5999",
-                "mcc_description": "Miscellaneous",
-                "confidence": confidence.lower(),
-                "reasoning": reasoning,
-                "amount": amount,
-                "validation_status": "ERROR",
-                "flags": [f"Validation failed: {str(e)}"],
-                "audit_notes": f"Governance validation encountered an error: {str(e)}",
-                "error": str(e),
-                "metadata": metadata,
-                "agent_used": "Agno Governance Agent (Failed)",
-                "status": "error"
-            }
+        Returns:
+            Dict with complete validated transaction data
+        """
+        flags = None
+        if mcc_code:
+            mcc = classify_by_mcc_code.entrypoint(str(mcc_code))
+            final_mcc_code, mcc_description = mcc_code, mcc['mcc_description']
+            if mcc.get('category') and mcc['category'] != category:
+                flags = [f"MCC {mcc_code} ({mcc_description}) is listed under {mcc['category']}, classified as {category}"]
+            tool_calls = [mcc]
+        else:
+            assigned = assign_mcc_code_for_category.entrypoint(category, subcategory)
+            final_mcc_code, mcc_description = assigned['mcc_code'], assigned['mcc_description']
+            tool_calls = [assigned]
+        
+        return {
+            "merchant_name": merchant_name,
+            "category": category,
+            "subcategory": subcategory or "General",
+            "mcc_code": final_mcc_code,
+            "mcc_description": mcc_description,
+            "confidence": confidence.lower(),
+            "reasoning": reasoning,
+            "amount": amount,
+            "validation_status": "PASS",
+            "flags": flags,
+            "audit_notes": f"Deterministic classification validated by rule, without an LLM call. MCC {final_mcc_code} ({mcc_description}) {'as provided' if mcc_code else 'assigned for the category'}.",
+            "governance_response": "",
+            "tool_calls": tool_calls,
+            "metadata": metadata,
+            "agent_used": "Governance Agent (rules, no LLM)",
+            "status": "success"
+        }
+    
+    def error_result(self,
+                      error: Exception,
+                      merchant_name: str,
+                      amount: float,
+                      category: str,
+                      confidence: str,
+                      reasoning: str,
+                      subcategory: Optional[str] = None,
+                      mcc_code: Optional[str] = None,
+                      metadata: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        Fallback output when the Agno agent fails
+        
+        Returns:
+            Dict with the classification passed through and an ERROR validation status
+        """
+        return {
+            "merchant_name": merchant_name,
+            "category": category,
+            "subcategory": subcategory or "General",
+            "mcc_code": mcc_code or "5999",
+            "mcc_description": "Miscellaneous",
+            "confidence": confidence.lower(),
+            "reasoning": reasoning,
+            "amount": amount,
+            "validation_status": "ERROR",
+            "flags": [f"Validation failed: {str(error)}"],
+            "audit_notes": f"Governance validation encountered an error: {str(error)}",
+            "error": str(error),
+            "metadata": metadata,
+            "agent_used": "Agno Governance Agent (Failed)",
+            "status": "error"
+        }
     
     def _extract_field(self, text: str, field_name: str) -> Optional[str]:
         """
@@ -185,7 +447,6 @@ AUDIT_NOTES: [detailed validation notes explaining your decisions]
         Returns:
             Extracted value or None
         """
-        import re
         pattern = rf"{field_name}:\s*(.+?)(?:\n|$)"
         match = re.search(pattern, text, re.IGNORECASE)
         if match:
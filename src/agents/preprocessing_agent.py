@@ -1,7 +1,10 @@
 """Preprocessing Agent - Extracts and cleans transaction data"""
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, List, Optional
+import asyncio
 import re
 import hashlib
+from functools import lru_cache
+import pandas as pd
 import spacy
 
 # Load spaCy English model for advanced NLP (lemmatization, POS tagging)
@@ -12,6 +15,17 @@ except OSError:
     print("Warning: spaCy model 'en_core_web_sm' not found. Run: python -m spacy download en_core_web_sm")
     nlp = None
 
+# Regexes compiled once per process
+_TOKEN_RE = re.compile(r'\b\w+\b')
+_NON_ALNUM_RE = re.compile(r'[^A-Z0-9\s]')
+_STATE_RE = re.compile(r'\b([A-Z]{2})\b')
+
+
+@lru_cache(maxsize=8192)
+def _hash_token(value: str) -> str:
+    """First 16 hex digits of the SHA-256 of value - CMIDs and sensitive-data tokens (memoized, values repeat across a batch)"""
+    return hashlib.sha256(value.encode()).hexdigest()[:16]
+
 
 class PreprocessingAgent:
     """
@@ -41,6 +55,9 @@ class PreprocessingAgent:
             r'\*+',            # Asterisks
             r'REF:\w+',        # Reference codes
         ]
+        # Applied one after another, in list order - a single alternation would match
+        # differently (e.g. REF:CA123) and change the CMIDs of existing cache keys
+        self._noise_res = [re.compile(pattern, re.IGNORECASE) for pattern in self.noise_patterns]
         
         # Known merchant variations for canonicalization
         self.merchant_canonical_map = {
@@ -77,9 +94,26 @@ class PreprocessingAgent:
             return tokens
         else:
             # Fallback to regex if spaCy not available
-            tokens = re.findall(r'\b\w+\b', text.upper())
+            tokens = _TOKEN_RE.findall(text.upper())
             return tokens
     
+    def _tokenize_many(self, texts: Iterable[str]) -> List[list]:
+        """
+        Batch form of _tokenize - streams the texts through nlp.pipe
+        
+        Args:
+            texts: Raw transaction texts
+            
+        Returns:
+            Token list per text (same tokens as _tokenize)
+        """
+        if nlp:
+            return [
+                [token.lemma_.upper() for token in doc if not token.is_stop and not token.is_punct and token.is_alpha]
+                for doc in nlp.pipe(text.lower() for text in texts)
+            ]
+        return [_TOKEN_RE.findall(text.upper()) for text in texts]
+    
     def _remove_noise(self, text: str) -> str:
         """
         Remove noise patterns from transaction description
@@ -91,8 +125,8 @@ class PreprocessingAgent:
             Cleaned text without noise
         """
         cleaned = text
-        for pattern in self.noise_patterns:
-            cleaned = re.sub(pattern, '', cleaned, flags=re.IGNORECASE)
+        for pattern in self._noise_res:
+            cleaned = pattern.sub('', cleaned)
         
         # Remove extra whitespace
         cleaned = ' '.join(cleaned.split())
@@ -121,11 +155,28 @@ class PreprocessingAgent:
         else:
             # Fallback to basic normalization
             normalized = text.upper()
-            normalized = re.sub(r'[^A-Z0-9\s]', '', normalized)
+            normalized = _NON_ALNUM_RE.sub('', normalized)
             normalized = ' '.join(normalized.split())
         
         return normalized
     
+    def _normalize_many(self, texts: Iterable[str]) -> List[str]:
+        """
+        Batch form of _normalize_text - streams the texts through nlp.pipe
+        
+        Args:
+            texts: Texts to normalize
+            
+        Returns:
+            Normalized text per input (same output as _normalize_text)
+        """
+        if nlp:
+            return [
+                ' '.join(token.lemma_ for token in doc if not token.is_stop and not token.is_punct and token.is_alpha).upper()
+                for doc in nlp.pipe(text.lower() for text in texts)
+            ]
+        return [self._normalize_text(text) for text in texts]
+    
     def _canonicalize_merchant(self, merchant_text: str) -> tuple[str, str]:
         """
         Canonicalize merchant name to standard form and create CMID
@@ -143,13 +194,11 @@ class PreprocessingAgent:
             for variation in variations:
                 if variation in merchant_upper:
                     # Create CMID using SHA-256 hash
-                    cmid = hashlib.sha256(canonical.encode()).hexdigest()[:16]
-                    return canonical, cmid
+                    return canonical, _hash_token(canonical)
         
         # If no match, use normalized text and create CMID
         canonical = merchant_text.strip()
-        cmid = hashlib.sha256(canonical.upper().encode()).hexdigest()[:16]
-        return canonical, cmid
+        return canonical, _hash_token(canonical.upper())
     
     def _tokenize_sensitive_data(self, amount: float, mcc_code: Optional[str] = None) -> Dict[str, str]:
         """
@@ -163,8 +212,8 @@ class PreprocessingAgent:
             Dict with tokenized data
         """
         # Create tokenized representations (in production, use proper encryption)
-        amount_token = hashlib.sha256(f"AMT_{amount}".encode()).hexdigest()[:16]
-        mcc_token = hashlib.sha256(f"MCC_{mcc_code}".encode()).hexdigest()[:16] if mcc_code else None
+        amount_token = _hash_token(f"AMT_{amount}")
+        mcc_token = _hash_token(f"MCC_{mcc_code}") if mcc_code else None
         
         return {
             "amount_token": amount_token,
@@ -184,8 +233,7 @@ class PreprocessingAgent:
             Location string if found, None otherwise
         """
         # Common US state codes
-        state_pattern = r'\b([A-Z]{2})\b'
-        match = re.search(state_pattern, text)
+        match = _STATE_RE.search(text)
         
         if match:
             state = match.group(1)
@@ -279,3 +327,111 @@ class PreprocessingAgent:
                 "security_compliant": True
             }
         }
+    
+    def execute_batch(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Run the preprocessing pipeline over a whole DataFrame of transactions.
+        
+        Regex steps run as vectorized pandas string operations; spaCy work goes through
+        nlp.pipe once per distinct text. Values match execute() row for row, including
+        the CMIDs, so batch and single-transaction results share cache keys.
+        
+        Args:
+            df: DataFrame with description and amount columns, and optional
+                merchant_name / mcc_code columns (missing values allowed)
+            
+        Returns:
+            DataFrame on the same index with one column per key of the execute() result
+        """
+        descriptions = df['description'].astype(str)
+        none_column = pd.Series(None, index=df.index, dtype=object)
+        merchant_names = df['merchant_name'].astype(object).where(df['merchant_name'].notna(), None) if 'merchant_name' in df else none_column
+        mcc_codes = df['mcc_code'].astype(object).where(df['mcc_code'].notna(), None) if 'mcc_code' in df else none_column
+        
+        # Step 1: Tokenization (once per distinct description)
+        unique_descriptions = pd.unique(descriptions)
+        tokens = descriptions.map(dict(zip(unique_descriptions, self._tokenize_many(unique_descriptions))))
+        
+        # Step 2: Noise Removal
+        cleaned = descriptions
+        for pattern in self._noise_res:
+            cleaned = cleaned.str.replace(pattern, '', regex=True)
+        cleaned = cleaned.str.split().str.join(' ')
+        
+        # Step 3: Text Normalization
+        unique_cleaned = pd.unique(cleaned)
+        normalized = cleaned.map(dict(zip(unique_cleaned, self._normalize_many(unique_cleaned))))
+        
+        # Merchant name: normalized if provided, else first meaningful tokens
+        has_merchant = merchant_names.map(bool)
+        provided = merchant_names[has_merchant].astype(str)
+        unique_provided = pd.unique(provided)
+        merchants = pd.Series("UNKNOWN", index=df.index, dtype=object)
+        merchants[has_merchant] = provided.map(dict(zip(unique_provided, self._normalize_many(unique_provided))))
+        derive = ~has_merchant & normalized.astype(bool)
+        merchants[derive] = tokens[derive].map(lambda row_tokens: ' '.join([t for t in row_tokens if len(t) > 2][:3]) or "UNKNOWN")
+        
+        # Step 4: Merchant Canonicalization - known variations in map order, first match wins
+        upper_merchants = merchants.str.upper()
+        canonical = merchants.str.strip()
+        matched = pd.Series(False, index=df.index)
+        for name, variations in self.merchant_canonical_map.items():
+            hit = ~matched & upper_merchants.str.contains('|'.join(map(re.escape, variations)), regex=True)
+            canonical[hit] = name
+            matched |= hit
+        cmid_source = canonical.where(matched, canonical.str.upper())
+        cmids = cmid_source.map({value: _hash_token(value) for value in pd.unique(cmid_source)})
+        
+        # Step 5: Sensitive Data Tokenization & Encryption
+        sensitive = [self._tokenize_sensitive_data(amount, mcc_code) for amount, mcc_code in zip(df['amount'], mcc_codes)]
+        
+        # Metadata
+        states = descriptions.str.extract(_STATE_RE, expand=False)
+        locations = states.where(states.isin(['CA', 'NY', 'TX', 'FL', 'IL', 'PA', 'OH', 'GA', 'NC', 'MI']), None)
+        upper_descriptions = descriptions.str.upper()
+        transaction_types = pd.Series("purchase", index=df.index, dtype=object)
+        transaction_types[upper_descriptions.str.contains('SUBSCRIPTION|RECURRING', regex=True)] = "subscription"
+        transaction_types[upper_descriptions.str.contains('REFUND|RETURN', regex=True)] = "refund"
+        
+        return pd.DataFrame({
+            "merchant_name": canonical,
+            "canonical_merchant_id": cmids,
+            "cleaned_description": cleaned,
+            "normalized_text": normalized,
+            "tokens": tokens,
+            "location": locations.astype(object).where(locations.notna(), None),
+            "transaction_type": transaction_types,
+            "sensitive_data": sensitive,
+            "mcc_code_provided": mcc_codes.map(bool),
+            "metadata": [
+                {
+                    "original_description": description,
+                    "token_count": len(row_tokens),
+                    "noise_removed": len(description) > len(cleaned_description),
+                    "canonicalized": canonical_name != merchant.strip(),
+                    "security_compliant": True
+                }
+                for description, row_tokens, cleaned_description, canonical_name, merchant
+                in zip(descriptions, tokens, cleaned, canonical, merchants)
+            ]
+        }, index=df.index)
+    
+    async def aexecute(self,
+                       description: str,
+                       amount: float,
+                       merchant_name: Optional[str] = None,
+                       mcc_code: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Async variant of execute() - runs the CPU-bound spaCy/regex pipeline in a
+        worker thread so it does not block the event loop serving LLM calls.
+        
+        Args:
+            description: Raw transaction description
+            amount: Transaction amount
+            merchant_name: Optional pre-provided merchant name
+            mcc_code: Optional Merchant Category Code
+            
+        Returns:
+            Dict with preprocessed transaction data (same as execute)
+        """
+        return await asyncio.to_thread(self.execute, description, amount, merchant_name, mcc_code)
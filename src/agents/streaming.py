@@ -0,0 +1,90 @@
+"""Agent Streaming - Runs an Agno agent with streamed events, collecting content and tool results"""
+from typing import Any, Callable, List, Optional, Tuple
+from agno.run.agent import RunEvent
+from utils.prompt_cache import get_prompt_cache_stats
+
+
+def handle_event(event: Any,
+                 result_text: str,
+                 tool_results: List[Tuple[Optional[str], Any]],
+                 on_token: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Apply one stream event - collect a tool result, record the run's token usage or
+    append content
+    
+    Args:
+        event: Agno run event
+        result_text: Response text accumulated so far
+        tool_results: (tool_name, result) pairs, appended to in place
+        on_token: Optional callback receiving the accumulated response text
+    
+    Returns:
+        The response text accumulated so far
+    
+    Raises:
+        RuntimeError: If the event reports a failed run
+    """
+    kind = getattr(event, 'event', None)
+    if kind == RunEvent.tool_call_completed.value:
+        tool = getattr(event, 'tool', None)
+        if tool is not None:
+            tool_results.append((tool.tool_name, tool.result))
+    elif kind == RunEvent.run_completed.value:
+        get_prompt_cache_stats().record(getattr(event, 'metrics', None))
+    elif kind == RunEvent.run_error.value:
+        raise RuntimeError(getattr(event, 'content', None) or "Agent run failed")
+    elif kind == RunEvent.run_content.value and event.content:
+        result_text += str(event.content)
+        if on_token:
+            on_token(result_text)
+    return result_text
+
+
+def run_streaming(agent,
+                  prompt: str,
+                  on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, List[Tuple[Optional[str], Any]]]:
+    """
+    Stream an agent run, collecting content and tool results as they arrive
+    
+    Args:
+        agent: Agno Agent
+        prompt: User prompt
+        on_token: Optional callback receiving the accumulated response text
+    
+    Returns:
+        Tuple of (response text, (tool_name, result) pairs)
+    """
+    result_text = ""
+    tool_results = []
+    stream = agent.run(prompt, stream=True, stream_events=True)
+    try:
+        for event in stream:
+            result_text = handle_event(event, result_text, tool_results, on_token)
+    finally:
+        stream.close()
+    return result_text, tool_results
+
+
+async def arun_streaming(agent,
+                         prompt: str,
+                         on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, List[Tuple[Optional[str], Any]]]:
+    """
+    Async counterpart of run_streaming using agent.arun
+    
+    Args:
+        agent: Agno Agent
+        prompt: User prompt
+        on_token: Optional callback receiving the accumulated response text
+    
+    Returns:
+        Tuple of (response text, (tool_name, result) pairs)
+    """
+    result_text = ""
+    tool_results = []
+    stream = agent.arun(prompt, stream=True, stream_events=True)
+    try:
+        async for event in stream:
+            result_text = handle_event(event, result_text, tool_results, on_token)
+    finally:
+        await stream.aclose()
+    return result_text, tool_results
@@ -2,21 +2,27 @@ import streamlit as st
 import pandas as pd
 import os
 import json
+import asyncio
+import queue
+import threading
+import time
+import hashlib
+import html
+import httpx
+import io
+import reprlib
+import uuid
+from string import Template
 from typing import Dict, List
 from dotenv import load_dotenv
-from agents.preprocessing_agent import PreprocessingAgent
-from agents.classification_agent import ClassificationAgent
-from agents.governance_agent import GovernanceAgent
-from agents.feedback_agent import FeedbackAgent
-from agno.models.azure import AzureOpenAI
-from tools.vendor_database import vendor_database_search
-from tools.taxonomy import get_taxonomy_structure, get_valid_categories, get_subcategories, TRANSACTION_CATEGORIES
-from tools.mcc_codes import classify_by_mcc_code, assign_mcc_code_for_category, lookup_mcc_by_vendor, get_mcc_statistics, MCC_CODES
-from tools.user_preferences_tool import lookup_user_preference
-from tools.custom_categories_tool import get_custom_categories, match_to_custom_category
-from tools.store_user_preference_tool import store_user_preference
+# Agents, Agno and the tool modules (spaCy, Azure SDK) are imported inside the
+# cached factories below, so tabs that never classify don't pay for them
 from utils.user_preferences import get_preferences_store
 from utils.custom_categories import get_custom_categories_manager
+from utils.classification_cache import get_classification_cache, amount_bucket
+from utils.rate_limit import get_rate_limiter
+from utils.prompt_cache import get_prompt_cache_stats
+from utils.validators import validate_batch_frame
 
 # Load environment variables from .env file
 load_dotenv()
@@ -28,8 +34,9 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Custom CSS for better UI
-st.markdown("""
+# Custom CSS for better UI - Streamlit rebuilds the page on every rerun, so the
+# style block is emitted each run (Streamlit skips re-rendering unchanged elements)
+_CSS_HTML = """
 <style>
     /* Main title styling */
     .main-title {
@@ -170,60 +177,281 @@ st.markdown("""
         padding: 1rem;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(_CSS_HTML, unsafe_allow_html=True)
+
+# Result card markup, filled in with Template.substitute
+_RESULT_CARD = Template("""
+<div style='padding: 1.5rem; background: linear-gradient(135deg, $color_from 0%, $color_to 100%); border-radius: 15px; color: white; box-shadow: 0 4px 6px rgba(0,0,0,0.1);'>
+    <h4 style='margin: 0; font-size: 0.9rem; opacity: 0.9;'>$label</h4>
+    <h2 style='margin: 0.5rem 0;'>$value</h2>
+    <p style='margin: 0; font-size: 0.85rem; opacity: 0.8;'>$detail</p>
+</div>
+""")
+_DETAIL_CARD = Template("""
+<div style='padding: 1rem; background: #f8f9fa; border-left: 4px solid $accent; border-radius: 8px;'>
+    <strong>$label</strong> $value
+</div>
+""")
+
+# Static feedback banners, each emitted with its surrounding spacing in one call
+_FEEDBACK_HEADER_HTML = """
+<br><br>
+<div style='padding: 1.5rem; background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); border-radius: 15px; color: white; margin: 2rem 0;'>
+    <h2 style='margin: 0; font-size: 1.8rem;'>💬 Provide Feedback</h2>
+    <p style='margin: 0.5rem 0 0 0; opacity: 0.9;'>Help us improve by sharing your thoughts on this classification</p>
+</div>
+"""
+_FEEDBACK_PROCESSED_HTML = """
+<br>
+<div style='padding: 1.5rem; background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%); border-radius: 15px; color: white;'>
+    <h3 style='margin: 0;'>✅ Feedback Processed Successfully!</h3>
+</div>
+<br>
+"""
+# Updated-classification view, filled in with Template.substitute; fields and their fallbacks below
+_FEEDBACK_CHANGE_CARDS = Template("""
+<div style='padding: 1rem; background: #fff3cd; border-left: 4px solid #ffc107; border-radius: 8px; margin-bottom: 1rem;'>
+    <h4 style='margin: 0; color: #856404;'>🔄 Classification Updated Based on Your Feedback</h4>
+</div>
+<div style='display: grid; grid-template-columns: 1fr 1fr; gap: 1rem;'>
+    <div style='padding: 1rem; background: #f8f9fa; border-radius: 8px; border: 2px solid #dc3545;'>
+        <h4 style='color: #dc3545; margin-top: 0;'>❌ Before</h4>
+        <p><strong>Category:</strong> $original_category</p>
+        <p style='margin-bottom: 0;'><strong>Subcategory:</strong> $original_subcategory</p>
+    </div>
+    <div style='padding: 1rem; background: #f8f9fa; border-radius: 8px; border: 2px solid #28a745;'>
+        <h4 style='color: #28a745; margin-top: 0;'>✅ After</h4>
+        <p><strong>Category:</strong> $category</p>
+        <p><strong>Subcategory:</strong> $subcategory</p>
+        <p><strong>Confidence:</strong> $confidence</p>
+        <p style='margin-bottom: 0;'><strong>MCC Code:</strong> $mcc_code</p>
+    </div>
+</div>
+<br>
+<div style='padding: 1rem; background: #e7f3ff; border-left: 4px solid #0066cc; border-radius: 8px; margin-bottom: 1rem;'>
+    <h4 style='color: #0066cc; margin-top: 0;'>🤖 AI Reasoning</h4>
+    <p style='margin-bottom: 0; color: #333;'>$reasoning</p>
+</div>
+<div style='padding: 1rem; background: #f0f0f0; border-left: 4px solid #6c757d; border-radius: 8px;'>
+    <h4 style='color: #6c757d; margin-top: 0;'>📋 Audit Trail</h4>
+    <p style='margin-bottom: 0; color: #333;'>$audit_notes</p>
+</div>
+<br>
+""")
+_FEEDBACK_CHANGE_FIELDS = {
+    "original_category": "N/A",
+    "original_subcategory": "N/A",
+    "category": "N/A",
+    "subcategory": "N/A",
+    "confidence": "N/A",
+    "mcc_code": "N/A",
+    "reasoning": "No reasoning provided",
+    "audit_notes": "No audit notes",
+}
+_FEEDBACK_ACKNOWLEDGED_CARD = Template("""
+<div style='padding: 1.5rem; background: #d1ecf1; border-left: 4px solid #0c5460; border-radius: 8px;'>
+    <h4 style='color: #0c5460; margin-top: 0;'>✅ Feedback Acknowledged</h4>
+    <p style='margin-bottom: 0; color: #0c5460;'>$message</p>
+</div>
+<br>
+""")
 
 # ---------------------------------------------------------
 # INITIALIZE AGENTS
 # ---------------------------------------------------------
 @st.cache_resource
-def get_preprocessing_agent():
-    """Initialize and cache the preprocessing agent"""
-    return PreprocessingAgent(llm=None)
+def get_http_client():
+    """
+    Initialize and cache the async keep-alive HTTP connection pool shared by all agents.
+    Every request waits on the shared rate limiter, so the fan-out stays within the RPM quota.
+    With h2 installed (httpx[http2]) concurrent requests multiplex over HTTP/2 connections.
+    """
+    from importlib.util import find_spec
+    
+    return httpx.AsyncClient(
+        http2=find_spec("h2") is not None,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        timeout=httpx.Timeout(60.0, connect=10.0),
+        event_hooks={"request": [get_rate_limiter().on_request]}
+    )
+
+@st.cache_resource
+def get_sync_http_client():
+    """
+    Initialize and cache the sync keep-alive HTTP connection pool for blocking agent runs
+    (agent.run / execute()), with the same limits and rate limiter as get_http_client().
+    """
+    from importlib.util import find_spec
+    
+    return httpx.Client(
+        http2=find_spec("h2") is not None,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        timeout=httpx.Timeout(60.0, connect=10.0),
+        event_hooks={"request": [get_rate_limiter().on_request_sync]}
+    )
 
 @st.cache_resource
 def get_azure_llm():
     """Initialize and cache Azure OpenAI LLM for Agno"""
-    return AzureOpenAI(
+    from agno.models.azure import AzureOpenAI
+    from openai import AzureOpenAI as AzureOpenAIClient
+    
+    connection = {
+        "api_key": os.getenv("AZURE_OPENAI_API_KEY"),
+        "azure_endpoint": os.getenv("AZURE_OPENAI_ENDPOINT"),
+        "api_version": os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview"),
+        "azure_deployment": os.getenv("AZURE_OPENAI_DEPLOYMENT")
+    }
+    llm = AzureOpenAI(
         id=os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-5"),
+        **connection,
+        temperature=1.0,  # Azure OpenAI requirement
+        # Let the classifier issue independent lookups in a single tool turn
+        request_params={"parallel_tool_calls": True},
+        # Reuse warm TLS connections across agents and reruns
+        http_client=get_http_client()
+    )
+    # http_client only feeds Agno's async client; its sync client (reused while open)
+    # is preset on the matching sync pool so blocking runs pool connections too
+    llm.client = AzureOpenAIClient(**connection, http_client=get_sync_http_client())
+    return llm
+
+@st.cache_resource
+def get_batch_client():
+    """
+    Initialize and cache the Azure OpenAI SDK client used for Batch API jobs.
+    Returns None unless AZURE_OPENAI_BATCH_DEPLOYMENT names a global-batch deployment.
+    """
+    if not os.getenv("AZURE_OPENAI_BATCH_DEPLOYMENT"):
+        return None
+    from openai import AzureOpenAI
+    
+    return AzureOpenAI(
         api_key=os.getenv("AZURE_OPENAI_API_KEY"),
         azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview"),
-        azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
-        temperature=1.0  # Azure OpenAI requirement
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview")
     )
 
 @st.cache_resource
-def get_classification_agent():
-    """Initialize and cache the classification agent with Agno"""
+def get_agents():
+    """
+    Initialize and cache all four agents (sharing one Azure OpenAI model) in a single factory.
+    Returns (preprocessing_agent, classification_agent, governance_agent, feedback_agent).
+    """
+    from agents.preprocessing_agent import PreprocessingAgent
+    from agents.classification_agent import ClassificationAgent
+    from agents.governance_agent import GovernanceAgent
+    from agents.feedback_agent import FeedbackAgent
+    from tools.vendor_database import vendor_database_search
+    from tools.mcc_codes import classify_by_mcc_code, assign_mcc_code_for_category, lookup_mcc_by_vendor
+    from tools.custom_categories_tool import get_custom_categories, match_to_custom_category
+    from tools.store_user_preference_tool import store_user_preference
+    
     llm = get_azure_llm()
-    tools = [
-        lookup_user_preference,      # RAG tool - highest priority
+    # User preferences (RAG, highest priority) are looked up by the agent before its LLM run
+    classification_tools = [
         get_custom_categories,      # Custom categories check
         match_to_custom_category,    # Custom category matching
         classify_by_mcc_code,       # MCC code classification
         lookup_mcc_by_vendor,       # Vendor lookup
-        vendor_database_search,     # Vendor database search
-        get_taxonomy_structure      # Default taxonomy
+        vendor_database_search      # Vendor database search (default taxonomy is in the system prompt)
     ]
-    return ClassificationAgent(llm=llm, tools=tools)
+    return (
+        PreprocessingAgent(llm=None),
+        ClassificationAgent(llm=llm, tools=classification_tools),
+        GovernanceAgent(llm=llm, tools=[assign_mcc_code_for_category]),
+        FeedbackAgent(llm=llm, tools=[store_user_preference])  # Tool to store user preferences in RAG system
+    )
 
 @st.cache_resource
-def get_governance_agent():
-    """Initialize and cache the governance agent with Agno"""
-    llm = get_azure_llm()
-    tools = [assign_mcc_code_for_category]
-    return GovernanceAgent(llm=llm, tools=tools)
+def get_fused_agent():
+    """
+    Initialize and cache the FusedAgent, which classifies and validates a transaction in one agent run.
+    Returns None when STRICT_TWO_STAGE is set, keeping separate Classification and Governance Agent calls.
+    """
+    if os.getenv("STRICT_TWO_STAGE", "").lower() in ("1", "true", "yes"):
+        return None
+    from agents.fused_agent import FusedAgent
+    
+    _, classification_agent, governance_agent, _ = get_agents()
+    return FusedAgent(classification_agent, governance_agent)
+
+# ---------------------------------------------------------
+# ASYNC EXECUTION
+# ---------------------------------------------------------
+BATCH_CONCURRENCY = 8  # Max transactions in flight during a batch job
+CLASSIFICATION_BATCH_SIZE = 32  # Transactions classified per LLM call during a batch job
+BATCH_API_MIN_ROWS = 20  # In Batch API mode, jobs with more rows to classify go through the Azure OpenAI Batch API
+BATCH_MODES = ("⚡ Real-time", "🕒 Batch API (50% cheaper, up to 24h)")  # Processing modes offered when a batch deployment is configured
+BATCH_CSV_BLOCK_SIZE = 1 << 18  # Bytes of CSV parsed per chunk (a few thousand rows) when reading an uploaded CSV
+BATCH_CSV_REQUIRED_COLUMNS = frozenset({"description", "amount"})  # Columns an uploaded CSV must have
+BATCH_CSV_COLUMNS = frozenset({"description", "amount", "merchant_name", "mcc_code"})  # Columns parsed from an uploaded CSV
+# Columns of the batch results CSV, and the low-cardinality ones stored as categoricals
+BATCH_RESULT_COLUMNS = (
+    "original_description", "original_amount", "merchant_name", "category", "subcategory", "mcc_code",
+    "mcc_description", "confidence", "validation_status", "reasoning", "flags"
+)
+BATCH_RESULT_CATEGORICAL_COLUMNS = ("category", "subcategory", "confidence", "validation_status")
+BATCH_RESULTS_REFRESH_ROWS = 25  # Finished rows between refreshes of the live results table
+BATCH_RESULTS_CACHED_FILES = 3  # Finished jobs kept per session for re-runs of an identical upload
+BATCH_SCHEMA_FAILURES_SHOWN = 100  # Failure cases listed when an uploaded CSV fails validation
 
 @st.cache_resource
-def get_feedback_agent():
-    """Initialize and cache the feedback agent with Agno"""
-    llm = get_azure_llm()
-    tools = [store_user_preference]  # Tool to store user preferences in RAG system
-    return FeedbackAgent(llm=llm, tools=tools)
+def get_event_loop():
+    """
+    Start and cache a single background event loop shared by all sessions.
+    Agno caches its async Azure client (and connection pool) on the model,
+    so every agent coroutine must run on the loop that created it.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="agent-event-loop", daemon=True).start()
+    return loop
+
+class StatusRelay:
+    """
+    Stand-in for st.empty() used inside coroutines: records status updates on
+    the event loop thread and replays them onto the real placeholder from the
+    Streamlit script thread (Streamlit elements can only be updated there).
+    """
+    
+    def __init__(self):
+        self._updates = queue.SimpleQueue()
+    
+    def info(self, body):
+        self._updates.put(("info", body))
+    
+    def success(self, body):
+        self._updates.put(("success", body))
+    
+    def error(self, body):
+        self._updates.put(("error", body))
+    
+    def replay(self, placeholder):
+        """Apply the newest pending update to the placeholder (it only ever shows the last one)"""
+        latest = None
+        while True:
+            try:
+                latest = self._updates.get_nowait()
+            except queue.Empty:
+                break
+        if latest:
+            method, body = latest
+            getattr(placeholder, method)(body)
 
-preprocessing_agent = get_preprocessing_agent()
-classification_agent = get_classification_agent()
-governance_agent = get_governance_agent()
+def run_async(coro, on_poll=None, poll_interval: float = 0.05):
+    """
+    Run a coroutine on the shared event loop and wait for its result.
+    on_poll is called on the script thread while waiting, so it may update Streamlit elements.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    while not future.done():
+        if on_poll:
+            on_poll()
+        time.sleep(poll_interval)
+    if on_poll:
+        on_poll()
+    return future.result()
 
 # ---------------------------------------------------------
 # HELPER FUNCTIONS FOR FEEDBACK UI
@@ -236,172 +464,343 @@ def get_all_available_categories() -> Dict[str, List[str]]:
     - MCC codes
     - Default taxonomy
     
+    Cached across reruns; the store versions key the cache so any write
+    to preferences or custom categories is picked up on the next call.
+    
     Returns:
         Dict with category as key and list of (source, subcategories) as value
     """
+    return build_available_categories(*category_store_versions())
+
+
+def category_store_versions():
+    """Current (preferences, custom categories) store versions - the key for the category caches"""
+    return get_preferences_store().version(), get_custom_categories_manager().version()
+
+
+def clear_category_cache():
+    """Drop every cached category lookup (e.g. right after a preference write)"""
+    build_available_categories.clear()
+    build_category_list.clear()
+    build_subcategory_list.clear()
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def build_available_categories(preferences_version: int, custom_categories_version: int) -> Dict[str, List[str]]:
+    """Merge the four category sources (arguments only key the cache)"""
+    from tools.mcc_codes import MCC_CATEGORY_INDEX
+    from tools.taxonomy import DEFAULT_TAXONOMY_FROZEN
+    
+    # Accumulate into sets and ordered source lists; convert once at the end
     all_categories = {}
     
+    def merge(cat, subcats, source):
+        entry = all_categories.get(cat)
+        if entry is None:
+            entry = all_categories[cat] = {"sources": [source], "subcategories": set()}
+        elif source == "MCC":
+            if entry["sources"] != ["Custom"]:
+                entry["sources"].append(source)
+        elif source == "Default":
+            if source not in entry["sources"]:
+                entry["sources"].append(source)
+        entry["subcategories"].update(subcats)
+    
     # 1. Custom Categories
     custom_categories_manager = get_custom_categories_manager()
-    custom_cats = custom_categories_manager.get_categories()
-    for cat, subcats in custom_cats.items():
-        if cat not in all_categories:
-            all_categories[cat] = {"source": "Custom", "subcategories": subcats}
-        else:
-            # Merge subcategories
-            all_categories[cat]["subcategories"].extend(subcats)
-            all_categories[cat]["subcategories"] = list(set(all_categories[cat]["subcategories"]))
+    for cat, subcats in custom_categories_manager.get_categories().items():
+        merge(cat, subcats, "Custom")
     
     # 2. User Preferences (RAG)
     preferences_store = get_preferences_store()
-    preferences = preferences_store.get_all_preferences()
-    for pref in preferences:
-        cat = pref.get("user_category")
-        subcat = pref.get("user_subcategory")
-        if cat:
-            if cat not in all_categories:
-                all_categories[cat] = {"source": "User Preference", "subcategories": []}
-            if subcat and subcat not in all_categories[cat]["subcategories"]:
-                all_categories[cat]["subcategories"].append(subcat)
+    for cat, subcat in preferences_store.get_preference_category_pairs():
+        merge(cat, [subcat] if subcat else [], "User Preference")
     
     # 3. MCC Codes
-    mcc_categories = {}
-    for code, info in MCC_CODES.items():
-        cat = info.get("category")
-        subcat = info.get("subcategory")
-        if cat:
-            if cat not in mcc_categories:
-                mcc_categories[cat] = []
-            if subcat and subcat not in mcc_categories[cat]:
-                mcc_categories[cat].append(subcat)
-    
-    for cat, subcats in mcc_categories.items():
-        if cat not in all_categories:
-            all_categories[cat] = {"source": "MCC", "subcategories": subcats}
-        else:
-            # Merge subcategories
-            all_categories[cat]["subcategories"].extend(subcats)
-            all_categories[cat]["subcategories"] = list(set(all_categories[cat]["subcategories"]))
-            if all_categories[cat]["source"] != "Custom":
-                all_categories[cat]["source"] = f"{all_categories[cat]['source']}, MCC"
+    for cat, subcats in MCC_CATEGORY_INDEX.items():
+        merge(cat, subcats, "MCC")
     
     # 4. Default Taxonomy
-    default_taxonomy = TRANSACTION_CATEGORIES
-    for cat, subcats in default_taxonomy.items():
-        if cat not in all_categories:
-            all_categories[cat] = {"source": "Default", "subcategories": subcats}
-        else:
-            # Merge subcategories
-            all_categories[cat]["subcategories"].extend(subcats)
-            all_categories[cat]["subcategories"] = list(set(all_categories[cat]["subcategories"]))
-            if "Default" not in all_categories[cat]["source"]:
-                all_categories[cat]["source"] = f"{all_categories[cat]['source']}, Default"
+    for cat, subcats in DEFAULT_TAXONOMY_FROZEN.items():
+        merge(cat, subcats, "Default")
     
-    return all_categories
+    return {
+        cat: {"source": ", ".join(entry["sources"]), "subcategories": sorted(entry["subcategories"])}
+        for cat, entry in all_categories.items()
+    }
 
 
 def get_category_list_for_dropdown() -> List[str]:
     """Get sorted list of all available categories for dropdown"""
-    all_cats = get_all_available_categories()
-    return sorted(all_cats.keys())
+    return build_category_list(*category_store_versions())
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def build_category_list(preferences_version: int, custom_categories_version: int) -> List[str]:
+    """Sorted category names (arguments only key the cache)"""
+    return sorted(build_available_categories(preferences_version, custom_categories_version))
 
 
 def get_subcategories_for_category(category: str) -> List[str]:
     """Get all available subcategories for a given category"""
-    all_cats = get_all_available_categories()
+    return build_subcategory_list(category, *category_store_versions())
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def build_subcategory_list(category: str, preferences_version: int, custom_categories_version: int) -> List[str]:
+    """Subcategories for one category (version arguments only key the cache)"""
+    all_cats = build_available_categories(preferences_version, custom_categories_version)
     
     if category in all_cats:
-        return sorted(all_cats[category]["subcategories"])
+        return list(all_cats[category]["subcategories"])
     
     # Fallback to default taxonomy
+    from tools.taxonomy import get_subcategories
+    
     return sorted(get_subcategories(category))
 
+
+@st.cache_data(show_spinner=False)
+def build_selectbox_options(items: tuple) -> tuple:
+    """Selectbox options with the custom-entry placeholder first, plus an option → index map"""
+    options = ("--- Select or Enter Custom ---", *items)
+    return options, {option: index for index, option in enumerate(options)}
+
+
+# Stored preference fields shown in the Settings tab, with their column headers
+PREFERENCE_TABLE_COLUMNS = {
+    "merchant_name": "Merchant",
+    "user_category": "User Category",
+    "user_subcategory": "User Subcategory",
+    "original_category": "Original Category",
+    "original_subcategory": "Original Subcategory",
+    "usage_count": "Usage Count",
+    "created_at": "Created"
+}
+
 # ---------------------------------------------------------
 # TRANSACTION PROCESSING FUNCTION
 # ---------------------------------------------------------
-def process_single_transaction(description, amount, merchant_name=None, mcc_code=None, status_placeholder=None):
-    """Process transaction through Preprocessing Agent, Classification Agent, and Governance Agent with live status updates"""
+class _LazyLog:
+    """
+    Agent workflow log for one transaction, formatted on first access.
+    Batch rows never show the log, so the entries are only built when the UI reads them.
+    """
+    
+    def __init__(self, preprocessed_result, classification_result, governance_result):
+        self._results = (preprocessed_result, classification_result, governance_result)
+        self._entries = None
+    
+    def _materialize(self):
+        if self._entries is None:
+            preprocessed_result, classification_result, governance_result = self._results
+            messages = [
+                ("PreprocessingAgent", "✅ Successfully preprocessed transaction"),
+                ("PreprocessingAgent", f"Created CMID: {preprocessed_result.get('canonical_merchant_id', 'N/A')}"),
+                ("PreprocessingAgent", f"Encrypted sensitive data: amount_token={preprocessed_result.get('sensitive_data', {}).get('amount_token', 'N/A')[:16]}..."),
+                ("PreprocessingAgent", f"Normalized text: {preprocessed_result.get('normalized_text', 'N/A')}"),
+                ("ClassificationAgent", f"✅ Classified as {classification_result.get('category', 'N/A')} > {classification_result.get('subcategory', 'N/A')}"),
+                ("ClassificationAgent", f"Confidence: {classification_result.get('confidence', 'N/A').upper()}"),
+                ("ClassificationAgent", f"Tool calls: {len(classification_result.get('tool_calls', []))}"),
+                ("GovernanceAgent", f"✅ Validated classification: {governance_result.get('validation_status', 'N/A')}"),
+                ("GovernanceAgent", f"Assigned MCC Code: {governance_result.get('mcc_code', 'N/A')} - {governance_result.get('mcc_description', 'N/A')}"),
+                ("GovernanceAgent", f"Final Confidence: {governance_result.get('confidence', 'N/A').upper()}"),
+                ("GovernanceAgent", f"Flags: {', '.join(governance_result.get('flags', [])) if governance_result.get('flags') else 'None'}")
+            ]
+            # agent_kind lets the UI group entries without substring matching
+            self._entries = [
+                {"agent": agent, "agent_kind": agent.removesuffix("Agent"), "message": message}
+                for agent, message in messages
+            ]
+        return self._entries
+    
+    def __iter__(self):
+        return iter(self._materialize())
+    
+    def __len__(self):
+        return len(self._materialize())
+    
+    def __getitem__(self, index):
+        return self._materialize()[index]
+
+
+# Fallbacks for the governance fields copied into the combined result
+_GOVERNANCE_RESULT_DEFAULTS = {
+    "merchant_name": "Unknown",
+    "category": "Other",
+    "subcategory": "General",
+    "mcc_code": "5999",
+    "mcc_description": "Miscellaneous",
+    "confidence": "medium",
+    "validation_status": "PASS",
+    "flags": None,
+    "audit_notes": ""
+}
+
+# Status lines, parsed once - callers pass a single dict of field values
+_STEP1_DONE = "✅ **Step 1/3 Complete:** Merchant: `{merchant}` | CMID: `{cmid12}...` | Tokens: {ntok}".format_map
+_STEPS_REUSED = "✅ **Steps 2-3/3 Reused:** Cached result for CMID `{cmid12}...`".format_map
+_STEP2_STREAMING = "🔄 **Step 2/3:** Classification Agent is responding...\n\n{text}".format
+_STEP2_DONE = "✅ **Step 2/3 Complete:** Category: `{category}` → `{subcategory}` | Confidence: `{confidence}` | Tools Used: {ntools}".format_map
+_STEPS23_STREAMING = "🔄 **Steps 2-3/3:** Classification + Governance Agent is responding...\n\n{text}".format
+_STEP3_STREAMING = "🔄 **Step 3/3:** Governance Agent is responding...\n\n{text}".format
+_ALL_DONE = "✅ **All Steps Complete!** Validation: `{validation}` | MCC: `{mcc}` | Final Confidence: `{confidence}`{flags}".format_map
+
+def classification_cache_key(preprocessed_result, amount, mcc_code=None):
+    """
+    Cache key for classification + governance results: same merchant, MCC code and
+    amount bucket, under the current preferences / custom categories (feedback changes
+    a store fingerprint, so stale entries are never hit - including persisted ones
+    after a restart)
+    """
+    return (
+        preprocessed_result.get("canonical_merchant_id"),
+        mcc_code,
+        amount_bucket(amount),
+        get_preferences_store().fingerprint(),
+        get_custom_categories_manager().fingerprint()
+    )
+
+
+def classification_near_key(preprocessed_result, cache_key):
+    """
+    (group, text) for approximate cache lookups: the cache key without the CMID, and the
+    canonical merchant name - spelling variants of a merchant under the same MCC code,
+    amount bucket and store versions share results
+    """
+    return cache_key[1:], preprocessed_result.get("merchant_name") or ""
+
+
+async def process_single_transaction(description, amount, merchant_name=None, mcc_code=None, status_placeholder=None,
+                                     preprocessed_result=None, classification_result=None, governance_result=None):
+    """
+    Process transaction through Preprocessing Agent, Classification Agent, and Governance Agent with live status updates.
+    Each stage depends on the previous one, so the stages are awaited in order; the gain
+    comes from many transactions sharing the event loop (see process_batch_rows).
+    Run it with run_async() and pass a StatusRelay as status_placeholder.
+    preprocessed_result / classification_result / governance_result skip a stage whose output
+    is already known (the batch path preprocesses and classifies rows in bulk, and may
+    validate them through the Batch API).
+    """
+    preprocessing_agent, classification_agent, governance_agent, _ = get_agents()
     try:
         # Step 1: Preprocessing
         if status_placeholder:
             status_placeholder.info("🔄 **Step 1/3:** Preprocessing Agent is extracting and cleaning transaction data...")
         
-        preprocessed_result = preprocessing_agent.execute(
-            description=description,
-            amount=amount,
-            merchant_name=merchant_name,
-            mcc_code=mcc_code
-        )
-        
-        if status_placeholder:
-            status_placeholder.success(f"✅ **Step 1/3 Complete:** Merchant: `{preprocessed_result.get('merchant_name', 'Unknown')}` | CMID: `{preprocessed_result.get('canonical_merchant_id', 'N/A')[:12]}...` | Tokens: {len(preprocessed_result.get('tokens', []))}")
-        
-        # Step 2: Classification using Agno Agent
-        if status_placeholder:
-            status_placeholder.info("🔄 **Step 2/3:** Classification Agent is analyzing with AI tools (RAG,MCC lookup, vendor search, taxonomy)...")
-        
-        classification_result = classification_agent.execute(
-            merchant_name=preprocessed_result.get("merchant_name", "Unknown"),
-            description=preprocessed_result.get("normalized_text", description),
-            amount=amount,
-            mcc_code=mcc_code,
-            metadata=preprocessed_result.get("metadata", {})
-        )
+        if preprocessed_result is None:
+            preprocessed_result = await preprocessing_agent.aexecute(
+                description=description,
+                amount=amount,
+                merchant_name=merchant_name,
+                mcc_code=mcc_code
+            )
         
         if status_placeholder:
-            status_placeholder.success(f"✅ **Step 2/3 Complete:** Category: `{classification_result.get('category', 'N/A')}` → `{classification_result.get('subcategory', 'N/A')}` | Confidence: `{classification_result.get('confidence', 'N/A').upper()}` | Tools Used: {len(classification_result.get('tool_calls', []))}")
+            status_placeholder.success(_STEP1_DONE({
+                "merchant": preprocessed_result.get('merchant_name', 'Unknown'),
+                "cmid12": preprocessed_result.get('canonical_merchant_id', 'N/A')[:12],
+                "ntok": len(preprocessed_result.get('tokens', []))
+            }))
+        
+        # Repeat merchant (or a close spelling of one): reuse the cached classification + governance results
+        cache_key = classification_cache_key(preprocessed_result, amount, mcc_code)
+        near_key = classification_near_key(preprocessed_result, cache_key)
+        cached = get_classification_cache().get(cache_key) or get_classification_cache().get_near(*near_key)
+        if cached:
+            classification_result = cached[0]
+            governance_result = {**cached[1], "amount": amount, "merchant_name": preprocessed_result.get("merchant_name", cached[1].get("merchant_name"))}
+            if status_placeholder:
+                status_placeholder.success(_STEPS_REUSED({"cmid12": preprocessed_result.get('canonical_merchant_id', 'N/A')[:12]}))
+        else:
+            fused_agent = get_fused_agent() if classification_result is None and governance_result is None else None
+            if fused_agent is not None:
+                # Steps 2-3: Classification and Governance in a single Agno Agent run
+                if status_placeholder:
+                    status_placeholder.info("🔄 **Steps 2-3/3:** Classification + Governance Agent is classifying and validating with AI tools...")
+                
+                classification_result, governance_result = await fused_agent.aexecute(
+                    merchant_name=preprocessed_result.get("merchant_name", "Unknown"),
+                    description=preprocessed_result.get("normalized_text", description),
+                    amount=amount,
+                    mcc_code=mcc_code,
+                    metadata=preprocessed_result.get("metadata", {}),
+                    on_token=(lambda text: status_placeholder.info(_STEPS23_STREAMING(text=text))) if status_placeholder else None
+                )
+            else:
+                # Step 2: Classification using Agno Agent
+                if status_placeholder:
+                    status_placeholder.info("🔄 **Step 2/3:** Classification Agent is analyzing with AI tools (RAG,MCC lookup, vendor search, taxonomy)...")
+                
+                # Show the response as it streams in, so the wait is visible from the first token
+                on_token = None
+                if status_placeholder:
+                    on_token = lambda text: status_placeholder.info(_STEP2_STREAMING(text=text))
+                
+                if classification_result is None:
+                    classification_result = await classification_agent.aexecute(
+                        merchant_name=preprocessed_result.get("merchant_name", "Unknown"),
+                        description=preprocessed_result.get("normalized_text", description),
+                        amount=amount,
+                        mcc_code=mcc_code,
+                        metadata=preprocessed_result.get("metadata", {}),
+                        on_token=on_token
+                    )
+                
+                if status_placeholder:
+                    status_placeholder.success(_STEP2_DONE({
+                        "category": classification_result.get('category', 'N/A'),
+                        "subcategory": classification_result.get('subcategory', 'N/A'),
+                        "confidence": classification_result.get('confidence', 'N/A').upper(),
+                        "ntools": len(classification_result.get('tool_calls', []))
+                    }))
+                
+                # Step 3: Governance and Validation using Agno Agent
+                if status_placeholder:
+                    status_placeholder.info("🔄 **Step 3/3:** Governance Agent is validating classification ...")
+                
+                if governance_result is None:
+                    governance_result = await governance_agent.aexecute(
+                        merchant_name=preprocessed_result.get("merchant_name", "Unknown"),
+                        description=preprocessed_result.get("normalized_text", description),
+                        amount=amount,
+                        category=classification_result.get("category", "Other"),
+                        confidence=classification_result.get("confidence", "medium"),
+                        reasoning=classification_result.get("reasoning", "No reasoning provided"),
+                        subcategory=classification_result.get("subcategory", "General"),
+                        mcc_code=mcc_code,
+                        metadata=preprocessed_result.get("metadata", {}),
+                        on_token=(lambda text: status_placeholder.info(_STEP3_STREAMING(text=text))) if status_placeholder else None,
+                        rule_based=classification_result.get("rule_based", False)
+                    )
+                
+            # Only cache clean runs - failures should be retried next time
+            if classification_result.get("classification_method") != "error" and governance_result.get("status") == "success":
+                get_classification_cache().put(cache_key, (classification_result, governance_result), near=near_key)
         
-        # Step 3: Governance and Validation using Agno Agent
         if status_placeholder:
-            status_placeholder.info("🔄 **Step 3/3:** Governance Agent is validating classification ...")
-        
-        governance_result = governance_agent.execute(
-            merchant_name=preprocessed_result.get("merchant_name", "Unknown"),
-            description=preprocessed_result.get("normalized_text", description),
-            amount=amount,
-            category=classification_result.get("category", "Other"),
-            confidence=classification_result.get("confidence", "medium"),
-            reasoning=classification_result.get("reasoning", "No reasoning provided"),
-            subcategory=classification_result.get("subcategory", "General"),
-            mcc_code=mcc_code,
-            metadata=preprocessed_result.get("metadata", {})
+            flags = governance_result.get('flags')
+            status_placeholder.success(_ALL_DONE({
+                "validation": governance_result.get('validation_status', 'N/A'),
+                "mcc": governance_result.get('mcc_code', 'N/A'),
+                "confidence": governance_result.get('confidence', 'N/A').upper(),
+                "flags": f" | ⚠️ Flags: {len(flags)}" if flags else ""
+            }))
+        
+        # Combine all results - governance fields over their defaults, then the rest
+        return (
+            _GOVERNANCE_RESULT_DEFAULTS
+            | {key: governance_result[key] for key in _GOVERNANCE_RESULT_DEFAULTS if key in governance_result}
+            | {
+                "canonical_merchant_id": preprocessed_result.get("canonical_merchant_id", "N/A"),
+                "reasoning": classification_result.get("reasoning", "No reasoning provided"),
+                "preprocessing_data": preprocessed_result,
+                "classification_data": classification_result,
+                "governance_data": governance_result,
+                "workflow_log": _LazyLog(preprocessed_result, classification_result, governance_result),
+                "status": "success"
+            }
         )
-        
-        if status_placeholder:
-            flags_display = f" | ⚠️ Flags: {len(governance_result.get('flags', []))}" if governance_result.get('flags') else ""
-            status_placeholder.success(f"✅ **All Steps Complete!** Validation: `{governance_result.get('validation_status', 'N/A')}` | MCC: `{governance_result.get('mcc_code', 'N/A')}` | Final Confidence: `{governance_result.get('confidence', 'N/A').upper()}`{flags_display}")
-        
-        # Combine all results
-        return {
-            "merchant_name": governance_result.get("merchant_name", "Unknown"),
-            "canonical_merchant_id": preprocessed_result.get("canonical_merchant_id", "N/A"),
-            "category": governance_result.get("category", "Other"),
-            "subcategory": governance_result.get("subcategory", "General"),
-            "mcc_code": governance_result.get("mcc_code", "5999"),
-            "mcc_description": governance_result.get("mcc_description", "Miscellaneous"),
-            "confidence": governance_result.get("confidence", "medium"),
-            "reasoning": classification_result.get("reasoning", "No reasoning provided"),
-            "validation_status": governance_result.get("validation_status", "PASS"),
-            "flags": governance_result.get("flags"),
-            "audit_notes": governance_result.get("audit_notes", ""),
-            "preprocessing_data": preprocessed_result,
-            "classification_data": classification_result,
-            "governance_data": governance_result,
-            "workflow_log": [
-                {"agent": "PreprocessingAgent", "message": "✅ Successfully preprocessed transaction"},
-                {"agent": "PreprocessingAgent", "message": f"Created CMID: {preprocessed_result.get('canonical_merchant_id', 'N/A')}"},
-                {"agent": "PreprocessingAgent", "message": f"Encrypted sensitive data: amount_token={preprocessed_result.get('sensitive_data', {}).get('amount_token', 'N/A')[:16]}..."},
-                {"agent": "PreprocessingAgent", "message": f"Normalized text: {preprocessed_result.get('normalized_text', 'N/A')}"},
-                {"agent": "ClassificationAgent", "message": f"✅ Classified as {classification_result.get('category', 'N/A')} > {classification_result.get('subcategory', 'N/A')}"},
-                {"agent": "ClassificationAgent", "message": f"Confidence: {classification_result.get('confidence', 'N/A').upper()}"},
-                {"agent": "ClassificationAgent", "message": f"Tool calls: {len(classification_result.get('tool_calls', []))}"},
-                {"agent": "GovernanceAgent", "message": f"✅ Validated classification: {governance_result.get('validation_status', 'N/A')}"},
-                {"agent": "GovernanceAgent", "message": f"Assigned MCC Code: {governance_result.get('mcc_code', 'N/A')} - {governance_result.get('mcc_description', 'N/A')}"},
-                {"agent": "GovernanceAgent", "message": f"Final Confidence: {governance_result.get('confidence', 'N/A').upper()}"},
-                {"agent": "GovernanceAgent", "message": f"Flags: {', '.join(governance_result.get('flags', [])) if governance_result.get('flags') else 'None'}"}
-            ],
-            "status": "success"
-        }
     except Exception as e:
         if status_placeholder:
             status_placeholder.error(f"❌ **Error:** {str(e)}")
@@ -409,11 +808,992 @@ def process_single_transaction(description, amount, merchant_name=None, mcc_code
             "status": "error",
             "error": str(e),
             "workflow_log": [
-                {"agent": "System", "message": f"❌ Error: {str(e)}"}
+                {"agent": "System", "agent_kind": "System", "message": f"❌ Error: {str(e)}"}
             ]
         }
 
 
+@st.cache_data(show_spinner=False)
+def sample_csv_bytes() -> bytes:
+    """The downloadable sample CSV template - constant, so it is encoded once rather than every rerun"""
+    sample_data = {
+        'description': ['Starbucks Coffee Shop', 'Shell Gas Station', 'Walmart Supercenter', 'Netflix Subscription'],
+        'amount': [5.50, 45.00, 123.45, 15.99],
+        'merchant_name': ['Starbucks', 'Shell', 'Walmart', 'Netflix'],
+        'mcc_code': ['5812', '5541', '5411', '7841']
+    }
+    return pd.DataFrame(sample_data).to_csv(index=False).encode('utf-8')
+
+
+def read_batch_csv(uploaded_file):
+    """
+    Stream an uploaded batch CSV (from the start of the file) in chunks with Arrow's
+    multi-threaded CSV reader. Only the batch columns are parsed, all as strings with
+    leading/trailing spaces trimmed - no type inference; amounts are converted with
+    pd.to_numeric downstream so a bad value fails validation instead of the whole read.
+    Chunks come out as DataFrames with Arrow-backed dtypes.
+    """
+    import csv
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+    
+    # Pick the batch columns from the header row (names are matched after cleaning)
+    uploaded_file.seek(0)
+    header = next(csv.reader([uploaded_file.readline().decode('utf-8-sig')]), [])
+    columns = [column for column in header if column.strip().lower() in BATCH_CSV_COLUMNS]
+    if not columns:
+        # Arrow would read every column for an empty include list
+        yield pd.DataFrame()
+        return
+    
+    uploaded_file.seek(0)
+    reader = pacsv.open_csv(
+        uploaded_file,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=BATCH_CSV_BLOCK_SIZE),
+        parse_options=pacsv.ParseOptions(invalid_row_handler=lambda row: 'skip'),  # Skip bad lines instead of failing
+        convert_options=pacsv.ConvertOptions(
+            include_columns=columns,
+            column_types={column: pa.string() for column in columns},
+            strings_can_be_null=True
+        )
+    )
+    for batch in reader:
+        if batch.num_rows:
+            batch = pa.RecordBatch.from_arrays([pc.utf8_trim_whitespace(column) for column in batch.columns], names=batch.schema.names)
+            yield batch.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def raw_csv_preview(uploaded_file, chars: int) -> str:
+    """
+    The first `chars` characters of an uploaded file for the debug previews.
+    Only the bytes needed are read (UTF-8 uses at most 4 per character), never the whole file.
+    """
+    uploaded_file.seek(0)
+    return uploaded_file.read(chars * 4).decode('utf-8', errors='ignore')[:chars]
+
+
+def clean_batch_columns(df):
+    """Strip whitespace from column names and lowercase them (the frame is only relabelled when they change)"""
+    columns = [column.strip().lower() for column in df.columns]
+    if columns != list(df.columns):
+        df.columns = columns
+    return df
+
+
+def optimize_batch_dtypes(df):
+    """
+    Compact dtypes for an uploaded batch CSV (read all-text by read_batch_csv): repeated
+    merchant names and MCC codes become categoricals, descriptions Arrow-backed strings.
+    Amounts become float64 - float32 would corrupt cents.
+    """
+    df = df.assign(amount=pd.to_numeric(df["amount"], errors="coerce").astype("float64"))
+    dtypes = {"description": "string[pyarrow]"}
+    if "merchant_name" in df.columns:
+        dtypes["merchant_name"] = "category"
+    if "mcc_code" in df.columns:
+        dtypes["mcc_code"] = "category"
+    return df.astype(dtypes)
+
+
+def batch_row_inputs(df):
+    """
+    (description, amount, merchant_name, mcc_code) for every batch row, converted column by
+    column instead of per row. Rows whose amount is missing or not numeric get None.
+    """
+    def optional_text(column):
+        if column not in df.columns:
+            return [None] * len(df)
+        values = df[column]
+        return [None if missing else str(value) for value, missing in zip(values.tolist(), values.isna().tolist())]
+    
+    descriptions = df["description"].astype(str).tolist()
+    amounts = pd.to_numeric(df["amount"], errors="coerce").astype("float64")
+    return [
+        (description, amount, merchant_name, mcc_code) if valid else None
+        for description, amount, valid, merchant_name, mcc_code in zip(
+            descriptions, amounts.tolist(), amounts.notna().tolist(),
+            optional_text("merchant_name"), optional_text("mcc_code")
+        )
+    ]
+
+
+async def process_batch_rows(df, progress, concurrency=BATCH_CONCURRENCY, batch_size=CLASSIFICATION_BATCH_SIZE, row_offset=0, cancel=None,
+                             use_batch_api=False):
+    """
+    Process CSV rows concurrently with at most `concurrency` requests in flight.
+    Rows are preprocessed up front in one vectorized pass (PreprocessingAgent.execute_batch)
+    and classified `batch_size` at a time with one
+    LLM call per chunk; rows missing from a batch answer fall back to single-row
+    classification. Governance still runs per row.
+    With use_batch_api, a batch deployment configured and more than BATCH_API_MIN_ROWS rows
+    to classify, all chunks go out as one Azure OpenAI Batch API job instead, and the
+    classified rows are then validated in a second job; rows either job does not answer
+    are classified or validated online.
+    row_offset is the file position of the first row (for error messages when the file is
+    processed chunk by chunk).
+    Returns a dict of BATCH_RESULT_COLUMNS lists in row order; progress["done"], progress["errors"],
+    progress["status"] and progress["partial"] are updated as rows finish so the script thread
+    can render them.
+    Once the optional cancel event is set no further LLM calls are started, and only the
+    rows that finished are returned.
+    """
+    preprocessing_agent, classification_agent, governance_agent, _ = get_agents()
+    semaphore = asyncio.Semaphore(concurrency)
+    rows = df.to_dict('records')
+    
+    def row_inputs(row):
+        return (
+            str(row['description']),
+            float(row.get('amount', 0)),
+            str(row.get('merchant_name')) if 'merchant_name' in row and pd.notna(row.get('merchant_name')) else None,
+            str(row.get('mcc_code')) if 'mcc_code' in row and pd.notna(row.get('mcc_code')) else None
+        )
+    
+    # Bad rows (re-parsed with row_inputs to get the error) and preprocessing
+    # failures are left for process_row to report
+    inputs = batch_row_inputs(df)
+    valid = [index for index, args in enumerate(inputs) if args is not None]
+    preprocessed = [None] * len(rows)
+    if valid:
+        frame = pd.DataFrame(
+            [inputs[index] for index in valid],
+            columns=["description", "amount", "merchant_name", "mcc_code"]
+        )
+        try:
+            batch = await asyncio.to_thread(preprocessing_agent.execute_batch, frame)
+            for index, result in zip(valid, batch.to_dict('records')):
+                preprocessed[index] = result
+        except Exception:
+            pass
+    
+    # Rows repeating a merchant wait for the first one and reuse its cached result;
+    # only the first row per key (and not already cached) is sent for classification
+    cache = get_classification_cache()
+    keys = [
+        classification_cache_key(result, args[1], args[3]) if result is not None else None
+        for args, result in zip(inputs, preprocessed)
+    ]
+    leaders = {}
+    for index, key in enumerate(keys):
+        if key is not None:
+            leaders.setdefault(key, index)
+    leader_done = {key: asyncio.Event() for key in leaders}
+    
+    # Classify preprocessed rows in chunks, one LLM call per chunk
+    classified = [None] * len(rows)
+    pending = [
+        index for key, index in leaders.items()
+        if key not in cache and not cache.has_near(*classification_near_key(preprocessed[index], key))
+    ]
+    
+    chunks = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+    
+    def chunk_transactions(indices):
+        return [
+            {
+                "merchant_name": preprocessed[index].get("merchant_name", "Unknown"),
+                "description": preprocessed[index].get("normalized_text", inputs[index][0]),
+                "amount": inputs[index][1],
+                "mcc_code": inputs[index][3],
+                "metadata": preprocessed[index].get("metadata", {})
+            }
+            for index in indices
+        ]
+    
+    async def classify_chunk(indices):
+        transactions = chunk_transactions(indices)
+        async with semaphore:
+            if cancel is not None and cancel.is_set():
+                return
+            results = await classification_agent.aexecute_batch(transactions)
+        for index, result in zip(indices, results):
+            classified[index] = result
+    
+    def batch_status(stage):
+        def on_status(batch):
+            counts = getattr(batch, "request_counts", None)
+            progress["status"] = f"⏳ Azure OpenAI {stage} batch job {batch.status}" + (f" ({counts.completed}/{counts.total} requests done)" if counts else "")
+        return on_status
+    
+    async def classify_with_batch_api(batch_client):
+        """Classify every chunk in one Batch API job; returns the chunks left unanswered"""
+        from agents.batch_llm import run_batch
+        
+        deployment = os.getenv("AZURE_OPENAI_BATCH_DEPLOYMENT")
+        remaining = {}  # chunk number -> (row indices, transactions) sent to the job
+        
+        def build_requests():
+            requests = []
+            for number, chunk in enumerate(chunks):
+                results, transactions = classification_agent.rule_based_results(chunk_transactions(chunk))
+                for index, result in zip(chunk, results):
+                    classified[index] = result
+                indices = [index for index, result in zip(chunk, results) if result is None]
+                if indices:
+                    remaining[number] = (indices, transactions)
+                    requests.append((str(number), classification_agent.build_batch_api_body(transactions, deployment)))
+            return requests
+        
+        try:
+            # Rows a user preference or MCC code decides are classified locally; building
+            # the requests for the rest runs the local MCC/vendor lookups
+            requests = await asyncio.to_thread(build_requests)
+            responses = await run_batch(batch_client, requests, on_status=batch_status("classification")) if requests else {}
+        except Exception as e:
+            progress["errors"].append(f"Batch API job failed, classifying online instead: {str(e)}")
+            responses = {}
+        finally:
+            progress["status"] = None
+        
+        leftover = []
+        for number, chunk in enumerate(chunks):
+            body = responses.get(str(number))
+            if body is None:
+                unanswered = [index for index in chunk if classified[index] is None]
+                if unanswered:
+                    leftover.append(unanswered)
+                continue
+            indices, transactions = remaining[number]
+            for index, result in zip(indices, classification_agent.parse_batch_api_result(body, transactions)):
+                classified[index] = result
+        return leftover
+    
+    async def govern_with_batch_api(batch_client):
+        """Validate every classified row in one Batch API job; rows it does not answer are validated online"""
+        from agents.batch_llm import run_batch
+        
+        deployment = os.getenv("AZURE_OPENAI_BATCH_DEPLOYMENT")
+        # Same arguments process_single_transaction would pass to the governance agent
+        arguments = {
+            index: {
+                "merchant_name": preprocessed[index].get("merchant_name", "Unknown"),
+                "amount": inputs[index][1],
+                "category": classified[index].get("category", "Other"),
+                "confidence": classified[index].get("confidence", "medium"),
+                "reasoning": classified[index].get("reasoning", "No reasoning provided"),
+                "subcategory": classified[index].get("subcategory", "General"),
+                "mcc_code": inputs[index][3]
+            }
+            for index in pending
+            if classified[index] is not None and classified[index].get("classification_method") != "error"
+            and not classified[index].get("rule_based")  # validated by rule, online
+        }
+        if not arguments:
+            return
+        
+        try:
+            requests = await asyncio.to_thread(lambda: [
+                (str(index), governance_agent.build_batch_api_body(
+                    deployment,
+                    description=preprocessed[index].get("normalized_text", inputs[index][0]),
+                    **fields
+                ))
+                for index, fields in arguments.items()
+            ])
+            responses = await run_batch(batch_client, requests, on_status=batch_status("governance"))
+        except Exception as e:
+            progress["errors"].append(f"Governance Batch API job failed, validating online instead: {str(e)}")
+            responses = {}
+        finally:
+            progress["status"] = None
+        
+        for index, fields in arguments.items():
+            body = responses.get(str(index))
+            if body is not None:
+                governed[index] = governance_agent.parse_batch_api_result(
+                    body, metadata=preprocessed[index].get("metadata", {}), **fields
+                )
+    
+    # Batch API mode: classification and governance each go out as one offline job
+    governed = [None] * len(rows)
+    batch_client = get_batch_client() if use_batch_api else None
+    if batch_client is not None and len(pending) > BATCH_API_MIN_ROWS:
+        chunks = await classify_with_batch_api(batch_client)
+        await asyncio.gather(*(classify_chunk(chunk) for chunk in chunks))
+        if cancel is None or not cancel.is_set():
+            await govern_with_batch_api(batch_client)
+    else:
+        await asyncio.gather(*(classify_chunk(chunk) for chunk in chunks))
+    
+    async def process_row(index, row):
+        key = keys[index]
+        is_leader = key is not None and leaders[key] == index
+        if key is not None and not is_leader:
+            await leader_done[key].wait()
+        async with semaphore:
+            if cancel is not None and cancel.is_set():
+                if is_leader:
+                    leader_done[key].set()
+                return
+            try:
+                description, amount, merchant_name, mcc_code = inputs[index] or row_inputs(row)
+                result = await process_single_transaction(
+                    description, 
+                    amount,
+                    merchant_name=merchant_name,
+                    mcc_code=mcc_code,
+                    preprocessed_result=preprocessed[index],
+                    classification_result=classified[index],
+                    governance_result=governed[index]
+                )
+
+                # Flatten result for CSV, in BATCH_RESULT_COLUMNS order
+                flags = result.get('flags')
+                flattened = (
+                    row['description'],
+                    row.get('amount', 0),
+                    result.get('merchant_name'),
+                    result.get('category'),
+                    result.get('subcategory'),
+                    result.get('mcc_code'),
+                    result.get('mcc_description'),
+                    result.get('confidence'),
+                    result.get('validation_status'),
+                    result.get('reasoning'),
+                    ', '.join(flags) if flags else None
+                )
+                
+            except Exception as e:
+                progress["errors"].append(f"Error processing row {row_offset + index + 1}: {str(e)}")
+                flattened = (
+                    row.get('description', 'N/A'),
+                    row.get('amount', 0),
+                    *(['ERROR'] * 7),
+                    f'Error: {str(e)}',
+                    'Processing Error'
+                )
+            finally:
+                if is_leader:
+                    leader_done[key].set()
+        for column, value in zip(columns, flattened):
+            column[index] = value
+        finished.append(index)
+        progress["done"] += 1
+    
+    # Results are written straight into preallocated columns by row position;
+    # progress["partial"] exposes them and the finished row positions to the UI
+    columns = [[None] * len(rows) for _ in BATCH_RESULT_COLUMNS]
+    finished = []
+    progress["partial"] = (dict(zip(BATCH_RESULT_COLUMNS, columns)), finished)
+    await asyncio.gather(*(process_row(index, row) for index, row in enumerate(rows)))
+    if len(finished) < len(rows):
+        # Cancelled - keep the rows that finished, in file order
+        order = sorted(finished)
+        columns = [[column[index] for index in order] for column in columns]
+    return dict(zip(BATCH_RESULT_COLUMNS, columns))
+
+
+def write_results_csv(columns, sink, include_header=True):
+    """
+    Append BATCH_RESULT_COLUMNS lists to a binary CSV sink with Arrow's CSV writer.
+    Amounts are written as numbers, every other column as text.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    
+    arrays = [
+        pa.array(pd.to_numeric(pd.Series(values, dtype=object), errors="coerce"), type=pa.float64(), from_pandas=True)
+        if column == "original_amount" else
+        pa.array([None if value is None or value is pd.NA else str(value) for value in values], type=pa.string())
+        for column, values in columns.items()
+    ]
+    table = pa.Table.from_arrays(arrays, names=list(columns))
+    pacsv.write_csv(table, sink, write_options=pacsv.WriteOptions(include_header=include_header))
+
+
+def batch_results_frame(columns):
+    """Build the results DataFrame from BATCH_RESULT_COLUMNS lists in one construction"""
+    df = pd.DataFrame(columns, copy=False)
+    return df.astype({column: "category" for column in BATCH_RESULT_CATEGORICAL_COLUMNS})
+
+
+def start_batch_job(data: bytes, total_rows: int, use_batch_api: bool = False) -> dict:
+    """
+    Start a batch job on a daemon thread so the script thread - and every widget - stays
+    responsive while it runs. The returned job dict is the only state shared with the
+    thread; the UI reads it on each rerun and sets job["cancel"] to stop the job.
+    """
+    job = {
+        "id": uuid.uuid4().hex,
+        "total_rows": total_rows,
+        "started": time.monotonic(),
+        "progress": {"done": 0, "errors": [], "status": None, "partial": None},
+        "results": {column: [] for column in BATCH_RESULT_COLUMNS},
+        "csv": io.BytesIO(),
+        "lock": threading.Lock(),  # Guards results/csv/progress["partial"] between chunks
+        "cancel": threading.Event(),
+        "finished": False,
+        "error": None,
+        "cache_stats": None
+    }
+    threading.Thread(target=run_batch_job, args=(job, data, use_batch_api), name=f"batch-job-{job['id']}", daemon=True).start()
+    return job
+
+
+def run_batch_job(job, data: bytes, use_batch_api: bool = False):
+    """
+    Batch job thread body. The file is streamed chunk by chunk; each chunk's rows run
+    concurrently on the shared event loop and are appended to the download buffer as
+    soon as the chunk is done. In Batch API mode the chunks are joined into one frame
+    instead, so the whole file goes out as one classification and one governance job.
+    Never touches Streamlit.
+    """
+    progress = job["progress"]
+    try:
+        processed_rows = 0
+        chunks = read_batch_csv(io.BytesIO(data))
+        if use_batch_api:
+            blocks = list(chunks)
+            chunks = [pd.concat(blocks, ignore_index=True)] if blocks else []
+        for chunk in chunks:
+            if job["cancel"].is_set():
+                break
+            chunk = optimize_batch_dtypes(clean_batch_columns(chunk))
+            chunk_results = run_async(
+                process_batch_rows(chunk, progress, row_offset=processed_rows, cancel=job["cancel"], use_batch_api=use_batch_api)
+            )
+            with job["lock"]:
+                write_results_csv(chunk_results, job["csv"], include_header=job["csv"].tell() == 0)
+                for column, values in chunk_results.items():
+                    job["results"][column].extend(values)
+                progress["partial"] = None
+            processed_rows += len(chunk)
+        job["cache_stats"] = get_classification_cache().stats()
+    except Exception as e:
+        job["error"] = str(e)
+    finally:
+        job["finished"] = True
+
+
+def batch_job_partial_results(job):
+    """The finished rows so far - earlier chunks plus the finished rows of the current one"""
+    with job["lock"]:
+        chunk_columns, finished = job["progress"]["partial"] or ({}, [])
+        order = sorted(finished)
+        return {
+            column: job["results"][column] + [chunk_columns[column][index] for index in order] if chunk_columns else list(job["results"][column])
+            for column in BATCH_RESULT_COLUMNS
+        }
+
+
+@st.fragment(run_every=0.5)
+def render_batch_job_progress(job):
+    """
+    Poll a running batch job twice a second without rerunning the rest of the page.
+    The live table is rebuilt every BATCH_RESULTS_REFRESH_ROWS finished rows; once the
+    job finishes the whole app reruns to show the final results.
+    """
+    if job["finished"]:
+        st.rerun()
+    progress = job["progress"]
+    total_rows = job["total_rows"]
+    rate = progress["done"] / max(time.monotonic() - job["started"], 1e-6)
+    st.progress(min(progress["done"] / max(total_rows, 1), 1.0))
+    if job["cancel"].is_set():
+        st.text("🛑 Cancelling - waiting for in-flight requests to finish...")
+    else:
+        st.text(progress["status"] or f"📋 Processed {progress['done']}/{total_rows} transactions ({rate:.1f} rows/s, up to {BATCH_CONCURRENCY} in parallel)...")
+        st.button("🛑 Cancel Batch Job", key=f"cancel_{job['id']}", on_click=job["cancel"].set)
+    if job.get("table") is None or progress["done"] - job["shown_rows"] >= BATCH_RESULTS_REFRESH_ROWS:
+        job["table"] = batch_results_frame(batch_job_partial_results(job))
+        job["shown_rows"] = progress["done"]
+    st.dataframe(job["table"], use_container_width=True)
+
+
+# ---------------------------------------------------------
+# RESULT DETAILS
+# ---------------------------------------------------------
+# Bounded repr for tool calls - large nested payloads are never stringified in full
+_TOOL_CALL_REPR = reprlib.Repr()
+_TOOL_CALL_REPR.maxstring = 200
+_TOOL_CALL_REPR.maxother = 200
+_TOOL_CALL_REPR.maxlist = 5
+_TOOL_CALL_REPR.maxdict = 5
+
+
+def render_tool_calls(tool_calls):
+    """Show all tool calls (each truncated to 200 chars) in a single code block"""
+    st.code("\n".join(f"Tool {idx}: {_TOOL_CALL_REPR.repr(tool_call)[:200]}" for idx, tool_call in enumerate(tool_calls, 1)), language="text")
+
+
+# Feedback callbacks - run before the fragment reruns and read their inputs from
+# the widgets' session_state keys. The agent and store are fetched once by the fragment
+def record_feedback(feedback_agent, result, user_feedback, feedback_type, spinner_text="Processing your feedback..."):
+    """Run the feedback agent and keep its answer for the result panel"""
+    with st.spinner(spinner_text):
+        updated_result = run_async(feedback_agent.aexecute(
+            original_classification=result,
+            user_feedback=user_feedback,
+            feedback_type=feedback_type
+        ))
+    st.session_state.updated_result = updated_result
+    st.session_state.feedback_submitted = True
+    return updated_result
+
+
+def submit_comment(feedback_agent, result):
+    record_feedback(feedback_agent, result, st.session_state.get("comment_text", ""), "comment")
+
+
+def approve_classification(feedback_agent, result):
+    record_feedback(feedback_agent, result, "User approved this classification as correct", "approval", spinner_text="Recording your approval...")
+
+
+def clear_feedback():
+    st.session_state.feedback_submitted = False
+    st.session_state.updated_result = None
+    st.session_state.quick_feedback = None
+
+
+def apply_correction(feedback_agent, preferences_store, result, category_options, subcategory_options, merchant_name, normalized_text, amount):
+    """
+    Apply a correction from the form; the option tuples are the ones the selectboxes
+    were rendered with. Validation errors are left in session_state["correction_error"].
+    """
+    state = st.session_state
+    category_idx = state.get("category_selectbox", 0)
+    corrected_category = (category_options[category_idx] if category_idx else state.get("custom_category_input")) or ''
+    subcategory_idx = state.get("subcategory_selectbox", 0) if subcategory_options else 0
+    corrected_subcategory = (subcategory_options[subcategory_idx] if subcategory_idx else state.get("custom_subcategory_input")) or ''
+    feedback_text = state.get("correction_comments", "")
+    
+    if not corrected_category.strip():
+        state.correction_error = "❌ Please provide a category"
+        return
+    if not corrected_subcategory.strip():
+        state.correction_error = "❌ Please provide a subcategory"
+        return
+    
+    # Build feedback message
+    feedback_msg = f"Correct category to: {corrected_category.strip()} / {corrected_subcategory.strip()}"
+    if feedback_text:
+        feedback_msg += f". Additional comments: {feedback_text}"
+    
+    updated_result = record_feedback(feedback_agent, result, feedback_msg, "correction")
+    
+    # Store user preference in RAG system for future transactions
+    # Check if agent already stored it via tool (preference_stored flag)
+    if updated_result.get('updated', False) and not updated_result.get('preference_stored', False):
+        # Agent didn't store it, so we'll store it manually as fallback
+        preferences_store.add_preference(
+            merchant_name=merchant_name,
+            description=normalized_text,
+            user_category=updated_result.get('category', corrected_category.strip()),
+            user_subcategory=updated_result.get('subcategory', corrected_subcategory.strip()),
+            original_category=result.get('category'),
+            original_subcategory=result.get('subcategory'),
+            amount=amount
+        )
+        clear_category_cache()
+        updated_result['preference_stored'] = True
+    elif updated_result.get('preference_stored', False):
+        # Agent already stored it via tool
+        clear_category_cache()
+
+
+@st.fragment
+def render_result_details(result):
+    """
+    Render the detail expanders and the feedback section for a classification result.
+    Runs as a fragment, so feedback widgets and buttons rerun only this panel.
+    """
+    # Transaction fields shared by the detail view and the feedback handlers
+    prep_data = result.get('preprocessing_data') or {}
+    merchant_name = result.get('merchant_name', 'Unknown')
+    normalized_text = prep_data.get('normalized_text') or result.get('description', '')
+    amount = prep_data.get('amount') or result.get('amount', 0)
+    
+    # Preprocessing Data Details
+    if 'preprocessing_data' in result:
+        with st.expander("🔍 View Preprocessing Details"):
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    st.markdown("**📝 Extracted Information:**")
+                    st.write(f"- **Canonical Merchant:** {prep_data.get('canonical_merchant', 'N/A')}")
+                    st.write(f"- **CMID:** `{prep_data.get('canonical_merchant_id', 'N/A')}`")
+                    st.write(f"- **Original Merchant:** {prep_data.get('original_merchant', 'N/A')}")
+                    st.write(f"- **Cleaned Description:** {prep_data.get('cleaned_description', 'N/A')}")
+                    
+                    metadata = prep_data.get('metadata', {})
+                    if metadata.get('location'):
+                        st.write(f"- **Location:** {metadata['location']}")
+                    if metadata.get('transaction_type'):
+                        st.write(f"- **Transaction Type:** {metadata['transaction_type']}")
+                
+                with col2:
+                    st.markdown("**🔒 Sensitive Data (Encrypted):**")
+                    sensitive = prep_data.get('sensitive_data', {})
+                    if sensitive:
+                        amount_token = sensitive.get('amount_token', 'N/A')
+                        st.code(f"Amount Token: {amount_token[:32] if amount_token != 'N/A' else 'N/A'}...", language="text")
+                        
+                        mcc_token = sensitive.get('mcc_token', 'N/A')
+                        if mcc_token and mcc_token != 'N/A':
+                            st.code(f"MCC Token: {mcc_token[:32]}...", language="text")
+                        else:
+                            st.code(f"MCC Token: Not provided", language="text")
+                    
+                    st.markdown("**⚙️ Operations Performed:**")
+                    operations = ['Tokenization', 'Noise Removal', 'Text Normalization', 'Merchant Canonicalization', 'Sensitive Data Encryption']
+                    for op in operations:
+                        st.write(f"✓ {op}")
+                
+                st.markdown("**📊 Full Preprocessing Output:**")
+                if st.toggle("Show raw JSON", key="raw_prep"):
+                    st.json(prep_data, expanded=False)
+        
+        # Classification Data Details
+        if 'classification_data' in result:
+            with st.expander("🎯 View Classification Details (Agno AI Agent)"):
+                class_data = result['classification_data']
+                
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    st.markdown("**🤖 Classification Results:**")
+                    st.write(f"- **Category:** {class_data.get('category', 'N/A')}")
+                    st.write(f"- **Subcategory:** {class_data.get('subcategory', 'N/A')}")
+                    st.write(f"- **Confidence:** {class_data.get('confidence', 'N/A').upper()}")
+                    st.write(f"- **Agent:** {class_data.get('agent_used', 'N/A')}")
+                    
+                    st.markdown("**💭 AI Reasoning:**")
+                    st.write(class_data.get('reasoning', 'No reasoning provided'))
+                
+                with col2:
+                    st.markdown("**🔧 Tool Usage:**")
+                    tool_calls = class_data.get('tool_calls', [])
+                    if tool_calls:
+                        st.write(f"- **Tools Called:** {len(tool_calls)}")
+                        render_tool_calls(tool_calls)
+                    else:
+                        st.write("No tool calls recorded")
+                    
+                    st.markdown("**📋 Metadata:**")
+                    metadata = class_data.get('metadata', {})
+                    st.write(f"- Merchant Analyzed: {metadata.get('merchant_analyzed', 'N/A')}")
+                    st.write(f"- Amount: ${metadata.get('amount_analyzed', 0):.2f}")
+                    st.write(f"- MCC Provided: {'Yes' if metadata.get('mcc_provided') else 'No'}")
+                
+                st.markdown("**📊 Full Classification Output:**")
+                if st.toggle("Show raw JSON", key="raw_class"):
+                    st.json(class_data, expanded=False)
+        
+        # Governance Data Details
+        if 'governance_data' in result:
+            with st.expander("⚖️ View Governance & Validation Details (Agno AI Agent)"):
+                gov_data = result['governance_data']
+                
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    st.markdown("**✅ Validation Results:**")
+                    validation = gov_data.get('validation_status', 'N/A')
+                    if validation == 'PASS':
+                        st.success(f"Status: {validation}")
+                    else:
+                        st.error(f"Status: {validation}")
+                    
+                    st.write(f"- **Final Category:** {gov_data.get('category', 'N/A')}")
+                    st.write(f"- **Final Subcategory:** {gov_data.get('subcategory', 'N/A')}")
+                    st.write(f"- **Final Confidence:** {gov_data.get('confidence', 'N/A').upper()}")
+                    st.write(f"- **Assigned MCC:** {gov_data.get('mcc_code', 'N/A')}")
+                    st.write(f"- **MCC Description:** {gov_data.get('mcc_description', 'N/A')}")
+                    st.write(f"- **Agent:** {gov_data.get('agent_used', 'N/A')}")
+                    
+                    # Flags
+                    flags = gov_data.get('flags')
+                    if flags:
+                        st.markdown("**🚩 Compliance Flags:**")
+                        for flag in flags:
+                            st.warning(f"⚠️ {flag}")
+                    else:
+                        st.markdown("**🚩 Compliance Flags:**")
+                        st.success("✓ No flags - All clear")
+                
+                with col2:
+                    st.markdown("**📝 Audit Notes:**")
+                    st.write(gov_data.get('audit_notes', 'No audit notes'))
+                    
+                    st.markdown("**🔧 Tool Usage:**")
+                    tool_calls = gov_data.get('tool_calls', [])
+                    if tool_calls:
+                        st.write(f"- **Tools Called:** {len(tool_calls)}")
+                        render_tool_calls(tool_calls)
+                    else:
+                        st.write("No additional tools called")
+                    
+                    st.markdown("**💬 Governance Response:**")
+                    gov_response = gov_data.get('governance_response', 'N/A')
+                    if len(gov_response) > 300:
+                        st.text_area("Full Response", gov_response, height=150)
+                    else:
+                        st.write(gov_response)
+                
+                st.markdown("**📊 Full Governance Output:**")
+                if st.toggle("Show raw JSON", key="raw_gov"):
+                    st.json(gov_data, expanded=False)
+        
+        # Workflow log
+        with st.expander("🔍 View Agent Workflow (Agentic AI in Action)"):
+            st.markdown("**Complete Agent Execution Log:**")
+            # The log is only grouped and rendered when asked for, like the raw JSON views
+            if st.toggle("Show execution log", key="show_workflow_log"):
+                workflow_log = result.get('workflow_log', [])
+            
+                # Group by agent in one pass
+                groups = {"Preprocessing": [], "Classification": [], "Governance": []}
+                for log in workflow_log:
+                    group = groups.get(log.get('agent_kind'))
+                    if group is not None:
+                        group.append(log)
+            
+                if groups["Preprocessing"]:
+                    st.markdown("**🔄 PreprocessingAgent:**")
+                    for log in groups["Preprocessing"]:
+                        st.text(f"  → {log['message']}")
+            
+                if groups["Classification"]:
+                    st.markdown("**📊 ClassificationAgent:**")
+                    for log in groups["Classification"]:
+                        st.text(f"  → {log['message']}")
+            
+                if groups["Governance"]:
+                    st.markdown("**✅ GovernanceAgent:**")
+                    for log in groups["Governance"]:
+                        st.text(f"  → {log['message']}")
+            
+            st.caption("Each agent operates autonomously with its own LLM calls and decision-making")
+        
+        # Full JSON
+        with st.expander("📄 View Full JSON Response"):
+            # Expander bodies are sent even when collapsed, so only serialize on request
+            if st.toggle("Show raw JSON", key="raw_result"):
+                st.json({**result, "workflow_log": list(result.get('workflow_log', []))}, expanded=False)
+        
+        # ========================================
+        # FEEDBACK SECTION
+        # ========================================
+        st.markdown(_FEEDBACK_HEADER_HTML, unsafe_allow_html=True)
+        
+        # Cached resources, fetched once for all three feedback branches
+        _, _, _, feedback_agent = get_agents()
+        preferences_store = get_preferences_store()
+        
+        # Initialize session state for feedback
+        if 'feedback_submitted' not in st.session_state:
+            st.session_state.feedback_submitted = False
+        if 'updated_result' not in st.session_state:
+            st.session_state.updated_result = None
+        
+        # Feedback options with styled cards
+        col1, col2 = st.columns([2, 1])
+        
+        with col1:
+            st.markdown("#### Choose Feedback Type")
+            # Initialize feedback_type_radio if not exists or reset to approve
+            feedback_options = ["✅ Approve Classification", "✏️ Correct Classification", "💬 Add Comment"]
+            if 'feedback_type_radio' not in st.session_state:
+                st.session_state.feedback_type_radio = feedback_options[0]
+            
+            feedback_type = st.radio(
+                "Select one:",
+                feedback_options,
+                key="feedback_type_radio",
+                help="Choose how you want to provide feedback"
+            )
+        
+        # with col2:
+        #     st.markdown("#### Quick Actions")
+        #     st.markdown("""
+        #     <style>
+        #     .quick-btn {
+        #         display: block;
+        #         width: 100%;
+        #         margin-bottom: 0.5rem;
+        #     }
+        #     </style>
+        #     """, unsafe_allow_html=True)
+        #     if st.button("👍 Looks Good!", use_container_width=True, key="quick_approve"):
+        #         st.session_state.quick_feedback = "approve"
+        #     if st.button("👎 Needs Fix", use_container_width=True, key="quick_fix"):
+        #         st.session_state.quick_feedback = "correct"
+        
+        # Feedback form
+        if "✏️ Correct Classification" in feedback_type or st.session_state.get('quick_feedback') == 'correct':
+            st.markdown("**Provide Correct Classification:**")
+            
+            try:
+                # Get all available categories
+                all_categories = get_all_available_categories()
+                category_list = get_category_list_for_dropdown()
+            except Exception as e:
+                st.error(f"Error loading categories: {str(e)}")
+                st.info("Please refresh the page and try again.")
+                category_list = []
+                all_categories = {}
+            
+            # Selectboxes stay outside the form so the subcategory list and the custom
+            # inputs follow the category live; free text and the submit are batched in the form
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.markdown("**Category:**")
+                # Add "Custom Input" option to the list
+                category_options, category_index = build_selectbox_options(tuple(category_list))
+                
+                # Find current index
+                current_category = result.get('category', '') or ''
+                current_idx = category_index.get(current_category, 0)
+                
+                selected_category_idx = st.selectbox(
+                    "Choose from available categories:",
+                    options=range(len(category_options)),
+                    format_func=lambda x: category_options[x],
+                    index=current_idx,
+                    key="category_selectbox"
+                )
+            
+            with col2:
+                st.markdown("**Subcategory:**")
+                
+                current_subcategory = result.get('subcategory', '') or ''
+                available_subcategories = []
+                subcategory_options = ()
+                selected_subcategory_idx = 0
+                
+                # Get subcategories for a category selected from the dropdown
+                if 0 < selected_category_idx < len(category_options):
+                    try:
+                        available_subcategories = get_subcategories_for_category(category_options[selected_category_idx])
+                    except Exception as e:
+                        # Fallback to custom input if error
+                        st.warning(f"Error loading subcategories: {str(e)}")
+                    
+                    if available_subcategories:
+                        subcategory_options, subcategory_index = build_selectbox_options(tuple(available_subcategories))
+                        
+                        # Find current subcategory index
+                        current_sub_idx = subcategory_index.get(current_subcategory, 0)
+                        
+                        selected_subcategory_idx = st.selectbox(
+                            "Choose from available subcategories:",
+                            options=range(len(subcategory_options)),
+                            format_func=lambda x: subcategory_options[x],
+                            index=current_sub_idx,
+                            key="subcategory_selectbox"
+                        )
+            
+            with st.form("correction_form", border=False):
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    # Determine selected category
+                    corrected_category = ''
+                    if selected_category_idx == 0:
+                        # Custom input selected
+                        corrected_category = st.text_input(
+                            "Enter Custom Category:",
+                            value=current_category if current_category and current_category not in category_list else '',
+                            key="custom_category_input",
+                            placeholder="e.g., Business Expenses"
+                        ) or ''
+                    elif selected_category_idx < len(category_options):
+                        # Category from dropdown selected
+                        corrected_category = category_options[selected_category_idx] or ''
+                
+                with col2:
+                    corrected_subcategory = ''
+                    if not available_subcategories:
+                        # Custom category, no subcategories available or an error loading them
+                        corrected_subcategory = st.text_input(
+                            "Enter Subcategory:",
+                            value=current_subcategory,
+                            key="custom_subcategory_input",
+                            placeholder="e.g., General"
+                        ) or ''
+                    elif selected_subcategory_idx == 0:
+                        # Custom subcategory input
+                        corrected_subcategory = st.text_input(
+                            "Enter Custom Subcategory:",
+                            value=current_subcategory if current_subcategory not in available_subcategories else '',
+                            key="custom_subcategory_input",
+                            placeholder="e.g., Office Supplies"
+                        ) or ''
+                    else:
+                        # Subcategory from dropdown
+                        corrected_subcategory = subcategory_options[selected_subcategory_idx] or ''
+                
+                # Show category source info
+                if corrected_category and corrected_category in all_categories:
+                    source_info = all_categories[corrected_category]["source"]
+                    st.info(f"ℹ️ Category source: {source_info}")
+                
+                st.text_area(
+                    "Additional Comments (Optional):",
+                    placeholder="Explain why this classification is incorrect...",
+                    key="correction_comments"
+                )
+                
+                st.form_submit_button(
+                    "🔄 Apply Correction",
+                    type="primary",
+                    on_click=apply_correction,
+                    args=(feedback_agent, preferences_store, result, category_options, subcategory_options, merchant_name, normalized_text, amount)
+                )
+            
+            error = st.session_state.pop("correction_error", None)
+            if error:
+                st.error(error)
+        
+        elif "💬 Add Comment" in feedback_type:
+            st.text_area(
+                "Your Comments:",
+                placeholder="Share your thoughts about this classification...",
+                key="comment_text"
+            )
+            
+            st.button("📝 Submit Comment", type="primary", key="submit_comment", on_click=submit_comment, args=(feedback_agent, result))
+        
+        else:  # Approve
+            st.button("✅ Approve This Classification", type="primary", key="approve_classification", on_click=approve_classification, args=(feedback_agent, result))
+            if st.session_state.get('quick_feedback') == 'approve' and not st.session_state.feedback_submitted:
+                approve_classification(feedback_agent, result)
+        
+        # Show updated result if feedback was processed
+        if st.session_state.feedback_submitted and st.session_state.updated_result:
+            st.markdown(_FEEDBACK_PROCESSED_HTML, unsafe_allow_html=True)
+            
+            updated = st.session_state.updated_result
+            if updated.get('preference_id'):
+                # Agent stored the preference via its tool
+                st.success(f"✅ User preference stored in RAG system (ID: {updated['preference_id']})")
+            
+            # Show what changed
+            if updated.get('updated', False):
+                # Banner, Before/After, AI Reasoning and Audit Trail cards in one element;
+                # model output is escaped before it is inlined
+                fields = {key: html.escape(str(updated.get(key, default))) for key, default in _FEEDBACK_CHANGE_FIELDS.items()}
+                st.markdown(_FEEDBACK_CHANGE_CARDS.substitute(fields), unsafe_allow_html=True)
+            
+            else:
+                st.markdown(
+                    _FEEDBACK_ACKNOWLEDGED_CARD.substitute(message=updated.get('feedback_applied', 'Thank you for your feedback!')),
+                    unsafe_allow_html=True
+                )
+            
+            # Show full feedback result
+            with st.expander("📊 View Full Feedback Processing Result"):
+                if st.toggle("Show raw JSON", key="raw_feedback"):
+                    st.json(updated, expanded=False)
+            
+            # Reset button with styling
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col2:
+                st.button("🔄 Clear Feedback and Try Again", use_container_width=True, type="secondary", on_click=clear_feedback)
+
+
 # ---------------------------------------------------------
 # STREAMLIT UI
 # ---------------------------------------------------------
@@ -484,13 +1864,20 @@ with tab1:
         st.session_state.processing = True
         st.session_state.final_status_message = None
         
-        result = process_single_transaction(
-            desc, 
-            amt, 
-            merchant_name=merchant if merchant else None,
-            mcc_code=mcc if mcc else None,
-            status_placeholder=agent_status
+        get_agents()  # First use builds the agents here on the script thread
+        status_relay = StatusRelay()
+        result = run_async(
+            process_single_transaction(
+                desc, 
+                amt, 
+                merchant_name=merchant if merchant else None,
+                mcc_code=mcc if mcc else None,
+                status_placeholder=status_relay
+            ),
+            on_poll=lambda: status_relay.replay(agent_status),
+            poll_interval=1 / 30  # ~30 Hz repaint while tokens stream in
         )
+        st.session_state.classification_cache_stats = get_classification_cache().stats()
         
         # Store in session state for feedback
         st.session_state.classification_result = result
@@ -531,52 +1918,42 @@ with tab1:
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                st.markdown(f"""
-                <div style='padding: 1.5rem; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 15px; color: white; box-shadow: 0 4px 6px rgba(0,0,0,0.1);'>
-                    <h4 style='margin: 0; font-size: 0.9rem; opacity: 0.9;'>🏪 MERCHANT</h4>
-                    <h2 style='margin: 0.5rem 0;'>{result.get('merchant_name', 'N/A')}</h2>
-                    <p style='margin: 0; font-size: 0.85rem; opacity: 0.8;'>CMID: {result.get('canonical_merchant_id', 'N/A')[:12]}...</p>
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(_RESULT_CARD.substitute(
+                    color_from="#667eea", color_to="#764ba2", label="🏪 MERCHANT",
+                    value=result.get('merchant_name', 'N/A'),
+                    detail=f"CMID: {result.get('canonical_merchant_id', 'N/A')[:12]}..."
+                ), unsafe_allow_html=True)
             
             with col2:
-                st.markdown(f"""
-                <div style='padding: 1.5rem; background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%); border-radius: 15px; color: white; box-shadow: 0 4px 6px rgba(0,0,0,0.1);'>
-                    <h4 style='margin: 0; font-size: 0.9rem; opacity: 0.9;'>📂 CATEGORY</h4>
-                    <h2 style='margin: 0.5rem 0;'>{result.get('category', 'N/A')}</h2>
-                    <p style='margin: 0; font-size: 0.85rem; opacity: 0.8;'>{result.get('subcategory', 'N/A')}</p>
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(_RESULT_CARD.substitute(
+                    color_from="#4facfe", color_to="#00f2fe", label="📂 CATEGORY",
+                    value=result.get('category', 'N/A'),
+                    detail=result.get('subcategory', 'N/A')
+                ), unsafe_allow_html=True)
             
             with col3:
                 confidence_value = result.get('confidence', 'N/A')
                 conf_color = '#f093fb' if confidence_value == 'HIGH' else ('#feca57' if confidence_value == 'MEDIUM' else '#ff6b6b')
                 conf_color2 = '#f5576c' if confidence_value == 'HIGH' else ('#ff9ff3' if confidence_value == 'MEDIUM' else '#ffa07a')
-                st.markdown(f"""
-                <div style='padding: 1.5rem; background: linear-gradient(135deg, {conf_color} 0%, {conf_color2} 100%); border-radius: 15px; color: white; box-shadow: 0 4px 6px rgba(0,0,0,0.1);'>
-                    <h4 style='margin: 0; font-size: 0.9rem; opacity: 0.9;'>📊 CONFIDENCE</h4>
-                    <h2 style='margin: 0.5rem 0;'>{confidence_value.upper() if confidence_value != 'N/A' else 'N/A'}</h2>
-                    <p style='margin: 0; font-size: 0.85rem; opacity: 0.8;'>AI Certainty Level</p>
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(_RESULT_CARD.substitute(
+                    color_from=conf_color, color_to=conf_color2, label="📊 CONFIDENCE",
+                    value=confidence_value.upper() if confidence_value != 'N/A' else 'N/A',
+                    detail="AI Certainty Level"
+                ), unsafe_allow_html=True)
             
             st.markdown("<br>", unsafe_allow_html=True)
             
             # MCC Code and Description
             col1, col2 = st.columns(2)
             with col1:
-                st.markdown(f"""
-                <div style='padding: 1rem; background: #f8f9fa; border-left: 4px solid #667eea; border-radius: 8px;'>
-                    <strong>🏷️ MCC Code:</strong> <code>{result.get('mcc_code', 'N/A')}</code>
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(_DETAIL_CARD.substitute(
+                    accent="#667eea", label="🏷️ MCC Code:", value=f"<code>{result.get('mcc_code', 'N/A')}</code>"
+                ), unsafe_allow_html=True)
             
             with col2:
-                st.markdown(f"""
-                <div style='padding: 1rem; background: #f8f9fa; border-left: 4px solid #4facfe; border-radius: 8px;'>
-                    <strong>📋 Description:</strong> {result.get('mcc_description', 'N/A')}
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(_DETAIL_CARD.substitute(
+                    accent="#4facfe", label="📋 Description:", value=result.get('mcc_description', 'N/A')
+                ), unsafe_allow_html=True)
             
             # Validation status
             validation_status = result.get('validation_status', 'UNKNOWN')
@@ -603,523 +1980,7 @@ with tab1:
             if result.get('flags'):
                 st.warning(f"⚠️ Flags: {', '.join(result.get('flags'))}")
             
-            # Preprocessing Data Details
-            if 'preprocessing_data' in result:
-                with st.expander("🔍 View Preprocessing Details"):
-                        prep_data = result['preprocessing_data']
-                        
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            st.markdown("**📝 Extracted Information:**")
-                            st.write(f"- **Canonical Merchant:** {prep_data.get('canonical_merchant', 'N/A')}")
-                            st.write(f"- **CMID:** `{prep_data.get('canonical_merchant_id', 'N/A')}`")
-                            st.write(f"- **Original Merchant:** {prep_data.get('original_merchant', 'N/A')}")
-                            st.write(f"- **Cleaned Description:** {prep_data.get('cleaned_description', 'N/A')}")
-                            
-                            metadata = prep_data.get('metadata', {})
-                            if metadata.get('location'):
-                                st.write(f"- **Location:** {metadata['location']}")
-                            if metadata.get('transaction_type'):
-                                st.write(f"- **Transaction Type:** {metadata['transaction_type']}")
-                        
-                        with col2:
-                            st.markdown("**🔒 Sensitive Data (Encrypted):**")
-                            sensitive = prep_data.get('sensitive_data', {})
-                            if sensitive:
-                                amount_token = sensitive.get('amount_token', 'N/A')
-                                st.code(f"Amount Token: {amount_token[:32] if amount_token != 'N/A' else 'N/A'}...", language="text")
-                                
-                                mcc_token = sensitive.get('mcc_token', 'N/A')
-                                if mcc_token and mcc_token != 'N/A':
-                                    st.code(f"MCC Token: {mcc_token[:32]}...", language="text")
-                                else:
-                                    st.code(f"MCC Token: Not provided", language="text")
-                            
-                            st.markdown("**⚙️ Operations Performed:**")
-                            operations = ['Tokenization', 'Noise Removal', 'Text Normalization', 'Merchant Canonicalization', 'Sensitive Data Encryption']
-                            for op in operations:
-                                st.write(f"✓ {op}")
-                        
-                        st.markdown("**📊 Full Preprocessing Output:**")
-                        st.json(prep_data)
-                
-                # Classification Data Details
-                if 'classification_data' in result:
-                    with st.expander("🎯 View Classification Details (Agno AI Agent)"):
-                        class_data = result['classification_data']
-                        
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            st.markdown("**🤖 Classification Results:**")
-                            st.write(f"- **Category:** {class_data.get('category', 'N/A')}")
-                            st.write(f"- **Subcategory:** {class_data.get('subcategory', 'N/A')}")
-                            st.write(f"- **Confidence:** {class_data.get('confidence', 'N/A').upper()}")
-                            st.write(f"- **Agent:** {class_data.get('agent_used', 'N/A')}")
-                            
-                            st.markdown("**💭 AI Reasoning:**")
-                            st.write(class_data.get('reasoning', 'No reasoning provided'))
-                        
-                        with col2:
-                            st.markdown("**🔧 Tool Usage:**")
-                            tool_calls = class_data.get('tool_calls', [])
-                            if tool_calls:
-                                st.write(f"- **Tools Called:** {len(tool_calls)}")
-                                for idx, tool_call in enumerate(tool_calls, 1):
-                                    with st.container():
-                                        st.text(f"Tool {idx}:")
-                                        st.code(str(tool_call)[:200], language="text")
-                            else:
-                                st.write("No tool calls recorded")
-                            
-                            st.markdown("**📋 Metadata:**")
-                            metadata = class_data.get('metadata', {})
-                            st.write(f"- Merchant Analyzed: {metadata.get('merchant_analyzed', 'N/A')}")
-                            st.write(f"- Amount: ${metadata.get('amount_analyzed', 0):.2f}")
-                            st.write(f"- MCC Provided: {'Yes' if metadata.get('mcc_provided') else 'No'}")
-                        
-                        st.markdown("**📊 Full Classification Output:**")
-                        st.json(class_data)
-                
-                # Governance Data Details
-                if 'governance_data' in result:
-                    with st.expander("⚖️ View Governance & Validation Details (Agno AI Agent)"):
-                        gov_data = result['governance_data']
-                        
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            st.markdown("**✅ Validation Results:**")
-                            validation = gov_data.get('validation_status', 'N/A')
-                            if validation == 'PASS':
-                                st.success(f"Status: {validation}")
-                            else:
-                                st.error(f"Status: {validation}")
-                            
-                            st.write(f"- **Final Category:** {gov_data.get('category', 'N/A')}")
-                            st.write(f"- **Final Subcategory:** {gov_data.get('subcategory', 'N/A')}")
-                            st.write(f"- **Final Confidence:** {gov_data.get('confidence', 'N/A').upper()}")
-                            st.write(f"- **Assigned MCC:** {gov_data.get('mcc_code', 'N/A')}")
-                            st.write(f"- **MCC Description:** {gov_data.get('mcc_description', 'N/A')}")
-                            st.write(f"- **Agent:** {gov_data.get('agent_used', 'N/A')}")
-                            
-                            # Flags
-                            flags = gov_data.get('flags')
-                            if flags:
-                                st.markdown("**🚩 Compliance Flags:**")
-                                for flag in flags:
-                                    st.warning(f"⚠️ {flag}")
-                            else:
-                                st.markdown("**🚩 Compliance Flags:**")
-                                st.success("✓ No flags - All clear")
-                        
-                        with col2:
-                            st.markdown("**📝 Audit Notes:**")
-                            st.write(gov_data.get('audit_notes', 'No audit notes'))
-                            
-                            st.markdown("**🔧 Tool Usage:**")
-                            tool_calls = gov_data.get('tool_calls', [])
-                            if tool_calls:
-                                st.write(f"- **Tools Called:** {len(tool_calls)}")
-                                for idx, tool_call in enumerate(tool_calls, 1):
-                                    with st.container():
-                                        st.text(f"Tool {idx}:")
-                                        st.code(str(tool_call)[:200], language="text")
-                            else:
-                                st.write("No additional tools called")
-                            
-                            st.markdown("**💬 Governance Response:**")
-                            gov_response = gov_data.get('governance_response', 'N/A')
-                            if len(gov_response) > 300:
-                                st.text_area("Full Response", gov_response, height=150)
-                            else:
-                                st.write(gov_response)
-                        
-                        st.markdown("**📊 Full Governance Output:**")
-                        st.json(gov_data)
-                
-                # Workflow log
-                with st.expander("🔍 View Agent Workflow (Agentic AI in Action)"):
-                    st.markdown("**Complete Agent Execution Log:**")
-                    workflow_log = result.get('workflow_log', [])
-                    
-                    # Group by agent
-                    preprocessing_logs = [log for log in workflow_log if 'Preprocessing' in log['agent']]
-                    classification_logs = [log for log in workflow_log if 'Classification' in log['agent']]
-                    governance_logs = [log for log in workflow_log if 'Governance' in log['agent']]
-                    
-                    if preprocessing_logs:
-                        st.markdown("**🔄 PreprocessingAgent:**")
-                        for log in preprocessing_logs:
-                            st.text(f"  → {log['message']}")
-                    
-                    if classification_logs:
-                        st.markdown("**📊 ClassificationAgent:**")
-                        for log in classification_logs:
-                            st.text(f"  → {log['message']}")
-                    
-                    if governance_logs:
-                        st.markdown("**✅ GovernanceAgent:**")
-                        for log in governance_logs:
-                            st.text(f"  → {log['message']}")
-                    
-                    st.caption("Each agent operates autonomously with its own LLM calls and decision-making")
-                
-                # Full JSON
-                with st.expander("📄 View Full JSON Response"):
-                    st.json(result)
-                
-                # ========================================
-                # FEEDBACK SECTION
-                # ========================================
-                st.markdown("<br><br>", unsafe_allow_html=True)
-                st.markdown("""
-                <div style='padding: 1.5rem; background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); border-radius: 15px; color: white; margin: 2rem 0;'>
-                    <h2 style='margin: 0; font-size: 1.8rem;'>💬 Provide Feedback</h2>
-                    <p style='margin: 0.5rem 0 0 0; opacity: 0.9;'>Help us improve by sharing your thoughts on this classification</p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Initialize session state for feedback
-                if 'feedback_submitted' not in st.session_state:
-                    st.session_state.feedback_submitted = False
-                if 'updated_result' not in st.session_state:
-                    st.session_state.updated_result = None
-                
-                # Feedback options with styled cards
-                col1, col2 = st.columns([2, 1])
-                
-                with col1:
-                    st.markdown("#### Choose Feedback Type")
-                    # Initialize feedback_type_radio if not exists or reset to approve
-                    feedback_options = ["✅ Approve Classification", "✏️ Correct Classification", "💬 Add Comment"]
-                    if 'feedback_type_radio' not in st.session_state:
-                        st.session_state.feedback_type_radio = feedback_options[0]
-                    
-                    feedback_type = st.radio(
-                        "Select one:",
-                        feedback_options,
-                        key="feedback_type_radio",
-                        help="Choose how you want to provide feedback"
-                    )
-                
-                # with col2:
-                #     st.markdown("#### Quick Actions")
-                #     st.markdown("""
-                #     <style>
-                #     .quick-btn {
-                #         display: block;
-                #         width: 100%;
-                #         margin-bottom: 0.5rem;
-                #     }
-                #     </style>
-                #     """, unsafe_allow_html=True)
-                #     if st.button("👍 Looks Good!", use_container_width=True, key="quick_approve"):
-                #         st.session_state.quick_feedback = "approve"
-                #     if st.button("👎 Needs Fix", use_container_width=True, key="quick_fix"):
-                #         st.session_state.quick_feedback = "correct"
-                
-                # Feedback form
-                if "✏️ Correct Classification" in feedback_type or st.session_state.get('quick_feedback') == 'correct':
-                    st.markdown("**Provide Correct Classification:**")
-                    
-                    try:
-                        # Get all available categories
-                        all_categories = get_all_available_categories()
-                        category_list = get_category_list_for_dropdown()
-                    except Exception as e:
-                        st.error(f"Error loading categories: {str(e)}")
-                        st.info("Please refresh the page and try again.")
-                        category_list = []
-                        all_categories = {}
-                    
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.markdown("**Category:**")
-                        # Add "Custom Input" option to the list
-                        category_options = ["--- Select or Enter Custom ---"] + category_list
-                        
-                        # Find current index
-                        current_category = result.get('category', '') or ''
-                        current_idx = 0
-                        if current_category and current_category in category_list:
-                            try:
-                                current_idx = category_list.index(current_category) + 1
-                            except ValueError:
-                                current_idx = 0
-                        
-                        selected_category_idx = st.selectbox(
-                            "Choose from available categories:",
-                            options=range(len(category_options)),
-                            format_func=lambda x: category_options[x],
-                            index=current_idx,
-                            key="category_selectbox"
-                        )
-                        
-                        # Determine selected category
-                        corrected_category = ''
-                        try:
-                            if selected_category_idx == 0:
-                                # Custom input selected
-                                corrected_category = st.text_input(
-                                    "Enter Custom Category:",
-                                    value=current_category if current_category and current_category not in category_list else '',
-                                    key="custom_category_input",
-                                    placeholder="e.g., Business Expenses"
-                                ) or ''
-                            else:
-                                # Category from dropdown selected
-                                if selected_category_idx < len(category_options):
-                                    corrected_category = category_options[selected_category_idx] or ''
-                        except Exception as e:
-                            st.error(f"Error in category selection: {str(e)}")
-                            corrected_category = current_category
-                    
-                    with col2:
-                        st.markdown("**Subcategory:**")
-                        
-                        # Initialize corrected_subcategory
-                        corrected_subcategory = ''
-                        current_subcategory = result.get('subcategory', '') or ''
-                        
-                        # Get subcategories for selected category
-                        if corrected_category and corrected_category.strip() and selected_category_idx > 0:
-                            # Category selected from dropdown
-                            try:
-                                available_subcategories = get_subcategories_for_category(corrected_category)
-                                
-                                if available_subcategories:
-                                    subcategory_options = ["--- Select or Enter Custom ---"] + available_subcategories
-                                    
-                                    # Find current subcategory index
-                                    current_sub_idx = 0
-                                    if current_subcategory in available_subcategories:
-                                        current_sub_idx = available_subcategories.index(current_subcategory) + 1
-                                    
-                                    selected_subcategory_idx = st.selectbox(
-                                        "Choose from available subcategories:",
-                                        options=range(len(subcategory_options)),
-                                        format_func=lambda x: subcategory_options[x],
-                                        index=current_sub_idx,
-                                        key="subcategory_selectbox"
-                                    )
-                                    
-                                    if selected_subcategory_idx == 0:
-                                        # Custom subcategory input
-                                        corrected_subcategory = st.text_input(
-                                            "Enter Custom Subcategory:",
-                                            value=current_subcategory if current_subcategory not in available_subcategories else '',
-                                            key="custom_subcategory_input",
-                                            placeholder="e.g., Office Supplies"
-                                        ) or ''
-                                    else:
-                                        # Subcategory from dropdown
-                                        corrected_subcategory = subcategory_options[selected_subcategory_idx] or ''
-                                else:
-                                    # No subcategories available, use custom input
-                                    corrected_subcategory = st.text_input(
-                                        "Enter Subcategory:",
-                                        value=current_subcategory,
-                                        key="custom_subcategory_input",
-                                        placeholder="e.g., General"
-                                    ) or ''
-                            except Exception as e:
-                                # Fallback to custom input if error
-                                st.warning(f"Error loading subcategories: {str(e)}")
-                                corrected_subcategory = st.text_input(
-                                    "Enter Subcategory:",
-                                    value=current_subcategory,
-                                    key="custom_subcategory_input",
-                                    placeholder="e.g., General"
-                                ) or ''
-                        else:
-                            # Custom category or no category selected, allow custom subcategory
-                            corrected_subcategory = st.text_input(
-                                "Enter Subcategory:",
-                                value=current_subcategory,
-                                key="custom_subcategory_input",
-                                placeholder="e.g., General"
-                            ) or ''
-                    
-                    # Show category source info
-                    if corrected_category and corrected_category in all_categories:
-                        source_info = all_categories[corrected_category]["source"]
-                        st.info(f"ℹ️ Category source: {source_info}")
-                    
-                    feedback_text = st.text_area(
-                        "Additional Comments (Optional):",
-                        placeholder="Explain why this classification is incorrect...",
-                        key="correction_comments"
-                    )
-                    
-                    if st.button("🔄 Apply Correction", type="primary", key="apply_correction"):
-                        # Validate inputs
-                        corrected_category = corrected_category or ''
-                        corrected_subcategory = corrected_subcategory or ''
-                        
-                        if not corrected_category.strip():
-                            st.error("❌ Please provide a category")
-                        elif not corrected_subcategory.strip():
-                            st.error("❌ Please provide a subcategory")
-                        else:
-                            with st.spinner("Processing your feedback..."):
-                                feedback_agent = get_feedback_agent()
-                                
-                                # Build feedback message
-                                feedback_msg = f"Correct category to: {corrected_category.strip()} / {corrected_subcategory.strip()}"
-                                if feedback_text:
-                                    feedback_msg += f". Additional comments: {feedback_text}"
-                                
-                                # Process feedback
-                                updated_result = feedback_agent.execute(
-                                    original_classification=result,
-                                    user_feedback=feedback_msg,
-                                    feedback_type="correction"
-                                )
-                                
-                                # Store user preference in RAG system for future transactions
-                                # Check if agent already stored it via tool (preference_stored flag)
-                                if updated_result.get('updated', False) and not updated_result.get('preference_stored', False):
-                                    # Agent didn't store it, so we'll store it manually as fallback
-                                    preferences_store = get_preferences_store()
-                                    preferences_store.add_preference(
-                                        merchant_name=result.get('merchant_name', 'Unknown'),
-                                        description=result.get('preprocessing_data', {}).get('normalized_text', '') or result.get('description', ''),
-                                        user_category=updated_result.get('category', corrected_category.strip()),
-                                        user_subcategory=updated_result.get('subcategory', corrected_subcategory.strip()),
-                                        original_category=result.get('category'),
-                                        original_subcategory=result.get('subcategory'),
-                                        amount=result.get('preprocessing_data', {}).get('amount', 0) or result.get('amount', 0)
-                                    )
-                                    updated_result['preference_stored'] = True
-                                elif updated_result.get('preference_stored', False):
-                                    # Agent already stored it via tool
-                                    st.success(f"✅ User preference stored in RAG system (ID: {updated_result.get('preference_id', 'N/A')})")
-                                
-                                st.session_state.updated_result = updated_result
-                                st.session_state.feedback_submitted = True
-                                st.rerun()
-                
-                elif "💬 Add Comment" in feedback_type:
-                    feedback_text = st.text_area(
-                        "Your Comments:",
-                        placeholder="Share your thoughts about this classification...",
-                        key="comment_text"
-                    )
-                    
-                    if st.button("📝 Submit Comment", type="primary", key="submit_comment"):
-                        with st.spinner("Processing your feedback..."):
-                            feedback_agent = get_feedback_agent()
-                            
-                            updated_result = feedback_agent.execute(
-                                original_classification=result,
-                                user_feedback=feedback_text,
-                                feedback_type="comment"
-                            )
-                            
-                            st.session_state.updated_result = updated_result
-                            st.session_state.feedback_submitted = True
-                            st.rerun()
-                
-                else:  # Approve
-                    if st.button("✅ Approve This Classification", type="primary", key="approve_classification") or st.session_state.get('quick_feedback') == 'approve':
-                        with st.spinner("Recording your approval..."):
-                            feedback_agent = get_feedback_agent()
-                            
-                            updated_result = feedback_agent.execute(
-                                original_classification=result,
-                                user_feedback="User approved this classification as correct",
-                                feedback_type="approval"
-                            )
-                            
-                            st.session_state.updated_result = updated_result
-                            st.session_state.feedback_submitted = True
-                            st.rerun()
-                
-                # Show updated result if feedback was processed
-                if st.session_state.feedback_submitted and st.session_state.updated_result:
-                    st.markdown("<br>", unsafe_allow_html=True)
-                    st.markdown("""
-                    <div style='padding: 1.5rem; background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%); border-radius: 15px; color: white;'>
-                        <h3 style='margin: 0;'>✅ Feedback Processed Successfully!</h3>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    st.markdown("<br>", unsafe_allow_html=True)
-                    
-                    updated = st.session_state.updated_result
-                    
-                    # Show what changed
-                    if updated.get('updated', False):
-                        st.markdown("""
-                        <div style='padding: 1rem; background: #fff3cd; border-left: 4px solid #ffc107; border-radius: 8px; margin-bottom: 1rem;'>
-                            <h4 style='margin: 0; color: #856404;'>🔄 Classification Updated Based on Your Feedback</h4>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            st.markdown("""
-                            <div style='padding: 1rem; background: #f8f9fa; border-radius: 8px; border: 2px solid #dc3545;'>
-                                <h4 style='color: #dc3545; margin-top: 0;'>❌ Before</h4>
-                            """, unsafe_allow_html=True)
-                            st.write(f"**Category:** {updated.get('original_category', 'N/A')}")
-                            st.write(f"**Subcategory:** {updated.get('original_subcategory', 'N/A')}")
-                            st.markdown("</div>", unsafe_allow_html=True)
-                        
-                        with col2:
-                            st.markdown("""
-                            <div style='padding: 1rem; background: #f8f9fa; border-radius: 8px; border: 2px solid #28a745;'>
-                                <h4 style='color: #28a745; margin-top: 0;'>✅ After</h4>
-                            """, unsafe_allow_html=True)
-                            st.write(f"**Category:** {updated.get('category', 'N/A')}")
-                            st.write(f"**Subcategory:** {updated.get('subcategory', 'N/A')}")
-                            st.write(f"**Confidence:** {updated.get('confidence', 'N/A')}")
-                            st.write(f"**MCC Code:** {updated.get('mcc_code', 'N/A')}")
-                            st.markdown("</div>", unsafe_allow_html=True)
-                        
-                        st.markdown("<br>", unsafe_allow_html=True)
-                        
-                        # AI Reasoning card
-                        st.markdown(f"""
-                        <div style='padding: 1rem; background: #e7f3ff; border-left: 4px solid #0066cc; border-radius: 8px; margin-bottom: 1rem;'>
-                            <h4 style='color: #0066cc; margin-top: 0;'>🤖 AI Reasoning</h4>
-                            <p style='margin-bottom: 0; color: #333;'>{updated.get('reasoning', 'No reasoning provided')}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        # Audit Trail card
-                        st.markdown(f"""
-                        <div style='padding: 1rem; background: #f0f0f0; border-left: 4px solid #6c757d; border-radius: 8px;'>
-                            <h4 style='color: #6c757d; margin-top: 0;'>📋 Audit Trail</h4>
-                            <p style='margin-bottom: 0; color: #333;'>{updated.get('audit_notes', 'No audit notes')}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    else:
-                        st.markdown("""
-                        <div style='padding: 1.5rem; background: #d1ecf1; border-left: 4px solid #0c5460; border-radius: 8px;'>
-                            <h4 style='color: #0c5460; margin-top: 0;'>✅ Feedback Acknowledged</h4>
-                            <p style='margin-bottom: 0; color: #0c5460;'>""" + updated.get('feedback_applied', 'Thank you for your feedback!') + """</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    st.markdown("<br>", unsafe_allow_html=True)
-                    
-                    # Show full feedback result
-                    with st.expander("📊 View Full Feedback Processing Result"):
-                        st.json(updated)
-                    
-                    # Reset button with styling
-                    col1, col2, col3 = st.columns([1, 2, 1])
-                    with col2:
-                        if st.button("🔄 Clear Feedback and Try Again", use_container_width=True, type="secondary"):
-                            st.session_state.feedback_submitted = False
-                            st.session_state.updated_result = None
-                            st.session_state.quick_feedback = None
-                            st.rerun()
+            render_result_details(result)
 
 # --- TAB 2: Batch CSV Processing ---
 with tab2:
@@ -1130,18 +1991,9 @@ with tab2:
     # Sample CSV template for download with better styling
     st.markdown("#### 📥 Download Sample Template")
     
-    sample_data = {
-        'description': ['Starbucks Coffee Shop', 'Shell Gas Station', 'Walmart Supercenter', 'Netflix Subscription'],
-        'amount': [5.50, 45.00, 123.45, 15.99],
-        'merchant_name': ['Starbucks', 'Shell', 'Walmart', 'Netflix'],
-        'mcc_code': ['5812', '5541', '5411', '7841']
-    }
-    sample_df = pd.DataFrame(sample_data)
-    sample_csv = sample_df.to_csv(index=False).encode('utf-8')
-    
     st.download_button(
         "📥 Download Sample CSV Template",
-        sample_csv,
+        sample_csv_bytes(),
         "sample_transactions.csv",
         "text/csv",
         help="Download this template to see the expected format"
@@ -1149,24 +2001,32 @@ with tab2:
     
     st.divider()
 
+    # Process-wide, like the deployment quota it mirrors
+    rate_limiter = get_rate_limiter()
+    rate_limiter.set_rate(st.sidebar.number_input(
+        "Azure OpenAI requests/minute",
+        min_value=0,
+        value=int(rate_limiter.requests_per_minute),
+        step=10,
+        help="Throttle LLM requests to your deployment's RPM quota to avoid 429 retries (0 = unlimited)"
+    ))
+
     uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
 
     if uploaded_file is not None:
         try:
-            # Try to read with error handling and flexible options
-            df = pd.read_csv(
-                uploaded_file,
-                on_bad_lines='skip',  # Skip bad lines instead of failing
-                encoding='utf-8',
-                skipinitialspace=True
-            )
+            # Try to read with error handling and flexible options; the file is
+            # parsed in chunks so only one chunk is ever held in memory
+            reader = read_batch_csv(uploaded_file)
+            df = next(reader, None)
+            if df is None:
+                raise ValueError("No data rows found")
             
             # Clean column names - strip whitespace and convert to lowercase
-            df.columns = df.columns.str.strip().str.lower()
+            df = clean_batch_columns(df)
             
             # Check for required columns (now in lowercase)
-            required_columns = ['description', 'amount']
-            missing_columns = [col for col in required_columns if col not in df.columns]
+            missing_columns = sorted(BATCH_CSV_REQUIRED_COLUMNS - set(df.columns))
             
             if missing_columns:
                 st.error(f"❌ Missing required columns: {', '.join(missing_columns)}")
@@ -1174,100 +2034,61 @@ with tab2:
                 st.info("📋 Optional columns: `merchant_name`, `mcc_code`")
                 
                 # Show what columns were found
-                st.write("**Columns found in your file (after cleaning):**")
+                st.write("**Recognised columns found in your file (after cleaning):**")
                 st.write(df.columns.tolist())
                 
                 # Show a debug view with raw column names
                 with st.expander("🔍 Debug: Raw file preview"):
-                    uploaded_file.seek(0)
-                    st.text(uploaded_file.read().decode('utf-8')[:500])
+                    st.text(raw_csv_preview(uploaded_file, 500))
                 
             else:
-                st.success(f"✅ CSV loaded successfully! Found {len(df)} rows")
+                # Every row is validated up front, so a bad row fails the upload before any
+                # LLM call is made; later chunks are only validated and counted, never concatenated
+                failures = [validate_batch_frame(df)]
+                file_rows = len(df)
+                for chunk in reader:
+                    failures.append(validate_batch_frame(clean_batch_columns(chunk), row_offset=file_rows))
+                    file_rows += len(chunk)
+                failures = pd.concat(failures, ignore_index=True)
+                df = optimize_batch_dtypes(df)
+                
+                if len(failures):
+                    st.error(f"❌ {failures['row'].nunique()} of {file_rows} rows failed validation - fix them and upload the file again")
+                    st.dataframe(failures.head(BATCH_SCHEMA_FAILURES_SHOWN), use_container_width=True, hide_index=True)
+                    if len(failures) > BATCH_SCHEMA_FAILURES_SHOWN:
+                        st.caption(f"Showing the first {BATCH_SCHEMA_FAILURES_SHOWN} of {len(failures)} failures")
+                else:
+                    st.success(f"✅ CSV loaded successfully! Found {file_rows} rows")
+                st.caption(f"In-memory size (first {len(df)} rows): {df.memory_usage(deep=True).sum() / 1024:.1f} KB")
                 st.write("**Preview:**", df.head())
 
-                if st.button("Start Batch Job", type="primary"):
-                    results = []
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
+                use_batch_api = False
+                if os.getenv("AZURE_OPENAI_BATCH_DEPLOYMENT"):
+                    use_batch_api = st.radio(
+                        "Processing mode",
+                        BATCH_MODES,
+                        horizontal=True,
+                        help=f"Batch API mode sends classification and governance as two offline Azure OpenAI Batch jobs (for files with more than {BATCH_API_MIN_ROWS} distinct merchants)"
+                    ) == BATCH_MODES[1]
 
-                    # Limit for demo purposes to prevent long waits/high costs
-                    rows_to_process = df.head(5)
-                    total_rows = len(rows_to_process)
-
-                    st.warning(f"Processing first {total_rows} rows for demo speed...")
-                    
-                    # Create dynamic status placeholder for each transaction
-                    transaction_status = st.empty()
-
-                    for index, row in rows_to_process.iterrows():
-                        try:
-                            # Update overall progress
-                            status_text.text(f"📋 Processing Row {index + 1}/{total_rows}: {row['description'][:50]}...")
-                            
-                            # Process the transaction with dynamic status updates
-                            result = process_single_transaction(
-                                str(row['description']), 
-                                float(row.get('amount', 0)),
-                                merchant_name=str(row.get('merchant_name')) if 'merchant_name' in row and pd.notna(row.get('merchant_name')) else None,
-                                mcc_code=str(row.get('mcc_code')) if 'mcc_code' in row and pd.notna(row.get('mcc_code')) else None,
-                                status_placeholder=transaction_status
-                            )
-
-                            # Flatten result for CSV
-                            flattened = {
-                                'original_description': row['description'],
-                                'original_amount': row.get('amount', 0),
-                                'merchant_name': result.get('merchant_name'),
-                                'category': result.get('category'),
-                                'subcategory': result.get('subcategory'),
-                                'mcc_code': result.get('mcc_code'),
-                                'mcc_description': result.get('mcc_description'),
-                                'confidence': result.get('confidence'),
-                                'validation_status': result.get('validation_status'),
-                                'reasoning': result.get('reasoning'),
-                                'flags': ', '.join(result.get('flags', [])) if result.get('flags') else None
-                            }
-                            results.append(flattened)
-                            
-                        except Exception as e:
-                            st.error(f"Error processing row {index + 1}: {str(e)}")
-                            flattened = {
-                                'original_description': row.get('description', 'N/A'),
-                                'original_amount': row.get('amount', 0),
-                                'merchant_name': 'ERROR',
-                                'category': 'ERROR',
-                                'subcategory': 'ERROR',
-                                'mcc_code': 'ERROR',
-                                'mcc_description': 'ERROR',
-                                'confidence': 'ERROR',
-                                'validation_status': 'ERROR',
-                                'reasoning': f'Error: {str(e)}',
-                                'flags': 'Processing Error'
-                            }
-                            results.append(flattened)
-
-                        # Update Progress
-                        progress_bar.progress((index + 1) / total_rows)
-
-                    # Clear transaction status and show completion
-                    transaction_status.empty()
-                    status_text.text("✅ Job Complete!")
-                    final_df = pd.DataFrame(results)
-
-                    st.divider()
-                    st.subheader("Final Categorization Results")
-                    st.dataframe(final_df, use_container_width=True)
-
-                    # Download Button
-                    csv = final_df.to_csv(index=False).encode('utf-8')
-                    st.download_button(
-                        "📥 Download Results CSV",
-                        csv,
-                        "transaction_results.csv",
-                        "text/csv",
-                        type="primary"
-                    )
+                job = st.session_state.get("batch_job")
+                running = job is not None and not job["finished"]
+                if st.button("Start Batch Job", type="primary", disabled=running or len(failures) > 0):
+                    # First use builds the agents and batch client here on the script thread
+                    get_agents()
+                    get_batch_client()
+                    # Identical bytes under the same preference/category store versions give the
+                    # same classifications, so a finished job for them is shown again instead of re-run
+                    data = uploaded_file.getvalue()
+                    cache_key = (hashlib.blake2b(data, digest_size=16).hexdigest(), category_store_versions())
+                    cached_job = st.session_state.setdefault("csv_results", {}).get(cache_key)
+                    if cached_job is not None:
+                        cached_job["reused"] = True
+                        st.session_state.batch_job = cached_job
+                    else:
+                        st.session_state.batch_job = start_batch_job(data, file_rows, use_batch_api)
+                        st.session_state.batch_job["cache_key"] = cache_key
+                    st.rerun()  # Redraw with the button disabled and the job's progress showing
                     
         except Exception as e:
             st.error(f"❌ Error reading CSV file: {str(e)}")
@@ -1289,9 +2110,51 @@ with tab2:
             
             # Show raw file content for debugging
             with st.expander("🔍 Debug: View Raw File Content"):
-                uploaded_file.seek(0)
-                content = uploaded_file.read().decode('utf-8', errors='ignore')
-                st.text_area("Raw content:", content[:1000], height=200)
+                st.text_area("Raw content:", raw_csv_preview(uploaded_file, 1000), height=200)
+    
+    # The job outlives the upload widget - it keeps running (and its results stay) across reruns
+    job = st.session_state.get("batch_job")
+    if job is not None and not job["finished"]:
+        st.divider()
+        render_batch_job_progress(job)
+    elif job is not None:
+        csv_results = st.session_state.setdefault("csv_results", {})
+        if job.get("cache_key") and not job["error"] and not job["cancel"].is_set() and job["cache_key"] not in csv_results:
+            csv_results[job["cache_key"]] = job
+            while len(csv_results) > BATCH_RESULTS_CACHED_FILES:
+                del csv_results[next(iter(csv_results))]
+        if job.get("reused"):
+            st.info("♻️ Showing the results of an earlier run on this exact file - nothing was re-classified")
+        
+        for error_message in job["progress"]["errors"]:
+            st.error(error_message)
+        if job["error"]:
+            st.error(f"❌ Batch job failed: {job['error']}")
+        
+        # Show completion
+        if job["cache_stats"] is not None:
+            st.session_state.classification_cache_stats = job["cache_stats"]
+        done = len(job["results"]["original_description"])
+        if job["cancel"].is_set():
+            st.warning(f"🛑 Job cancelled after {done}/{job['total_rows']} transactions - partial results below")
+        elif job["cache_stats"] is not None:
+            cache_stats = job["cache_stats"]
+            st.success(f"✅ Job Complete! Cache hit rate: {cache_stats['hit_rate']:.0%} ({cache_stats['hits']} exact, {cache_stats['near_hits']} approximate hits)")
+        if job.get("final_df") is None:
+            job["final_df"] = batch_results_frame(job["results"])
+        
+        st.divider()
+        st.subheader("Final Categorization Results")
+        st.dataframe(job["final_df"], use_container_width=True)
+        
+        # Download Button
+        st.download_button(
+            "📥 Download Results CSV",
+            job["csv"].getvalue(),
+            "transaction_results.csv",
+            "text/csv",
+            type="primary"
+        )
 
 # --- TAB 3: Settings (Custom Categories & Preferences) ---
 with tab3:
@@ -1359,15 +2222,15 @@ with tab3:
         st.markdown(f"**Total Preferences Stored:** {len(all_preferences)}")
         
         with st.expander("📋 View All Preferences"):
-            for idx, pref in enumerate(all_preferences):
-                st.markdown(f"""
-                **Preference {idx + 1}:**
-                - Merchant: `{pref.get('merchant_name', 'N/A')}`
-                - User Category: `{pref.get('user_category', 'N/A')}` / `{pref.get('user_subcategory', 'N/A')}`
-                - Original: `{pref.get('original_category', 'N/A')}` / `{pref.get('original_subcategory', 'N/A')}`
-                - Usage Count: {pref.get('usage_count', 0)}
-                - Created: {pref.get('created_at', 'N/A')[:10]}
-                """)
+            # One table instead of a markdown block per preference, built only on request
+            if st.toggle("Show preferences table", key="show_preferences"):
+                preferences_df = pd.DataFrame(all_preferences).reindex(columns=list(PREFERENCE_TABLE_COLUMNS))
+                preferences_df["created_at"] = preferences_df["created_at"].astype("string").str[:10]
+                preferences_df.index += 1
+                st.dataframe(
+                    preferences_df.rename(columns=PREFERENCE_TABLE_COLUMNS),
+                    use_container_width=True
+                )
         
         if st.button("🗑️ Clear All Preferences", type="secondary"):
             preferences_store.clear_preferences()
@@ -1380,6 +2243,26 @@ with tab3:
 with tab4:
     st.subheader("🤖 Agno Framework - Transaction Classification System")
     
+    # Live counters of the process-wide classification cache (exact CMID key in memory, then on disk, then approximate merchant match)
+    with st.expander("📈 Classification cache statistics"):
+        cache_stats = get_classification_cache().stats()
+        stat_cols = st.columns(6)
+        stat_cols[0].metric("Exact hits", cache_stats["hits"])
+        stat_cols[1].metric("From disk", cache_stats["disk_hits"])
+        stat_cols[2].metric("Approximate hits", cache_stats["near_hits"])
+        stat_cols[3].metric("Misses", cache_stats["misses"])
+        stat_cols[4].metric("Hit rate", f"{cache_stats['hit_rate']:.0%}")
+        stat_cols[5].metric("Entries in memory", cache_stats["size"])
+    
+    with st.expander("⚡ Azure OpenAI prompt cache statistics"):
+        prompt_stats = get_prompt_cache_stats().stats()
+        prompt_cols = st.columns(4)
+        prompt_cols[0].metric("Agent runs", prompt_stats["runs"])
+        prompt_cols[1].metric("Prompt tokens", f"{prompt_stats['input_tokens']:,}")
+        prompt_cols[2].metric("Cached prompt tokens", f"{prompt_stats['cached_tokens']:,}")
+        prompt_cols[3].metric("Cached share", f"{prompt_stats['cached_rate']:.0%}")
+        st.caption("Every agent sends its static instructions, taxonomy and tool schemas first, so Azure OpenAI serves that prefix from its prompt cache after the first run.")
+    
     st.markdown("""
     This system uses **Agno Framework v2.2.13** - a production-ready agentic AI framework 
     that powers autonomous agents with specialized roles and tools. Each agent operates 
@@ -1443,14 +2326,16 @@ with tab4:
         3. MCC Categorization
         4. GenAI LLM (Default)
         
-        **Agno Tools (7):**
-        1. `lookup_user_preference()` - RAG user preference lookup
-        2. `get_custom_categories()` - Custom categories check
-        3. `match_to_custom_category()` - Custom category matching
-        4. `classify_by_mcc_code()` - 200+ MCC codes
-        5. `lookup_mcc_by_vendor()` - 100+ brands
-        6. `vendor_database_search()` - 20 patterns
-        7. `get_taxonomy_structure()` - 12 categories
+        **Agno Tools (5):**
+        1. `get_custom_categories()` - Custom categories check
+        2. `match_to_custom_category()` - Custom category matching
+        3. `classify_by_mcc_code()` - 200+ MCC codes
+        4. `lookup_mcc_by_vendor()` - 100+ brands
+        5. `vendor_database_search()` - 20 patterns
+        
+        User preferences (`lookup_user_preference()`) are looked up before the LLM runs.
+        
+        The 12 default categories are embedded in the system prompt.
         
         **RAG Features:**
         - User preference learning
@@ -1648,13 +2533,11 @@ result = preprocessor.execute(
         ClassificationAgent(
             llm=AzureOpenAI(...),
             tools=[
-                lookup_user_preference,      # RAG tool
                 get_custom_categories,      # Custom categories
                 match_to_custom_category,    # Custom category matching
                 classify_by_mcc_code,       # MCC classification
                 lookup_mcc_by_vendor,       # Vendor lookup
-                vendor_database_search,     # Vendor database
-                get_taxonomy_structure      # Default taxonomy
+                vendor_database_search      # Vendor database
             ]
         )
         ```
@@ -1701,7 +2584,7 @@ result = preprocessor.execute(
           1. `classify_by_mcc_code` (if MCC provided)
           2. `lookup_mcc_by_vendor` (for known brands)
           3. `vendor_database_search` (for merchant patterns)
-          4. `get_taxonomy_structure` (for taxonomy reasoning)
+          4. Default taxonomy in the system prompt (for taxonomy reasoning)
         - Confidence: MEDIUM/LOW
         
         **Response Structure:**
@@ -1751,7 +2634,7 @@ result = preprocessor.execute(
         1. `classify_by_mcc_code(mcc_code)` - 200+ MCC codes (ISO 18245)
         2. `lookup_mcc_by_vendor(merchant_name)` - 100+ known brands
         3. `vendor_database_search(query)` - 20 merchant patterns
-        4. `get_taxonomy_structure()` - 12 default categories
+        4. 12 default categories embedded in the system prompt
         
         **Error Handling:**
         - If RAG search fails: Continues to next step
@@ -1999,7 +2882,7 @@ result = feedback.execute(
         │  4. GenAI LLM (Default)                 │
         │     - lookup_mcc_by_vendor()            │
         │     - vendor_database_search()          │
-        │     - get_taxonomy_structure()          │
+        │     - default taxonomy (system prompt)  │
         │     - MEDIUM/LOW confidence             │
         │                                         │
         │  Output: Category + Method + Confidence │
@@ -8,12 +8,14 @@ class TransactionOrchestrator:
     1. PreprocessingAgent: Extract and clean transaction data
     2. ClassificationAgent: Categorize the transaction
     3. GovernanceAgent: Validate and audit the classification
+    Steps 2 and 3 run as a single FusedAgent call unless strict_two_stage is set.
     """
     
     def __init__(self,
                  preprocessing_agent,
                  classification_agent,
-                 governance_agent):
+                 governance_agent,
+                 strict_two_stage: bool = False):
         """
         Initialize the orchestrator with Agno agents
         
@@ -21,10 +23,16 @@ class TransactionOrchestrator:
             preprocessing_agent: PreprocessingAgent instance
             classification_agent: ClassificationAgent instance
             governance_agent: GovernanceAgent instance
+            strict_two_stage: Run classification and governance as two separate agent
+                              calls instead of one fused call
         """
         self.preprocessing_agent = preprocessing_agent
         self.classification_agent = classification_agent
         self.governance_agent = governance_agent
+        self.fused_agent = None
+        if not strict_two_stage:
+            from agents.fused_agent import FusedAgent
+            self.fused_agent = FusedAgent(classification_agent, governance_agent)
         self.workflow_log = []
     
     def process_transaction(self,
@@ -56,31 +64,44 @@ class TransactionOrchestrator:
             )
             self._log_step("PreprocessingAgent", f"Completed - Merchant: {preprocessing_result['merchant_name']}")
             
-            # Step 2: Classification
-            self._log_step("ClassificationAgent", "Starting classification...")
-            classification_result = self.classification_agent.execute(
-                merchant_name=preprocessing_result['merchant_name'],
-                description=preprocessing_result['cleaned_description'],
-                amount=amount,
-                mcc_code=mcc_code,
-                metadata=preprocessing_result.get('metadata')
-            )
-            self._log_step("ClassificationAgent", f"Completed - Category: {classification_result['category']}")
-            
-            # Step 3: Governance & Validation
-            self._log_step("GovernanceAgent", "Starting governance and validation...")
-            governance_result = self.governance_agent.execute(
-                merchant_name=preprocessing_result['merchant_name'],
-                description=preprocessing_result['cleaned_description'],
-                amount=amount,
-                category=classification_result['category'],
-                confidence=classification_result['confidence'],
-                reasoning=classification_result['reasoning'],
-                subcategory=classification_result.get('subcategory'),
-                mcc_code=mcc_code,
-                metadata=preprocessing_result.get('metadata')
-            )
-            self._log_step("GovernanceAgent", f"Completed - Status: {governance_result['validation_status']}")
+            if self.fused_agent is not None:
+                # Steps 2-3: Classification, Governance & Validation in one agent run
+                self._log_step("FusedAgent", "Starting classification and validation...")
+                classification_result, governance_result = self.fused_agent.execute(
+                    merchant_name=preprocessing_result['merchant_name'],
+                    description=preprocessing_result['cleaned_description'],
+                    amount=amount,
+                    mcc_code=mcc_code,
+                    metadata=preprocessing_result.get('metadata')
+                )
+                self._log_step("FusedAgent", f"Completed - Category: {classification_result['category']}, Status: {governance_result['validation_status']}")
+            else:
+                # Step 2: Classification
+                self._log_step("ClassificationAgent", "Starting classification...")
+                classification_result = self.classification_agent.execute(
+                    merchant_name=preprocessing_result['merchant_name'],
+                    description=preprocessing_result['cleaned_description'],
+                    amount=amount,
+                    mcc_code=mcc_code,
+                    metadata=preprocessing_result.get('metadata')
+                )
+                self._log_step("ClassificationAgent", f"Completed - Category: {classification_result['category']}")
+                
+                # Step 3: Governance & Validation
+                self._log_step("GovernanceAgent", "Starting governance and validation...")
+                governance_result = self.governance_agent.execute(
+                    merchant_name=preprocessing_result['merchant_name'],
+                    description=preprocessing_result['cleaned_description'],
+                    amount=amount,
+                    category=classification_result['category'],
+                    confidence=classification_result['confidence'],
+                    reasoning=classification_result['reasoning'],
+                    subcategory=classification_result.get('subcategory'),
+                    mcc_code=mcc_code,
+                    metadata=preprocessing_result.get('metadata'),
+                    rule_based=classification_result.get('rule_based', False)
+                )
+                self._log_step("GovernanceAgent", f"Completed - Status: {governance_result['validation_status']}")
             
             # Compile final result with workflow information
             final_result = {
@@ -1,10 +1,11 @@
 """Agno Tools for Transaction Classification"""
 from .vendor_database import vendor_database_search
 from .taxonomy import get_valid_categories
-from .mcc_codes import get_mcc_code
+from .mcc_codes import get_mcc_code, get_mcc_codes_for_category
 
 __all__ = [
     'vendor_database_search',
     'get_valid_categories',
-    'get_mcc_code'
+    'get_mcc_code',
+    'get_mcc_codes_for_category'
 ]
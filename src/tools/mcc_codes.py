@@ -1,5 +1,6 @@
 """MCC Codes Tool - Comprehensive Merchant Category Codes Database"""
-from typing import Dict, Optional
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 from agno.tools import tool
 
 
@@ -94,7 +95,6 @@ MCC_CODES = {
     "5733": {"description": "Music Stores", "category": "Entertainment", "subcategory": "Music"},
     "5734": {"description": "Computer Software Stores", "category": "Shopping", "subcategory": "Electronics"},
     "5735": {"description": "Record Shops", "category": "Entertainment", "subcategory": "Music"},
-    "5811": {"description": "Caterers", "category": "Food & Dining", "subcategory": "Restaurant"},
     
     # SHOPPING & RETAIL (5300-5399, 5900-5999)
     "5309": {"description": "Duty Free Stores", "category": "Shopping", "subcategory": "Retail"},
@@ -103,7 +103,6 @@ MCC_CODES = {
     "5331": {"description": "Variety Stores", "category": "Shopping", "subcategory": "Retail"},
     "5399": {"description": "Miscellaneous General Merchandise", "category": "Shopping", "subcategory": "Retail"},
     "5912": {"description": "Drug Stores, Pharmacies", "category": "Healthcare", "subcategory": "Pharmacy"},
-    "5921": {"description": "Package Stores - Beer, Wine, Liquor", "category": "Food & Dining", "subcategory": "Grocery"},
     "5931": {"description": "Used Merchandise Stores", "category": "Shopping", "subcategory": "Retail"},
     "5932": {"description": "Antique Shops", "category": "Shopping", "subcategory": "Retail"},
     "5933": {"description": "Pawn Shops", "category": "Shopping", "subcategory": "Retail"},
@@ -248,15 +247,71 @@ MCC_CODES = {
     "6300": {"description": "Insurance - Underwriting, Premiums", "category": "Financial Services", "subcategory": "Insurance"},
     "6381": {"description": "Insurance Premiums", "category": "Financial Services", "subcategory": "Insurance"},
     "6399": {"description": "Insurance Services", "category": "Financial Services", "subcategory": "Insurance"},
-    "6513": {"description": "Real Estate Agents, Rentals", "category": "Financial Services", "subcategory": "Bank Fee"},
-    
-    # PROFESSIONAL SERVICES (7000-7999)
-    "7311": {"description": "Advertising Services", "category": "Financial Services", "subcategory": "Bank Fee"},
-    "7333": {"description": "Commercial Photography", "category": "Entertainment", "subcategory": "Events"},
-    "7372": {"description": "Computer Programming", "category": "Financial Services", "subcategory": "Bank Fee"},
-    "7512": {"description": "Car Rental Agencies", "category": "Travel", "subcategory": "Car Rental"}
+    "6513": {"description": "Real Estate Agents, Rentals", "category": "Financial Services", "subcategory": "Bank Fee"}
 }
 
+
+def _expand_mcc_ranges(codes: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, str]]:
+    """
+    Replace range keys such as "3000-3299" with one key per code in the range, in place of
+    the range (so MCC_CODES order is kept). Expanded codes share the range's info dict, and
+    codes listed on their own keep their own entry. Done once at import, so every lookup
+    is a plain dict hit.
+    """
+    explicit = {code for code in codes if "-" not in code}
+    expanded: Dict[str, Dict[str, str]] = {}
+    for code, info in codes.items():
+        if "-" not in code:
+            expanded[code] = info
+            continue
+        low, high = map(int, code.split("-"))
+        for number in range(low, high + 1):
+            key = f"{number:04d}"
+            if key not in explicit:
+                expanded.setdefault(key, info)
+    return expanded
+
+
+MCC_CODES = _expand_mcc_ranges(MCC_CODES)
+
+
+def _build_mcc_category_index() -> Dict[str, frozenset]:
+    """Invert MCC_CODES into category -> subcategories (built once at import)"""
+    index: Dict[str, set] = {}
+    for info in MCC_CODES.values():
+        cat = info.get("category")
+        if cat:
+            subcats = index.setdefault(cat, set())
+            if info.get("subcategory"):
+                subcats.add(info["subcategory"])
+    return {cat: frozenset(subcats) for cat, subcats in index.items()}
+
+
+MCC_CATEGORY_INDEX: Dict[str, frozenset] = _build_mcc_category_index()
+
+
+def _build_mcc_reverse_index() -> Tuple[Dict[str, Tuple[str, ...]], Dict[Tuple[str, str], Tuple[str, ...]]]:
+    """
+    Invert MCC_CODES into category -> codes and (category, subcategory) -> codes,
+    each in MCC_CODES order (built once at import), so reverse lookups match the original scans
+    """
+    by_category: Dict[str, list] = {}
+    by_subcategory: Dict[Tuple[str, str], list] = {}
+    for code, info in MCC_CODES.items():
+        by_category.setdefault(info["category"], []).append(code)
+        if info.get("subcategory"):
+            by_subcategory.setdefault((info["category"], info["subcategory"]), []).append(code)
+    return (
+        {category: tuple(codes) for category, codes in by_category.items()},
+        {key: tuple(codes) for key, codes in by_subcategory.items()}
+    )
+
+
+_MCC_CODES_BY_CATEGORY, _MCC_CODES_BY_SUBCATEGORY = _build_mcc_reverse_index()
+# First code per category / subcategory - the code reverse lookups assign
+_MCC_BY_CATEGORY = {category: codes[0] for category, codes in _MCC_CODES_BY_CATEGORY.items()}
+_MCC_BY_SUBCATEGORY = {key: codes[0] for key, codes in _MCC_CODES_BY_SUBCATEGORY.items()}
+
 # ============================================================================
 # VENDOR-TO-MCC MAPPING - Major Brand Merchants
 # ============================================================================
@@ -389,8 +444,15 @@ def classify_by_mcc_code(mcc_code: str) -> Dict[str, any]:
     Returns:
         Dict with category, subcategory, description, and confidence level
     """
+    # Copy so callers can't mutate the memoized result
+    return dict(_classify_mcc(str(mcc_code)))
+
+
+@lru_cache(maxsize=1024)
+def _classify_mcc(mcc_code: str) -> Dict[str, any]:
+    """Memoized body of classify_by_mcc_code - the same few codes repeat across a batch"""
     # Normalize MCC code (remove any spaces/dashes)
-    mcc_code = str(mcc_code).strip().replace("-", "").replace(" ", "")
+    mcc_code = mcc_code.strip().replace("-", "").replace(" ", "")
     
     code_info = MCC_CODES.get(mcc_code)
     
@@ -428,21 +490,23 @@ def get_mcc_code(category: str, subcategory: Optional[str] = None) -> Dict[str,
         Dict with MCC code and description
     """
     # Try to find best match based on category and subcategory
-    for code, info in MCC_CODES.items():
-        if info["category"] == category:
-            if subcategory and info.get("subcategory") == subcategory:
-                return {
-                    "mcc_code": code,
-                    "mcc_description": info["description"],
-                    "category": category,
-                    "subcategory": subcategory
-                }
-            elif not subcategory:
-                return {
-                    "mcc_code": code,
-                    "mcc_description": info["description"],
-                    "category": category
-                }
+    if subcategory:
+        code = _MCC_BY_SUBCATEGORY.get((category, subcategory))
+        if code:
+            return {
+                "mcc_code": code,
+                "mcc_description": MCC_CODES[code]["description"],
+                "category": category,
+                "subcategory": subcategory
+            }
+    else:
+        code = _MCC_BY_CATEGORY.get(category)
+        if code:
+            return {
+                "mcc_code": code,
+                "mcc_description": MCC_CODES[code]["description"],
+                "category": category
+            }
     
     # Default to miscellaneous
     return {
@@ -462,6 +526,22 @@ def get_all_mcc_codes() -> Dict[str, Dict[str, str]]:
     return MCC_CODES
 
 
+def get_mcc_codes_for_category(category: str, subcategory: Optional[str] = None) -> Tuple[str, ...]:
+    """
+    Get every MCC code of a category (reverse lookup over the index built at import)
+    
+    Args:
+        category: Transaction category
+        subcategory: Optional subcategory to narrow the codes to
+        
+    Returns:
+        Tuple of MCC codes in MCC_CODES order (empty if none match)
+    """
+    if subcategory:
+        return _MCC_CODES_BY_SUBCATEGORY.get((category, subcategory), ())
+    return _MCC_CODES_BY_CATEGORY.get(category, ())
+
+
 def get_mcc_description(mcc_code: str) -> Optional[str]:
     """
     Get description for a specific MCC code
@@ -491,31 +571,30 @@ def assign_mcc_code_for_category(category: str, subcategory: str = None) -> Dict
     Returns:
         Dict with assigned MCC code and description
     """
-    # Try to find best match based on category and subcategory
-    for code, info in MCC_CODES.items():
-        if info["category"] == category:
-            # Exact subcategory match preferred
-            if subcategory and info.get("subcategory") == subcategory:
-                return {
-                    "mcc_code": code,
-                    "mcc_description": info["description"],
-                    "category": category,
-                    "subcategory": subcategory,
-                    "match_quality": "exact",
-                    "message": f"Assigned MCC {code} based on exact category and subcategory match"
-                }
+    # Exact subcategory match preferred
+    code = _MCC_BY_SUBCATEGORY.get((category, subcategory)) if subcategory else None
+    if code:
+        return {
+            "mcc_code": code,
+            "mcc_description": MCC_CODES[code]["description"],
+            "category": category,
+            "subcategory": subcategory,
+            "match_quality": "exact",
+            "message": f"Assigned MCC {code} based on exact category and subcategory match"
+        }
     
     # Fallback: find any match for category
-    for code, info in MCC_CODES.items():
-        if info["category"] == category:
-            return {
-                "mcc_code": code,
-                "mcc_description": info["description"],
-                "category": category,
-                "subcategory": subcategory or info.get("subcategory"),
-                "match_quality": "category_match",
-                "message": f"Assigned MCC {code} based on category match. Subcategory may not be exact."
-            }
+    code = _MCC_BY_CATEGORY.get(category)
+    if code:
+        info = MCC_CODES[code]
+        return {
+            "mcc_code": code,
+            "mcc_description": info["description"],
+            "category": category,
+            "subcategory": subcategory or info.get("subcategory"),
+            "match_quality": "category_match",
+            "message": f"Assigned MCC {code} based on category match. Subcategory may not be exact."
+        }
     
     # Default to miscellaneous if no match
     return {
@@ -544,39 +623,23 @@ def lookup_mcc_by_vendor(merchant_name: str) -> Dict[str, any]:
     """
     # Normalize merchant name for lookup
     merchant_upper = merchant_name.upper().strip()
+    vendor, exact = _match_vendor(merchant_upper)
     
-    # Check exact match first
-    if merchant_upper in VENDOR_MCC_MAP:
-        mcc_code = VENDOR_MCC_MAP[merchant_upper]
+    if vendor is not None:
+        mcc_code = VENDOR_MCC_MAP[vendor]
         mcc_info = MCC_CODES.get(mcc_code, {})
         
         return {
-            "vendor": merchant_upper,
+            "vendor": vendor,
             "mcc_code": mcc_code,
             "mcc_description": mcc_info.get("description", "Unknown"),
             "category": mcc_info.get("category", "Other"),
             "subcategory": mcc_info.get("subcategory", "General"),
             "match": True,
-            "confidence": "HIGH",
-            "message": f"Found exact vendor match for {merchant_upper}. MCC: {mcc_code}"
+            "confidence": "HIGH" if exact else "MEDIUM",
+            "message": f"Found exact vendor match for {vendor}. MCC: {mcc_code}" if exact else f"Found partial vendor match: {vendor}. MCC: {mcc_code}"
         }
     
-    # Try partial match
-    for vendor, mcc_code in VENDOR_MCC_MAP.items():
-        if vendor in merchant_upper or merchant_upper in vendor:
-            mcc_info = MCC_CODES.get(mcc_code, {})
-            
-            return {
-                "vendor": vendor,
-                "mcc_code": mcc_code,
-                "mcc_description": mcc_info.get("description", "Unknown"),
-                "category": mcc_info.get("category", "Other"),
-                "subcategory": mcc_info.get("subcategory", "General"),
-                "match": True,
-                "confidence": "MEDIUM",
-                "message": f"Found partial vendor match: {vendor}. MCC: {mcc_code}"
-            }
-    
     return {
         "vendor": merchant_name,
         "mcc_code": None,
@@ -586,6 +649,24 @@ def lookup_mcc_by_vendor(merchant_name: str) -> Dict[str, any]:
     }
 
 
+@lru_cache(maxsize=1024)
+def _match_vendor(merchant_upper: str) -> Tuple[Optional[str], bool]:
+    """
+    Find the vendor for a normalized merchant name - (vendor, exact match) or (None, False).
+    Memoized so repeated merchants skip the substring scan over VENDOR_MCC_MAP.
+    """
+    # Check exact match first
+    if merchant_upper in VENDOR_MCC_MAP:
+        return merchant_upper, True
+    
+    # Try partial match
+    for vendor in VENDOR_MCC_MAP:
+        if vendor in merchant_upper or merchant_upper in vendor:
+            return vendor, False
+    
+    return None, False
+
+
 def get_mcc_statistics() -> Dict[str, any]:
     """
     Get statistics about the MCC code database
@@ -593,10 +674,7 @@ def get_mcc_statistics() -> Dict[str, any]:
     Returns:
         Dict with database statistics
     """
-    categories = {}
-    for info in MCC_CODES.values():
-        cat = info.get("category", "Unknown")
-        categories[cat] = categories.get(cat, 0) + 1
+    categories = {category: len(codes) for category, codes in _MCC_CODES_BY_CATEGORY.items()}
     
     return {
         "total_mcc_codes": len(MCC_CODES),
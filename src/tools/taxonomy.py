@@ -1,4 +1,5 @@
 """Taxonomy Tool - Provides valid transaction categories"""
+from types import MappingProxyType
 from typing import List, Dict
 from agno.tools import tool
 
@@ -83,6 +84,11 @@ TRANSACTION_CATEGORIES = {
     ]
 }
 
+# Read-only view of the default taxonomy with subcategories as frozensets
+DEFAULT_TAXONOMY_FROZEN = MappingProxyType({
+    category: frozenset(subcategories) for category, subcategories in TRANSACTION_CATEGORIES.items()
+})
+
 
 @tool
 def get_taxonomy_structure() -> Dict[str, List[str]]:
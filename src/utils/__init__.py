@@ -1,9 +1,12 @@
 """Utility functions for Transaction Classification"""
-from .parsers import parse_agent_response, extract_json_from_text
-from .validators import validate_transaction_data
+from .parsers import parse_agent_response, extract_json_from_text, json_loads, json_dumps
+from .validators import validate_transaction_data, validate_batch_frame
 
 __all__ = [
     'parse_agent_response',
     'extract_json_from_text',
-    'validate_transaction_data'
+    'json_loads',
+    'json_dumps',
+    'validate_transaction_data',
+    'validate_batch_frame'
 ]
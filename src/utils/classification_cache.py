@@ -0,0 +1,330 @@
+"""Classification Cache - Reuses classification + governance results for repeat merchants"""
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, Optional, Set, Tuple
+
+# Minimum trigram Jaccard similarity between merchant names for an approximate hit -
+# abbreviation/suffix variants score 0.7-1.0, different merchants sharing a brand word
+# ("UBER" / "UBER EATS", "SHELL" / "SHELL OIL") 0.5 or less
+NEAR_MATCH_THRESHOLD = 0.65
+
+
+def amount_bucket(amount: float) -> int:
+    """
+    Bucket an amount on a log2 scale so nearby amounts share a cache key.
+    
+    Args:
+        amount: Transaction amount
+    
+    Returns:
+        Bucket index (0 for amounts up to 1)
+    """
+    return int(math.log2(max(abs(amount or 0), 1)))
+
+
+def _as_key(value: Any) -> Hashable:
+    """Turn JSON arrays read back from the SQLite file into the tuples they were stored as"""
+    return tuple(_as_key(item) for item in value) if isinstance(value, list) else value
+
+
+def _trigrams(text: str) -> FrozenSet[str]:
+    """Character trigrams of a merchant name (uppercased, spaces removed so "AIR LINES" equals "AIRLINES", padded)"""
+    padded = f"  {''.join(text.upper().split())} "
+    return frozenset(padded[start:start + 3] for start in range(len(padded) - 2))
+
+
+class ClassificationCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL.
+    Keys are tuples such as (cmid, mcc_code, amount_bucket, preferences_fingerprint,
+    custom_categories_fingerprint), so any feedback write produces new keys.
+    
+    With a path, entries are also written to a SQLite file with a longer TTL, and memory
+    misses fall back to it - results survive restarts and are shared by every process
+    using the same file. Keys and values must be JSON-serializable to be persisted.
+    Near-match records are persisted with the entry, and the most recent persisted
+    entries that have one are loaded at start so get_near() finds them after a restart.
+    
+    Entries stored with a near-match group and text (e.g. the key without the CMID, and
+    the merchant name) can also be found approximately: get_near() returns the entry in
+    the same group whose text is most similar (trigram Jaccard), so merchant spellings
+    the canonicalizer does not know still hit:
+    
+    >>> cache = ClassificationCache()
+    >>> cache.put("amazon", "Shopping", near=("group", "AMAZON MKTPLACE"))
+    >>> cache.put("delta", "Travel", near=("group", "DELTA AIR LINES"))
+    >>> cache.put("walmart", "Groceries", near=("group", "WALMART SUPERCENTER"))
+    >>> cache.get_near("group", "AMAZON MKTPLACE PMTS"), cache.get_near("group", "DELTA AIRLINES"), cache.get_near("group", "WALMART SUPERCENTR")
+    ('Shopping', 'Travel', 'Groceries')
+    >>> cache.get_near("group", "AMAZON WEB SERVICES") is None
+    True
+    """
+    
+    def __init__(self, maxsize: int = 4096, ttl: float = 3600.0, path: Optional[str] = None,
+                 persistent_ttl: float = 30 * 86400.0):
+        """
+        Initialize the cache.
+        
+        Args:
+            maxsize: Maximum number of entries before the least recently used is evicted
+            ttl: Seconds an entry stays valid in memory
+            path: Optional SQLite file backing the cache across restarts
+            persistent_ttl: Seconds an entry stays valid in the SQLite file
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.persistent_ttl = persistent_ttl
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, expires REAL, value TEXT, near TEXT)")
+                try:
+                    # Files written before near-match records were persisted
+                    self._db.execute("ALTER TABLE entries ADD COLUMN near TEXT")
+                except sqlite3.OperationalError:
+                    pass
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Error opening classification cache file: {e}")
+                self._db = None
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # Near-match index: key -> (group, trigrams), and (group, trigram) -> keys
+        self._near_texts: Dict[Hashable, Tuple[Hashable, FrozenSet[str]]] = {}
+        self._near_index: Dict[Tuple[Hashable, str], Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._warm()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Look up a cached value.
+        
+        Args:
+            key: Cache key
+        
+        Returns:
+            The cached value, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                loaded = self._load(key)
+                if loaded is None:
+                    self.misses += 1
+                    return None
+                # Promote the persisted entry (and its near-match record) into memory
+                value, near = loaded
+                self._insert(key, value, near)
+                self.hits += 1
+                self.disk_hits += 1
+                return value
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def __contains__(self, key: Hashable) -> bool:
+        """Check for a live entry without touching the LRU order or the counters"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= time.monotonic():
+                return True
+            return self._load(key) is not None
+    
+    def get_near(self, group: Hashable, text: str, threshold: float = NEAR_MATCH_THRESHOLD) -> Optional[Any]:
+        """
+        Approximate lookup, meant to follow a missed get(): the live entry in `group` whose
+        text is most similar to `text`. A near hit turns that preceding miss into a near hit
+        in the counters.
+        
+        Args:
+            group: Near-match group the entry was stored under
+            text: Text to compare (e.g. the merchant name)
+            threshold: Minimum trigram Jaccard similarity
+        
+        Returns:
+            The most similar entry's value, or None if none reaches the threshold
+        """
+        with self._lock:
+            key = self._nearest(group, text, threshold)
+            if key is None:
+                return None
+            self._entries.move_to_end(key)
+            self.near_hits += 1
+            self.misses = max(self.misses - 1, 0)
+            return self._entries[key][1]
+    
+    def has_near(self, group: Hashable, text: str, threshold: float = NEAR_MATCH_THRESHOLD) -> bool:
+        """Check for a near match without touching the LRU order or the counters"""
+        with self._lock:
+            return self._nearest(group, text, threshold) is not None
+    
+    def put(self, key: Hashable, value: Any, near: Optional[Tuple[Hashable, str]] = None):
+        """
+        Store a value, evicting the least recently used entry when full.
+        
+        Args:
+            key: Cache key
+            value: Value to store
+            near: Optional (group, text) making the entry findable by get_near()
+        """
+        with self._lock:
+            self._insert(key, value, near)
+            self._store(key, value, near)
+    
+    def _insert(self, key: Hashable, value: Any, near: Optional[Tuple[Hashable, str]]):
+        """Add an entry to memory and the near-match index (caller holds the lock)"""
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        if near is not None:
+            group, text = near
+            grams = _trigrams(text)
+            self._near_texts[key] = (group, grams)
+            for gram in grams:
+                self._near_index.setdefault((group, gram), set()).add(key)
+        self._evict()
+    
+    def _warm(self):
+        """Load the most recent persisted entries that have a near-match record, up to maxsize"""
+        if self._db is None:
+            return
+        try:
+            rows = self._db.execute(
+                "SELECT key, value, near FROM entries WHERE near IS NOT NULL AND expires >= ? ORDER BY expires DESC LIMIT ?",
+                (time.time(), self.maxsize)
+            ).fetchall()
+        except sqlite3.Error:
+            return
+        with self._lock:
+            # Oldest first, so the most recent end up most recently used
+            for key_text, value_text, near_text in reversed(rows):
+                try:
+                    group, text = json.loads(near_text)
+                    self._insert(_as_key(json.loads(key_text)), json.loads(value_text), (_as_key(group), text))
+                except (TypeError, ValueError):
+                    continue
+    
+    def _evict(self):
+        """Drop least recently used entries beyond maxsize (caller holds the lock)"""
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+    
+    def _load(self, key: Hashable) -> Optional[Tuple[Any, Optional[Tuple[Hashable, str]]]]:
+        """Read a live entry and its near-match record from the SQLite file (caller holds the lock)"""
+        if self._db is None:
+            return None
+        try:
+            key_text = json.dumps(key)
+            row = self._db.execute("SELECT expires, value, near FROM entries WHERE key = ?", (key_text,)).fetchone()
+            if row is None:
+                return None
+            if row[0] < time.time():
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key_text,))
+                self._db.commit()
+                return None
+            near = None
+            if row[2] is not None:
+                group, text = json.loads(row[2])
+                near = (_as_key(group), text)
+            return json.loads(row[1]), near
+        except (sqlite3.Error, TypeError, ValueError):
+            return None
+    
+    def _store(self, key: Hashable, value: Any, near: Optional[Tuple[Hashable, str]] = None):
+        """Write an entry and its near-match record to the SQLite file, skipping values JSON cannot encode (caller holds the lock)"""
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, expires, value, near) VALUES (?, ?, ?, ?)",
+                (json.dumps(key), time.time() + self.persistent_ttl, json.dumps(value),
+                 json.dumps(list(near)) if near is not None else None)
+            )
+            self._db.commit()
+        except (sqlite3.Error, TypeError, ValueError):
+            pass
+    
+    def _nearest(self, group: Hashable, text: str, threshold: float) -> Optional[Hashable]:
+        """Key of the most similar live entry in the group (caller holds the lock)"""
+        grams = _trigrams(text)
+        shared: Dict[Hashable, int] = {}
+        for gram in grams:
+            for key in self._near_index.get((group, gram), ()):
+                shared[key] = shared.get(key, 0) + 1
+        now = time.monotonic()
+        best, best_score = None, threshold
+        for key, overlap in shared.items():
+            score = overlap / (len(grams) + len(self._near_texts[key][1]) - overlap)
+            if score >= best_score and self._entries[key][0] >= now:
+                best, best_score = key, score
+        return best
+    
+    def _remove(self, key: Hashable):
+        """Drop an entry and its near-match index records (caller holds the lock)"""
+        del self._entries[key]
+        near = self._near_texts.pop(key, None)
+        if near is not None:
+            group, grams = near
+            for gram in grams:
+                keys = self._near_index[(group, gram)]
+                keys.discard(key)
+                if not keys:
+                    del self._near_index[(group, gram)]
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and the current hit rate"""
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0
+            }
+    
+    def clear(self):
+        """Drop all entries (including persisted ones) and reset the counters"""
+        with self._lock:
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM entries")
+                    self._db.commit()
+                except sqlite3.Error:
+                    pass
+            self._entries.clear()
+            self._near_texts.clear()
+            self._near_index.clear()
+            self.hits = 0
+            self.near_hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+
+
+# Global instance
+_classification_cache: Optional[ClassificationCache] = None
+
+
+def get_classification_cache() -> ClassificationCache:
+    """
+    Get or create the global classification cache instance, persisted to
+    CLASSIFICATION_CACHE_PATH (default classification_cache.db; set it empty to keep the cache in memory only)
+    """
+    global _classification_cache
+    if _classification_cache is None:
+        _classification_cache = ClassificationCache(path=os.getenv("CLASSIFICATION_CACHE_PATH", "classification_cache.db"))
+    return _classification_cache
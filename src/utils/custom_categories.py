@@ -3,6 +3,7 @@ import json
 import os
 from typing import Dict, List, Optional, Any
 from datetime import datetime
+import hashlib
 
 
 class CustomCategoriesManager:
@@ -19,6 +20,8 @@ class CustomCategoriesManager:
         """
         self.storage_path = storage_path
         self.custom_categories: Dict[str, List[str]] = {}
+        self._version = 0  # Bumped on every add/remove
+        self._fingerprint_cache = (-1, "")
         self._load_categories()
     
     def _load_categories(self):
@@ -61,6 +64,7 @@ class CustomCategoriesManager:
             return False
         
         self.custom_categories[category] = subcategories
+        self._version += 1
         self._save_categories()
         return True
     
@@ -76,10 +80,26 @@ class CustomCategoriesManager:
         """
         if category in self.custom_categories:
             del self.custom_categories[category]
+            self._version += 1
             self._save_categories()
             return True
         return False
     
+    def version(self) -> int:
+        """Monotonic counter for cache invalidation - changes when categories are added or removed"""
+        return self._version
+    
+    def fingerprint(self) -> str:
+        """
+        Digest of the custom categories - stable across restarts (unlike version()),
+        so it can key persisted caches. Recomputed only when the version changes.
+        """
+        version, digest = self._fingerprint_cache
+        if version != self._version:
+            digest = hashlib.sha256(json.dumps(self.custom_categories, sort_keys=True).encode()).hexdigest()[:16]
+            self._fingerprint_cache = (self._version, digest)
+        return digest
+    
     def get_categories(self) -> Dict[str, List[str]]:
         """Get all custom categories"""
         return self.custom_categories.copy()
@@ -3,6 +3,47 @@ import json
 import re
 from typing import Dict, Any, Optional
 
+try:
+    import orjson
+except ImportError:  # orjson is optional - fall back to the standard library
+    orjson = None
+
+
+def json_loads(data: Any) -> Any:
+    """
+    Decode JSON from str or bytes, using orjson when it is installed
+    
+    Args:
+        data: JSON text
+        
+    Returns:
+        Decoded Python object
+        
+    Raises:
+        ValueError: If data is not valid JSON (orjson and json errors both subclass it)
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj: Any) -> str:
+    """
+    Encode an object as compact JSON text, using orjson when it is installed
+    
+    Args:
+        obj: Object to encode
+        
+    Returns:
+        JSON string
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode()
+        except TypeError:
+            pass  # e.g. non-str keys or big ints - let the standard library try
+    return json.dumps(obj, separators=(",", ":"))
+
 
 def extract_json_from_text(text: str) -> Optional[Dict[str, Any]]:
     """
@@ -18,8 +59,8 @@ def extract_json_from_text(text: str) -> Optional[Dict[str, Any]]:
     json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', text)
     if json_match:
         try:
-            return json.loads(json_match.group())
-        except json.JSONDecodeError:
+            return json_loads(json_match.group())
+        except ValueError:
             pass
     return None
 
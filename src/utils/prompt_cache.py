@@ -0,0 +1,57 @@
+"""Prompt Cache Statistics - Tracks how much of each prompt Azure OpenAI served from its prompt cache"""
+import threading
+from typing import Any, Dict, Optional
+
+
+class PromptCacheStats:
+    """
+    Running totals of prompt tokens and cached prompt tokens over every agent run.
+    Azure OpenAI caches prompt prefixes of 1024+ tokens, so runs whose static system
+    context (tool schemas, instructions, taxonomy) is byte-identical report most of their
+    input as cached (usage.prompt_tokens_details.cached_tokens, Agno's cache_read_tokens).
+    """
+    
+    def __init__(self):
+        """Initialize empty counters"""
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.input_tokens = 0
+        self.cached_tokens = 0
+    
+    def record(self, metrics: Optional[Any]):
+        """
+        Add the token usage of one agent run (safe to call from any thread).
+        
+        Args:
+            metrics: Agno Metrics of the run (RunOutput.metrics / RunCompleted event metrics)
+        """
+        if metrics is None:
+            return
+        input_tokens = getattr(metrics, 'input_tokens', 0) or 0
+        cached_tokens = getattr(metrics, 'cache_read_tokens', 0) or 0
+        with self._lock:
+            self.runs += 1
+            self.input_tokens += input_tokens
+            self.cached_tokens += cached_tokens
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get the counters and the share of prompt tokens served from the cache"""
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "input_tokens": self.input_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cached_rate": self.cached_tokens / self.input_tokens if self.input_tokens else 0.0
+            }
+
+
+# Global instance
+_prompt_cache_stats: Optional[PromptCacheStats] = None
+
+
+def get_prompt_cache_stats() -> PromptCacheStats:
+    """Get or create the global prompt cache statistics"""
+    global _prompt_cache_stats
+    if _prompt_cache_stats is None:
+        _prompt_cache_stats = PromptCacheStats()
+    return _prompt_cache_stats
@@ -0,0 +1,99 @@
+"""Request Rate Limiter - Keeps Azure OpenAI traffic under the deployment's requests-per-minute quota"""
+import asyncio
+import os
+import threading
+import time
+from typing import Optional
+
+
+class RequestRateLimiter:
+    """
+    Token bucket shared by every LLM request in the process.
+    Tokens refill continuously at the configured rate; the bucket holds ten seconds'
+    worth so a burst cannot trip Azure's short-window enforcement of the per-minute quota.
+    """
+    
+    def __init__(self, requests_per_minute: float = 0):
+        """
+        Initialize the limiter.
+        
+        Args:
+            requests_per_minute: Allowed request rate; 0 disables limiting
+        """
+        self._lock = threading.Lock()
+        self.requests_per_minute = 0.0
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self.set_rate(requests_per_minute)
+    
+    def set_rate(self, requests_per_minute: float):
+        """
+        Change the allowed rate (safe to call from any thread).
+        
+        Args:
+            requests_per_minute: Allowed request rate; 0 disables limiting
+        """
+        with self._lock:
+            if requests_per_minute != self.requests_per_minute:
+                self.requests_per_minute = max(float(requests_per_minute or 0), 0.0)
+                self._tokens = self._capacity()
+                self._updated = time.monotonic()
+    
+    def _capacity(self) -> float:
+        """Bucket size - ten seconds of requests, at least one"""
+        return max(self.requests_per_minute / 6, 1.0)
+    
+    def _take(self) -> float:
+        """
+        Take a token if one is available
+        
+        Returns:
+            0 once a request may be sent, otherwise the seconds to wait before retrying
+        """
+        with self._lock:
+            rate = self.requests_per_minute
+            if rate <= 0:
+                return 0.0
+            now = time.monotonic()
+            self._tokens = min(self._capacity(), self._tokens + (now - self._updated) * rate / 60)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) * 60 / rate
+    
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        while True:
+            wait = self._take()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+    
+    def acquire_sync(self):
+        """Blocking variant of acquire() for synchronous clients"""
+        while True:
+            wait = self._take()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+    
+    async def on_request(self, request):
+        """httpx request event hook - throttles every request sent through the client"""
+        await self.acquire()
+    
+    def on_request_sync(self, request):
+        """httpx.Client request event hook - same throttling for synchronous requests"""
+        self.acquire_sync()
+
+
+# Global instance
+_rate_limiter: Optional[RequestRateLimiter] = None
+
+
+def get_rate_limiter() -> RequestRateLimiter:
+    """Get or create the global rate limiter, starting from AZURE_OPENAI_RPM (0 = unlimited)"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RequestRateLimiter(float(os.getenv("AZURE_OPENAI_RPM", "0") or 0))
+    return _rate_limiter
@@ -1,10 +1,15 @@
 """User Preferences Storage with RAG - Stores and retrieves user classification preferences"""
 import json
 import os
-from typing import Dict, List, Optional, Any
+import threading
+from typing import Dict, List, Optional, Any, Set, Tuple
 from datetime import datetime
 import hashlib
 
+# Description overlap contributes at most this much to a similarity score, so below a
+# higher threshold only preferences whose merchant name matches can be returned
+_DESCRIPTION_WEIGHT = 0.3
+
 
 class UserPreferencesStore:
     """
@@ -21,6 +26,13 @@ class UserPreferencesStore:
         """
         self.storage_path = storage_path
         self.preferences: List[Dict[str, Any]] = []
+        self._version = 0  # Bumped on every write that changes stored categories
+        self._snapshot_cache: Tuple[int, List[Tuple[str, Optional[str]]]] = (-1, [])
+        self._fingerprint_cache: Tuple[int, str] = (-1, "")
+        # (version, merchant name -> preference indices, trigram -> merchant names)
+        self._index_cache: Tuple[int, Dict[str, List[int]], Dict[str, Set[str]]] = (-1, {}, {})
+        # Lookups run in worker threads (asyncio.to_thread), so file writes are serialized
+        self._save_lock = threading.Lock()
         self._load_preferences()
     
     def _load_preferences(self):
@@ -38,7 +50,7 @@ class UserPreferencesStore:
     def _save_preferences(self):
         """Save preferences to storage file"""
         try:
-            with open(self.storage_path, 'w') as f:
+            with self._save_lock, open(self.storage_path, 'w') as f:
                 json.dump(self.preferences, f, indent=2)
         except Exception as e:
             print(f"Error saving preferences: {e}")
@@ -74,7 +86,7 @@ class UserPreferencesStore:
         if merchant1_norm in merchant2_norm or merchant2_norm in merchant1_norm:
             merchant_match = 0.8
         
-        # Description similarity (weight: 0.3)
+        # Description similarity (weight: _DESCRIPTION_WEIGHT)
         desc_words1 = set(desc1_norm.split())
         desc_words2 = set(desc2_norm.split())
         if desc_words1 and desc_words2:
@@ -83,9 +95,67 @@ class UserPreferencesStore:
             desc_similarity = 0.0
         
         # Weighted similarity
-        similarity = (merchant_match * 0.7) + (desc_similarity * 0.3)
+        similarity = (merchant_match * 0.7) + (desc_similarity * _DESCRIPTION_WEIGHT)
         return similarity
     
+    def _merchant_index(self) -> Tuple[Dict[str, List[int]], Dict[str, Set[str]]]:
+        """
+        Index the stored preferences by merchant name, rebuilt only when the version changes.
+        
+        Returns:
+            Tuple of (normalized merchant name -> preference indices in store order,
+            merchant trigram -> normalized merchant names)
+        """
+        version, by_merchant, by_trigram = self._index_cache
+        if version != self._version:
+            by_merchant, by_trigram = {}, {}
+            for idx, pref in enumerate(self.preferences):
+                merchant = pref["merchant_name"].upper().strip()
+                by_merchant.setdefault(merchant, []).append(idx)
+            for merchant in by_merchant:
+                for start in range(len(merchant) - 2):
+                    by_trigram.setdefault(merchant[start:start + 3], set()).add(merchant)
+            self._index_cache = (self._version, by_merchant, by_trigram)
+        return by_merchant, by_trigram
+    
+    def _candidate_indices(self, merchant_name: str, similarity_threshold: float) -> Optional[List[int]]:
+        """
+        Preferences whose merchant name equals, contains or is contained in the query's -
+        the only ones that can reach a threshold above the description weight.
+        
+        Args:
+            merchant_name: Merchant name to search for
+            similarity_threshold: Minimum similarity score of the search
+            
+        Returns:
+            Candidate preference indices in store order, or None when every preference
+            has to be scored (low threshold or a merchant name under three characters)
+        """
+        merchant = merchant_name.upper().strip()
+        if similarity_threshold <= _DESCRIPTION_WEIGHT or len(merchant) < 3:
+            return None
+        by_merchant, by_trigram = self._merchant_index()
+        
+        # Stored names contained in the query: look up each of its substrings
+        matches = {
+            merchant[start:end]
+            for start in range(len(merchant))
+            for end in range(start + 1, len(merchant) + 1)
+        }
+        matches = {name for name in matches if name in by_merchant}
+        if "" in by_merchant:
+            matches.add("")
+        
+        # Stored names containing the query: they share all of its trigrams
+        trigram_sets = sorted(
+            (by_trigram.get(merchant[start:start + 3], set()) for start in range(len(merchant) - 2)),
+            key=len
+        )
+        if trigram_sets[0]:
+            matches.update(name for name in set.intersection(*trigram_sets) if merchant in name)
+        
+        return sorted(idx for name in matches for idx in by_merchant[name])
+    
     def add_preference(
         self,
         merchant_name: str,
@@ -139,6 +209,7 @@ class UserPreferencesStore:
             # Add new preference
             self.preferences.append(preference)
         
+        self._version += 1
         self._save_preferences()
         return preference
     
@@ -165,7 +236,11 @@ class UserPreferencesStore:
         best_match = None
         best_score = 0.0
         
-        for preference in self.preferences:
+        # Only merchant-name matches are scored when the threshold allows it
+        candidates = self._candidate_indices(merchant_name, similarity_threshold)
+        preferences = self.preferences if candidates is None else [self.preferences[idx] for idx in candidates]
+        
+        for preference in preferences:
             similarity = self._calculate_similarity(
                 merchant_name,
                 description,
@@ -190,6 +265,47 @@ class UserPreferencesStore:
         
         return None
     
+    def version(self) -> int:
+        """Monotonic counter for cache invalidation - changes when preferences are added or cleared"""
+        return self._version
+    
+    def fingerprint(self) -> str:
+        """
+        Digest of the stored corrections (merchant, description, category, subcategory).
+        Unlike version() it is stable across restarts, so it can key persisted caches;
+        usage counters are left out. Recomputed only when the version changes.
+        """
+        version, digest = self._fingerprint_cache
+        if version != self._version:
+            rows = sorted(
+                (pref.get("merchant_name") or "", pref.get("description") or "",
+                 pref.get("user_category") or "", pref.get("user_subcategory") or "")
+                for pref in self.preferences
+            )
+            digest = hashlib.sha256(json.dumps(rows).encode()).hexdigest()[:16]
+            self._fingerprint_cache = (self._version, digest)
+        return digest
+    
+    def get_preference_category_pairs(self) -> List[Tuple[str, Optional[str]]]:
+        """
+        Get the (category, subcategory) pair of every stored preference.
+        
+        The list is rebuilt only when the store version changes, so repeated
+        reads between writes cost nothing.
+        
+        Returns:
+            List of (user_category, user_subcategory) tuples
+        """
+        version, pairs = self._snapshot_cache
+        if version != self._version:
+            pairs = [
+                (pref.get("user_category"), pref.get("user_subcategory"))
+                for pref in self.preferences
+                if pref.get("user_category")
+            ]
+            self._snapshot_cache = (self._version, pairs)
+        return pairs
+    
     def get_all_preferences(self) -> List[Dict[str, Any]]:
         """Get all stored preferences"""
         return self.preferences
@@ -197,6 +313,7 @@ class UserPreferencesStore:
     def clear_preferences(self):
         """Clear all preferences"""
         self.preferences = []
+        self._version += 1
         self._save_preferences()
 
 
@@ -1,5 +1,6 @@
 """Validation utilities for transaction data"""
 from typing import Dict, Any, List, Optional
+import pandas as pd
 
 
 def validate_transaction_data(data: Dict[str, Any]) -> tuple[bool, Optional[List[str]]]:
@@ -75,3 +76,33 @@ def sanitize_amount(amount: Any) -> float:
         return float(amount)
     except (ValueError, TypeError):
         return 0.0
+
+
+def validate_batch_frame(df: pd.DataFrame, row_offset: int = 0) -> pd.DataFrame:
+    """
+    Check a batch CSV chunk against the upload schema in one vectorized pass:
+    description must be present and non-blank, amount present and numeric.
+    merchant_name and mcc_code are optional and may be empty.
+    
+    Args:
+        df: Chunk with cleaned (lowercase) column names, including description and amount
+        row_offset: File position of the chunk's first row, for the reported row numbers
+        
+    Returns:
+        DataFrame of failure cases (row, column, value, check), empty when every row is valid
+    """
+    descriptions = df["description"]
+    checks = (
+        ("description", descriptions.isna() | descriptions.astype(str).str.strip().eq(""), "present and not blank"),
+        ("amount", pd.to_numeric(df["amount"], errors="coerce").isna(), "present and numeric")
+    )
+    cases = []
+    for column, failed, check in checks:
+        positions = failed.to_numpy(dtype=bool, na_value=True).nonzero()[0]
+        cases.append(pd.DataFrame({
+            "row": positions + row_offset + 1,
+            "column": column,
+            "value": df[column].iloc[positions].astype(str).tolist(),
+            "check": check
+        }))
+    return pd.concat(cases, ignore_index=True).sort_values("row", kind="stable", ignore_index=True)